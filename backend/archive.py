@@ -0,0 +1,175 @@
+"""Hot/cold tiering: finished records move to `<collection>_archive`.
+
+A policy selects documents in a final state (completed, cancelled, ...)
+last updated more than `days` ago. The archiver copies them to the archive
+collection in batches with idempotent upserts and only then deletes them from
+the hot collection, conditional on their `version`, so neither a crash between
+the two steps nor a concurrent write can lose a document: one that changed
+meanwhile stays hot and is picked up by a later run. Dependent documents (a
+booking's payment transactions) move together with their parent, and a
+document still referenced from a hot collection (a quotation by its booking)
+stays hot until the referencing documents have been archived.
+
+Hot collections, and every unfiltered list query on them, then stay bounded
+by the archiving age. Reads consult the archive only when history is asked
+for, see find_with_history().
+"""
+import logging
+from datetime import datetime, timezone, timedelta
+
+from pymongo import DeleteOne, ReplaceOne
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = "_archive"
+
+
+def archive_collection(collection):
+    return collection + ARCHIVE_SUFFIX
+
+
+class ArchivePolicy:
+    __slots__ = ("collection", "states", "days", "field", "dependents", "referrers")
+
+    def __init__(self, collection, states, days, field="status", dependents=(), referrers=()):
+        """Archive documents whose `field` is in `states` and that were last updated `days` ago.
+
+        dependents are (collection, foreign key) pairs whose documents move
+        along with their parent, e.g. ("payment_transactions", "booking_id").
+        referrers are (collection, foreign key) pairs whose hot documents keep
+        the document they refer to hot, e.g. ("bookings", "quotation_id").
+        """
+        self.collection = collection
+        self.states = tuple(states)
+        self.days = days
+        self.field = field
+        self.dependents = tuple(dependents)
+        self.referrers = tuple(referrers)
+
+    def query(self, now):
+        return {self.field: {"$in": list(self.states)}, "updated_at": {"$lt": now - timedelta(days=self.days)}}
+
+
+class Archiver:
+    def __init__(self, db, policies, batch_size=500, before_delete=None, after_keep=None):
+        """Hooks, awaited with (collection, ids) if given: before_delete before hot documents
+        are removed, after_keep for those of them kept hot after a concurrent write.
+        """
+        self.db = db
+        self.policies = list(policies)
+        self.batch_size = batch_size
+        self.before_delete = before_delete
+        self.after_keep = after_keep
+
+    async def _copy(self, collection, documents):
+        # Upserts keyed on _id make re-copying after an interrupted run harmless
+        await self.db[archive_collection(collection)].bulk_write(
+            [ReplaceOne({"_id": document["_id"]}, document, upsert=True) for document in documents],
+            ordered=False,
+        )
+
+    async def _referenced(self, policy, ids):
+        referenced = set()
+        for collection, key in policy.referrers:
+            referenced.update(await self.db[collection].distinct(key, {key: {"$in": ids}}))
+        return referenced
+
+    async def _archive_batch(self, policy, documents):
+        """Move a batch; returns (moved, kept hot after concurrent writes, kept hot while referenced)."""
+        referenced = await self._referenced(policy, [document["id"] for document in documents])
+        blocked = len(documents)
+        documents = [document for document in documents if document["id"] not in referenced]
+        blocked -= len(documents)
+        if not documents:
+            return 0, 0, blocked
+        ids = [document["id"] for document in documents]
+        dependents = [
+            (collection, await self.db[collection].find({key: {"$in": ids}}).to_list(None))
+            for collection, key in policy.dependents
+        ]
+        await self._copy(policy.collection, documents)
+        for collection, children in dependents:
+            if children:
+                await self._copy(collection, children)
+
+        if self.before_delete is not None:
+            await self.before_delete(policy.collection, ids)
+        hot = self.db[policy.collection]
+        result = await hot.bulk_write(
+            # Only while nobody wrote the document since it was copied
+            [DeleteOne({"_id": document["_id"], "version": document.get("version")}) for document in documents],
+            ordered=False,
+        )
+        kept = set()
+        if result.deleted_count < len(documents):
+            kept = set(await hot.distinct("id", {"id": {"$in": ids}}))
+            # Their archive copies are stale; a later run copies them again
+            await self.db[archive_collection(policy.collection)].delete_many({"id": {"$in": list(kept)}})
+            for collection, key in policy.dependents:
+                await self.db[archive_collection(collection)].delete_many({key: {"$in": list(kept)}})
+            if kept and self.after_keep is not None:
+                await self.after_keep(policy.collection, list(kept))
+        for (collection, key), (_, children) in zip(policy.dependents, dependents):
+            moved_children = [child["_id"] for child in children if child[key] not in kept]
+            if moved_children:
+                await self.db[collection].delete_many({"_id": {"$in": moved_children}})
+        return len(ids) - len(kept), len(kept), blocked
+
+    async def archive(self, policy, now=None):
+        """Move every document matching the policy; returns (moved, skipped after concurrent writes, referenced)."""
+        query = policy.query(now or datetime.now(timezone.utc))
+        source = self.db[policy.collection]
+        moved = skipped = referenced = 0
+        last_id = None
+        while True:
+            batch_query = dict(query) if last_id is None else {**query, "_id": {"$gt": last_id}}
+            documents = await source.find(batch_query).sort("_id", 1).limit(self.batch_size).to_list(None)
+            if not documents:
+                break
+            batch_moved, batch_skipped, batch_referenced = await self._archive_batch(policy, documents)
+            moved += batch_moved
+            skipped += batch_skipped
+            referenced += batch_referenced
+            last_id = documents[-1]["_id"]
+        if moved or skipped or referenced:
+            logger.info(
+                f"Archived {moved} {policy.collection} documents "
+                f"({skipped} changed meanwhile, {referenced} still referenced; kept hot)"
+            )
+        return moved, skipped, referenced
+
+    async def run(self, now=None):
+        """Apply every policy in order; returns {collection: documents moved}.
+
+        List referring collections first, so their parents can follow in the same run.
+        """
+        now = now or datetime.now(timezone.utc)
+        report = {}
+        for policy in self.policies:
+            report[policy.collection], _, _ = await self.archive(policy, now)
+        return report
+
+    async def stats(self):
+        """Per archived collection: documents in the hot and the archive tier."""
+        collections = [policy.collection for policy in self.policies]
+        collections += [collection for policy in self.policies for collection, _ in policy.dependents]
+        return {
+            collection: {
+                "hot": await self.db[collection].estimated_document_count(),
+                "archived": await self.db[archive_collection(collection)].estimated_document_count(),
+            }
+            for collection in collections
+        }
+
+
+async def find_with_history(db, collection, query, projection=None, include_archived=False, limit=1000):
+    """Documents matching `query` in the hot collection, plus archived ones when history is asked for."""
+    documents = await db[collection].find(query, projection).to_list(limit)
+    if not include_archived:
+        return documents
+    # A document kept hot after a concurrent write may still have an archive copy
+    hot_ids = {document["id"] for document in documents if "id" in document}
+    archived = await db[archive_collection(collection)].find(query, projection).to_list(limit)
+    return documents + [
+        document for document in archived if "id" not in document or document["id"] not in hot_ids
+    ]
@@ -0,0 +1,177 @@
+"""Load-aware salesperson assignment.
+
+Each salesperson's score is their open workload plus a penalty for slow
+first responses, minus a bonus for experience with the request's
+destination. A global min-heap keyed by base score and one heap per
+destination keyed by score minus that destination's bonus give an
+O(log n) pick. Heap entries are invalidated lazily by a per-salesperson
+version counter instead of being removed.
+"""
+import heapq
+import math
+
+OPEN_STATUSES = ["pending", "quoted"]
+
+
+class SalespersonLoad:
+    __slots__ = ("id", "name", "open_requests", "avg_response_hours", "response_samples", "expertise", "version")
+
+    def __init__(self, salesperson_id, name):
+        self.id = salesperson_id
+        self.name = name
+        self.open_requests = 0
+        self.avg_response_hours = None
+        self.response_samples = 0
+        self.expertise = {}
+        self.version = 0
+
+    def to_dict(self):
+        return {
+            "salesperson_id": self.id,
+            "name": self.name,
+            "open_requests": self.open_requests,
+            "avg_response_hours": round(self.avg_response_hours, 2) if self.avg_response_hours is not None else None,
+            "top_destinations": sorted(self.expertise, key=self.expertise.get, reverse=True)[:5],
+        }
+
+
+class AssignmentEngine:
+    def __init__(self, expertise_weight=2.0, response_weight=0.1, response_smoothing=0.2):
+        self.expertise_weight = expertise_weight
+        self.response_weight = response_weight
+        self.response_smoothing = response_smoothing
+        self.salespeople = {}
+        self._heap = []
+        self._destination_heaps = {}
+
+    def base_score(self, sp):
+        return sp.open_requests + self.response_weight * (sp.avg_response_hours or 0.0)
+
+    def expertise_bonus(self, sp, destination):
+        return self.expertise_weight * math.log1p(sp.expertise.get(destination, 0))
+
+    def _push(self, sp):
+        sp.version += 1
+        base = self.base_score(sp)
+        heapq.heappush(self._heap, (base, sp.version, sp.id))
+        for destination in sp.expertise:
+            heap = self._destination_heaps.setdefault(destination, [])
+            heapq.heappush(heap, (base - self.expertise_bonus(sp, destination), sp.version, sp.id))
+        if len(self._heap) > 4 * len(self.salespeople) + 64:
+            self._compact()
+
+    def _compact(self):
+        self._heap = []
+        self._destination_heaps = {}
+        for sp in self.salespeople.values():
+            base = self.base_score(sp)
+            self._heap.append((base, sp.version, sp.id))
+            for destination in sp.expertise:
+                self._destination_heaps.setdefault(destination, []).append(
+                    (base - self.expertise_bonus(sp, destination), sp.version, sp.id)
+                )
+        heapq.heapify(self._heap)
+        for heap in self._destination_heaps.values():
+            heapq.heapify(heap)
+
+    def _peek(self, heap):
+        while heap:
+            _, version, salesperson_id = heap[0]
+            sp = self.salespeople.get(salesperson_id)
+            if sp is not None and sp.version == version:
+                return sp
+            heapq.heappop(heap)
+        return None
+
+    def add_salesperson(self, salesperson_id, name):
+        if salesperson_id not in self.salespeople:
+            self.salespeople[salesperson_id] = SalespersonLoad(salesperson_id, name)
+            self._push(self.salespeople[salesperson_id])
+        return self.salespeople[salesperson_id]
+
+    def remove_salesperson(self, salesperson_id):
+        self.salespeople.pop(salesperson_id, None)
+
+    def choose(self, destinations):
+        """Return the best salesperson for the destinations without changing any load."""
+        candidates = [self._peek(self._heap)]
+        candidates += [self._peek(self._destination_heaps[d]) for d in destinations if d in self._destination_heaps]
+        best, best_score = None, None
+        for sp in candidates:
+            if sp is None:
+                continue
+            bonus = max((self.expertise_bonus(sp, d) for d in destinations), default=0.0)
+            score = self.base_score(sp) - bonus
+            if best is None or score < best_score:
+                best, best_score = sp, score
+        return best
+
+    def assign(self, destinations):
+        """Pick a salesperson for a new request and count it against their workload."""
+        sp = self.choose(destinations)
+        if sp is None:
+            return None
+        sp.open_requests += 1
+        if destinations:
+            sp.expertise[destinations[0]] = sp.expertise.get(destinations[0], 0) + 1
+        self._push(sp)
+        return sp
+
+    def release(self, salesperson_id):
+        sp = self.salespeople.get(salesperson_id)
+        if sp is not None and sp.open_requests > 0:
+            sp.open_requests -= 1
+            self._push(sp)
+
+    def record_response(self, salesperson_id, hours):
+        sp = self.salespeople.get(salesperson_id)
+        if sp is None:
+            return
+        if sp.avg_response_hours is None:
+            sp.avg_response_hours = hours
+        else:
+            sp.avg_response_hours += self.response_smoothing * (hours - sp.avg_response_hours)
+        sp.response_samples += 1
+        self._push(sp)
+
+    def snapshot(self):
+        return sorted((sp.to_dict() for sp in self.salespeople.values()), key=lambda sp: sp["open_requests"])
+
+    async def load(self, db):
+        """Rebuild state from the database: salespeople, open workload, expertise and response history."""
+        self.salespeople = {}
+        self._heap = []
+        self._destination_heaps = {}
+
+        async for user in db.users.find({"role": "salesperson"}, {"id": 1, "name": 1}):
+            self.salespeople[user["id"]] = SalespersonLoad(user["id"], user["name"])
+
+        async for row in db.travel_requests.aggregate([
+            {"$match": {"assigned_salesperson": {"$ne": None}}},
+            {"$group": {
+                "_id": {"sp": "$assigned_salesperson", "destination": {"$arrayElemAt": ["$destinations", 0]}},
+                "total": {"$sum": 1},
+                "open": {"$sum": {"$cond": [{"$in": ["$status", OPEN_STATUSES]}, 1, 0]}},
+            }},
+        ]):
+            sp = self.salespeople.get(row["_id"]["sp"])
+            if sp is None:
+                continue
+            sp.open_requests += row["open"]
+            if row["_id"].get("destination"):
+                sp.expertise[row["_id"]["destination"]] = row["total"]
+
+        async for row in db.travel_requests.aggregate([
+            {"$match": {"first_quoted_at": {"$ne": None}, "assigned_salesperson": {"$ne": None}}},
+            {"$group": {
+                "_id": "$assigned_salesperson",
+                "avg_ms": {"$avg": {"$subtract": ["$first_quoted_at", "$created_at"]}},
+                "count": {"$sum": 1},
+            }},
+        ]):
+            sp = self.salespeople.get(row["_id"])
+            if sp is not None and row["avg_ms"] is not None:
+                sp.avg_response_hours = row["avg_ms"] / 3_600_000
+                sp.response_samples = row["count"]
+
+        self._compact()
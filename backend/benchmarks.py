@@ -0,0 +1,183 @@
+"""Microbenchmarks for per-request overhead in the API hot paths.
+
+Usage:
+    python benchmarks.py            # run every benchmark
+    python benchmarks.py auth       # run selected benchmarks
+"""
+import sys
+import time
+import timeit
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def report(label, seconds, iterations):
+    print(f"  {label:<40} {seconds / iterations * 1e6:>10.2f} us/op")
+
+
+@benchmark("auth")
+def bench_auth(iterations=20000):
+    """Token verification cost with and without the verified-token cache."""
+    import jwt
+    import server
+
+    token = server.create_access_token({"sub": "bench@demo.com"})
+    key = server.SIGNING_KEYS[server.ACTIVE_KID]
+
+    print("auth:")
+    report("jwt.decode (no cache)", timeit.timeit(
+        lambda: jwt.decode(token, key, algorithms=[server.ALGORITHM]), number=iterations), iterations)
+
+    def cold():
+        server.token_cache.clear()
+        server.decode_token(token)
+    report("decode_token (cache miss)", timeit.timeit(cold, number=iterations), iterations)
+
+    server.decode_token(token)
+    report("decode_token (cache hit)", timeit.timeit(
+        lambda: server.decode_token(token), number=iterations), iterations)
+
+
+@benchmark("ratelimit")
+def bench_ratelimit(iterations=100000):
+    """Per-request overhead of the rate limiting middleware (in-memory buckets)."""
+    import asyncio
+    import server
+    from ratelimit import MemoryBucketStore, RateLimitMiddleware, RatePolicy
+
+    async def endpoint(scope, receive, send):
+        pass
+
+    policies = [
+        RatePolicy.per_minute("/api/auth/login", 10, methods=["POST"]),
+        RatePolicy.per_minute("/api/quotations/{quotation_id}/document", 60, per="user"),
+    ]
+    # Effectively unlimited so every request takes the allowed path
+    limited = RateLimitMiddleware(endpoint, [
+        RatePolicy(p.path, 1e9, 1e9, per=p.per, methods=p.methods) for p in policies
+    ], verify_token=server.token_subject)
+    token = b"Bearer " + server.create_access_token({"sub": "bench@demo.com"}).encode()
+    scopes = {
+        "unlimited route": {"type": "http", "method": "GET", "path": "/api/requests",
+                            "headers": [], "client": ("10.0.0.1", 1234)},
+        "per-ip route": {"type": "http", "method": "POST", "path": "/api/auth/login",
+                         "headers": [], "client": ("10.0.0.1", 1234)},
+        "per-user templated route": {"type": "http", "method": "GET", "path": "/api/quotations/q-1/document",
+                                     "headers": [(b"authorization", token)], "client": ("10.0.0.1", 1234)},
+    }
+
+    async def run(app, scope):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await app(scope, None, None)
+        return time.perf_counter() - started
+
+    async def main():
+        baseline = await run(endpoint, scopes["unlimited route"])
+        report("endpoint without middleware", baseline, iterations)
+        for label, scope in scopes.items():
+            elapsed = await run(limited, scope)
+            report(f"overhead: {label}", elapsed - baseline, iterations)
+
+        store = MemoryBucketStore()
+        started = time.perf_counter()
+        for i in range(iterations):
+            await store.take(i % 1000, 1e9, 1e9, i)
+        report("MemoryBucketStore.take", time.perf_counter() - started, iterations)
+
+    print("ratelimit:")
+    asyncio.run(main())
+
+
+@benchmark("analytics")
+def bench_analytics(requests=100000, iterations=200):
+    """Manager analytics over the columnar snapshot, filled with synthetic history."""
+    from datetime import datetime, timezone
+    import server
+    from seed_data import SyntheticDataGenerator, generate_users
+
+    salespeople, customers = generate_users(40, 1000, password_hash="-")
+    batch = SyntheticDataGenerator(salespeople, customers).generate_batch(requests)
+    context = {request["id"]: request for request in batch["travel_requests"]}
+    snapshot = server.analytics_snapshot
+
+    print(f"analytics ({requests} requests, {len(batch['quotations'])} quotations):")
+    for collection in snapshot.tables:
+        table = snapshot[collection]
+        table.clear()
+        started = time.perf_counter()
+        table.upsert(batch[collection], context)
+        report(f"load {collection} (per document)", time.perf_counter() - started, len(batch[collection]))
+        table.frame()
+
+    now = datetime.now(timezone.utc)
+    requests_table, quotations_table = snapshot["travel_requests"], snapshot["quotations"]
+
+    def after_change(table, summary):
+        # Recomputed from scratch, as after a refresh that changed the table
+        table.invalidate()
+        return summary()
+
+    conversion = lambda: server.conversion_summary(snapshot, now)
+    pricing = lambda: server.pricing_summary(snapshot)
+    report("conversion_summary (after a change)", timeit.timeit(
+        lambda: after_change(requests_table, conversion), number=iterations), iterations)
+    report("conversion_summary (unchanged)", timeit.timeit(conversion, number=iterations), iterations)
+    report("pricing_summary (after a change)", timeit.timeit(
+        lambda: after_change(quotations_table, pricing), number=iterations), iterations)
+    report("pricing_summary (unchanged)", timeit.timeit(pricing, number=iterations), iterations)
+    print(f"  snapshot size: {sum(table.nbytes for table in snapshot.tables.values()) / 1e6:.1f} MB")
+
+
+@benchmark("pricing")
+def bench_pricing(requests=20000, iterations=2000):
+    """Elasticity model fit and the optimal-price search, on synthetic quotation history."""
+    import json
+    import random
+    import server
+    from elasticity import ElasticityModel
+    from seed_data import SyntheticDataGenerator, generate_users
+
+    salespeople, customers = generate_users(40, 1000, password_hash="-")
+    batch = SyntheticDataGenerator(salespeople, customers).generate_batch(requests)
+    context = {request["id"]: request for request in batch["travel_requests"]}
+    quotations = server.analytics_snapshot["quotations"]
+    quotations.clear()
+    quotations.upsert(batch["quotations"], context)
+
+    print(f"pricing ({len(batch['quotations'])} quotations):")
+    started = time.perf_counter()
+    document = server.fit_pricing_model(server.analytics_snapshot)
+    report("fit_pricing_model", time.perf_counter() - started, 1)
+    model = ElasticityModel({**document, "version": 0})
+    print(f"  {len(document['segments'])} segments")
+
+    rng = random.Random(0)
+    priced = [request for request in batch["travel_requests"] if request.get("budget_max")]
+    report("coefficients lookup", timeit.timeit(
+        lambda: model.coefficients("Goa", "leisure", 12), number=iterations * 10), iterations * 10)
+    for points, refine in ((200, False), (200, True), (2000, True)):
+        def search():
+            request = rng.choice(priced)
+            budget = request["budget_max"]
+            result = server.optimal_price(model, request, budget * 0.7, "history", budget * 1.2, points, refine)
+            return json.dumps(result)
+        report(f"optimal_price + JSON ({points} points{', refined' if refine else ''})",
+               timeit.timeit(search, number=iterations), iterations)
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""In-process columnar snapshots of Mongo collections for analytics.
+
+A Table keeps one NumPy array per column, with categorical columns
+dictionary-encoded as integer codes, so a group-by is an np.bincount over
+contiguous arrays instead of a Python loop over documents. A Snapshot loads
+its tables once and then refreshes them incrementally: documents whose
+updated_at passed the watermark are re-extracted in place and rows of
+documents deleted since (sync tombstones) are dropped. Tables are capped at
+max_rows, evicting the oldest rows, so memory stays bounded. Masks and
+aggregates are kept per table version, so between refreshes that change
+nothing, queries cost a dictionary lookup.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Dictionary:
+    """Dictionary encoding of a categorical column: value <-> dense code, -1 for missing."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value):
+        """The code of an existing value; unknown values get a code no row has."""
+        return self._codes.get(value, -2)
+
+    def decode(self, code):
+        return self.values[code] if code >= 0 else None
+
+
+class Column:
+    __slots__ = ("name", "extract", "dtype", "categorical")
+
+    def __init__(self, name, extract, dtype=np.float64, categorical=False):
+        """extract(document, context) returns the column value; categorical values are dictionary-encoded."""
+        self.name = name
+        self.extract = extract
+        self.dtype = np.int32 if categorical else dtype
+        self.categorical = categorical
+
+
+class Table:
+    def __init__(self, collection, columns, sources=None, projection=None, prepare=None,
+                 age_column="created_at", max_rows=1_000_000):
+        """A snapshot of `collection` loaded from `sources` (default: the collection itself).
+
+        prepare(documents), if given, is awaited once per batch of changed
+        documents and its result passed to the extractors as context.
+        """
+        self.collection = collection
+        self.columns = {column.name: column for column in columns}
+        if age_column not in self.columns:
+            raise ValueError(f"Table {collection} needs its age column '{age_column}'")
+        self.sources = list(sources or [collection])
+        self.projection = projection
+        self.prepare = prepare
+        self.age_column = age_column
+        self.max_rows = max_rows
+        self.dictionaries = {column.name: Dictionary() for column in columns if column.categorical}
+        self.version = 0
+        self.clear()
+
+    def clear(self):
+        self._data = {name: np.empty(0, column.dtype) for name, column in self.columns.items()}
+        self._valid = np.empty(0, bool)
+        self._ids = []
+        self._rows = {}
+        self._size = 0
+        self.invalidate()
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._data.values()) + self._valid.nbytes
+
+    def _reserve(self, extra):
+        capacity = len(self._valid)
+        if self._size + extra <= capacity:
+            return
+        capacity = max(1024, capacity * 2, self._size + extra)
+        for name, array in self._data.items():
+            grown = np.empty(capacity, array.dtype)
+            grown[:self._size] = array[:self._size]
+            self._data[name] = grown
+        valid = np.zeros(capacity, bool)
+        valid[:self._size] = self._valid[:self._size]
+        self._valid = valid
+
+    def upsert(self, documents, context=None):
+        """Write documents into their rows, appending rows for new ids."""
+        if not documents:
+            return
+        new_ids = [document["id"] for document in documents if document["id"] not in self._rows]
+        self._reserve(len(new_ids))
+        for document_id in new_ids:
+            self._rows[document_id] = self._size
+            self._ids.append(document_id)
+            self._size += 1
+        rows = np.fromiter((self._rows[document["id"]] for document in documents), np.int64, len(documents))
+        for name, column in self.columns.items():
+            values = [column.extract(document, context) for document in documents]
+            if column.categorical:
+                encode = self.dictionaries[name].encode
+                values = [encode(value) for value in values]
+            self._data[name][rows] = np.asarray(values, dtype=column.dtype)
+        self._valid[rows] = True
+        self.invalidate()
+        if len(self._rows) > self.max_rows:
+            self._evict()
+
+    def remove(self, ids):
+        rows = [self._rows.pop(document_id) for document_id in ids if document_id in self._rows]
+        if not rows:
+            return
+        self._valid[rows] = False
+        self.invalidate()
+        if len(self._rows) < self._size // 2:
+            self._compact(self._valid[:self._size])
+
+    def _evict(self):
+        # Keep the newest max_rows rows; ties at the cutoff may keep a few more
+        ages = self._data[self.age_column][:self._size]
+        valid = self._valid[:self._size]
+        cutoff = np.partition(ages[valid], len(self._rows) - self.max_rows)[len(self._rows) - self.max_rows]
+        self._compact(valid & (ages >= cutoff))
+
+    def _compact(self, keep):
+        for name, array in self._data.items():
+            self._data[name] = array[:self._size][keep]
+        self._valid = np.ones(int(keep.sum()), bool)
+        self._ids = [document_id for document_id, kept in zip(self._ids, keep) if kept]
+        self._rows = {document_id: row for row, document_id in enumerate(self._ids)}
+        self._size = len(self._ids)
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop the frame and everything derived from it; every write calls this."""
+        self.version += 1
+        self._frame = None
+        self._derived = {}
+
+    def derived(self, key, compute):
+        """compute() once per table version, e.g. a mask or an aggregate over frame()."""
+        if key not in self._derived:
+            self._derived[key] = compute()
+        return self._derived[key]
+
+    def frame(self):
+        """Live rows as {column: array}; computed once per change, so queries never copy.
+
+        Codes are stored as int32 but handed out as intp, which np.bincount
+        takes without converting on every call.
+        """
+        if self._frame is None:
+            valid = self._valid[:self._size]
+            self._frame = {
+                name: array[:self._size][valid].astype(np.intp) if self.columns[name].categorical
+                else array[:self._size][valid]
+                for name, array in self._data.items()
+            }
+        return self._frame
+
+    def codes(self, column, values):
+        dictionary = self.dictionaries[column]
+        return [dictionary.code(value) for value in values]
+
+    def matches(self, column, values):
+        """A mask of live rows whose categorical `column` is one of `values`.
+
+        The mask is shared until the table changes, so it is read-only.
+        """
+        def compute():
+            codes = self.frame()[column]
+            mask = np.zeros(len(codes), bool)
+            for code in self.codes(column, values):
+                mask |= codes == code
+            mask.flags.writeable = False
+            return mask
+        return self.derived(("matches", column, tuple(values)), compute)
+
+    def labels(self, column):
+        return self.dictionaries[column].values
+
+
+# Group-bys take codes in [-1, size) and skip -1 (missing) by counting it in a
+# bin that is dropped; masked-out rows are moved to that bin too. Multiplying
+# by the mask is much cheaper than boolean indexing, which copies the column.
+def group_counts(codes, size, mask=None):
+    """Rows per code, optionally only where mask holds."""
+    bins = codes + 1 if mask is None else (codes + 1) * mask
+    return np.bincount(bins, minlength=size + 1)[1:]
+
+
+def group_sums(codes, values, size, mask=None):
+    weights = values if mask is None else values * mask
+    return np.bincount(codes + 1, weights=weights, minlength=size + 1)[1:]
+
+
+def masked_codes(codes, mask):
+    """codes where mask holds, -1 (skipped by group-bys) elsewhere."""
+    return (codes + 1) * mask - 1
+
+
+def ratios(numerators, denominators):
+    """Elementwise numerators / denominators, NaN where the denominator is 0."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominators > 0, numerators / np.maximum(denominators, 1e-12), np.nan)
+
+
+class Snapshot:
+    def __init__(self, db, tables, refresh_seconds=30, skew_seconds=5, tombstone_days=30, batch_size=5000):
+        """Tables refresh in the given order, at most every refresh_seconds."""
+        self.db = db
+        self.tables = {table.collection: table for table in tables}
+        self.refresh_seconds = refresh_seconds
+        self.skew_seconds = skew_seconds
+        self.tombstone_days = tombstone_days
+        self.batch_size = batch_size
+        self.watermark = None
+        self.refreshed_at = None
+        self.last_refresh_ms = None
+        self.full_loads = 0
+        self._lock = asyncio.Lock()
+        self._derived = {}
+        self._derived_version = None
+
+    def __getitem__(self, collection):
+        return self.tables[collection]
+
+    @property
+    def version(self):
+        return tuple(table.version for table in self.tables.values())
+
+    def derived(self, key, compute):
+        """compute() once per snapshot version, for results that span tables.
+
+        Results are shared between callers until a table changes, so callers
+        must not modify them.
+        """
+        version = self.version
+        if version != self._derived_version:
+            self._derived, self._derived_version = {}, version
+        if key not in self._derived:
+            self._derived[key] = compute()
+        return self._derived[key]
+
+    async def _load(self, table, collection, query):
+        count = 0
+        cursor = self.db[collection].find(query, table.projection).batch_size(self.batch_size)
+        batch = []
+        async for document in cursor:
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                count += await self._upsert(table, batch)
+                batch = []
+        return count + await self._upsert(table, batch)
+
+    async def _upsert(self, table, documents):
+        if documents:
+            context = await table.prepare(documents) if table.prepare else None
+            table.upsert(documents, context)
+        return len(documents)
+
+    async def refresh(self, force=False, full=False):
+        """Bring every table up to date; returns immediately when refreshed recently.
+
+        full reloads every table, e.g. after documents were bulk-loaded with
+        old updated_at stamps that an incremental refresh would not pick up.
+        """
+        if not force and self.refreshed_at is not None and time.monotonic() - self.refreshed_at < self.refresh_seconds:
+            return
+        async with self._lock:
+            if not force and self.refreshed_at is not None and time.monotonic() - self.refreshed_at < self.refresh_seconds:
+                return  # refreshed while waiting for the lock
+            started = datetime.now(timezone.utc)
+            timer = time.perf_counter()
+            # Tombstones older than their retention are gone, so deletions could be missed
+            full = full or self.watermark is None or self.watermark < started - timedelta(days=self.tombstone_days)
+            for table in self.tables.values():
+                if full:
+                    table.clear()
+                    for source in table.sources:
+                        await self._load(table, source, {})
+                    continue
+                await self._load(table, table.collection, {"updated_at": {"$gte": self.watermark}})
+                # Archived documents keep their rows: analytics cover the whole history
+                table.remove(await self.db.tombstones.distinct("id", {
+                    "collection": table.collection,
+                    "deleted_at": {"$gte": self.watermark},
+                    "archived": {"$ne": True},
+                }))
+            # Writes stamped just before `started` may still be in flight; re-read a short overlap
+            self.watermark = started - timedelta(seconds=self.skew_seconds)
+            self.refreshed_at = time.monotonic()
+            self.last_refresh_ms = round((time.perf_counter() - timer) * 1000, 1)
+            if full:
+                self.full_loads += 1
+                logger.info(f"Loaded analytics snapshot in {self.last_refresh_ms} ms: {self.stats()['tables']}")
+
+    def stats(self):
+        return {
+            "watermark": self.watermark,
+            "last_refresh_ms": self.last_refresh_ms,
+            "full_loads": self.full_loads,
+            "tables": {
+                collection: {
+                    "rows": len(table),
+                    "bytes": table.nbytes,
+                    "dictionaries": {name: len(dictionary) for name, dictionary in table.dictionaries.items()},
+                }
+                for collection, table in self.tables.items()
+            },
+        }
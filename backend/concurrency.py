@@ -0,0 +1,108 @@
+"""Optimistic concurrency for documents carrying a `version` counter.
+
+Every write $inc's `version` and stamps `updated_at`. Conditional writes match
+on the version the caller read (compare-and-swap) and on the statuses a
+transition is allowed from, so a stale or illegal update simply matches
+nothing and needs no read beforehand. Only a failed write reads the document
+once, to tell the caller why it failed.
+"""
+from datetime import datetime, timezone
+
+from pymongo import ReturnDocument
+
+
+class StateMachine:
+    def __init__(self, name, transitions, field="status"):
+        """transitions maps each state to the states it may move to."""
+        self.name = name
+        self.field = field
+        self.transitions = {state: frozenset(targets) for state, targets in transitions.items()}
+        self._sources = {}
+        for source, targets in self.transitions.items():
+            for target in targets:
+                self._sources.setdefault(target, []).append(source)
+
+    @property
+    def states(self):
+        return set(self.transitions)
+
+    def sources(self, target):
+        """States from which `target` can be reached."""
+        return list(self._sources.get(target, ()))
+
+    def allows(self, source, target):
+        return target in self.transitions.get(source, ())
+
+    def guard(self, target):
+        """A query condition matching documents that may move to `target`."""
+        if target not in self.transitions:
+            raise ValueError(f"Unknown {self.name} {self.field} '{target}'")
+        return {self.field: {"$in": self.sources(target)}}
+
+
+class WriteConflict(Exception):
+    """A conditional write matched nothing.
+
+    reason is "missing" (no such document), "version" (modified since it was
+    read) or "transition" (its current state does not allow the change).
+    """
+
+    def __init__(self, reason, document=None, machine=None, target=None):
+        self.reason = reason
+        self.document = document
+        self.machine = machine
+        self.target = target
+        super().__init__(reason)
+
+    @property
+    def current_state(self):
+        return self.document.get(self.machine.field) if self.document and self.machine else None
+
+
+def versioned(update, now=None):
+    """Add the version bump and the updated_at stamp to an update document."""
+    update = dict(update)
+    update["$inc"] = {**update.get("$inc", {}), "version": 1}
+    update["$set"] = {**update.get("$set", {}), "updated_at": now or datetime.now(timezone.utc)}
+    return update
+
+
+async def compare_and_set(collection, key, update, version=None, machine=None, target=None, where=None,
+                          projection=None, session=None, now=None, return_document=ReturnDocument.AFTER):
+    """Apply `update` to the document matching `key` and return it (as updated by default).
+
+    The write only matches while the document is still at `version` (when
+    given), its state may move to `target` under `machine` (when given; the
+    state is then set to `target`), and the extra `where` conditions hold.
+    Raises WriteConflict otherwise.
+    """
+    condition = {**key, **(where or {})}
+    if version is not None:
+        condition["version"] = version
+    if machine is not None:
+        condition.update(machine.guard(target))
+        update = {**update, "$set": {**update.get("$set", {}), machine.field: target}}
+    updated = await collection.find_one_and_update(
+        condition, versioned(update, now),
+        projection=projection, return_document=return_document, session=session
+    )
+    if updated is not None:
+        return updated
+
+    current = await collection.find_one(key, session=session)
+    if current is None:
+        raise WriteConflict("missing")
+    if version is not None and current.get("version") != version:
+        raise WriteConflict("version", current, machine, target)
+    raise WriteConflict("transition", current, machine, target)
+
+
+async def read_modify_write(collection, key, document, build_update, attempts=3, **kwargs):
+    """Compare-and-swap `build_update(document)`, re-reading and rebuilding after version conflicts."""
+    for attempt in range(attempts):
+        try:
+            return await compare_and_set(collection, key, build_update(document), version=document.get("version"), **kwargs)
+        except WriteConflict as conflict:
+            if conflict.reason != "version" or attempt == attempts - 1:
+                raise
+            document = conflict.document
@@ -0,0 +1,289 @@
+"""Price elasticity of quotation acceptance, fitted per market segment.
+
+A segment's model is a logistic regression on the quoted price relative to the
+customer's budget:
+
+    P(accepted) = 1 / (1 + exp(-(intercept + slope * log(price / budget))))
+
+Segments form a hierarchy (e.g. everything > travel type > travel type x season
+> destination x travel type x season). Each level is fitted with a ridge
+penalty pulling a segment's coefficients towards its parent's, so a segment
+with a handful of decided quotations gets roughly its parent's curve and one
+with plenty of history gets its own. All segments of a level are fitted at
+once by IRLS: every Newton step is a few np.bincount sums and a closed-form
+2x2 solve per segment, so fitting takes milliseconds however many segments
+there are.
+
+Fitted models are stored as versioned documents in `pricing_models`;
+PricingModels serves the newest one from memory, where evaluating a scenario
+is a dict lookup and an exp().
+"""
+import logging
+import math
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+FEATURE = "log(price / budget)"
+MAX_SLOPE = 0.0  # acceptance never rises with price; positive fits are noise
+# Standard errors a slope must lie below MAX_SLOPE for its segment to be priced on
+SIGNIFICANCE = 2.0
+
+
+def _sums(codes, weights, size):
+    return np.bincount(codes + 1, weights=weights, minlength=size + 1)[1:]
+
+
+def segment_fit(x, y, segments, size, prior_intercept, prior_slope, penalty, iterations=50, tolerance=1e-8):
+    """Fit one logistic regression per segment code in [0, size); rows with code -1 are skipped.
+
+    The coefficients are shrunk towards the priors with an L2 penalty of
+    `penalty` / 2 * distance^2. Slopes are capped at MAX_SLOPE: segments whose
+    unconstrained slope exceeds it are refitted with the slope held there.
+    Returns (intercept, slope, samples, slope_error) arrays of length size;
+    slope_error is the slope's standard error from the penalised Hessian, and
+    infinite for capped slopes, which were not estimated.
+    """
+    prior_intercept = np.asarray(prior_intercept, float)
+    prior_slope = np.asarray(prior_slope, float)
+    samples = np.bincount(segments + 1, minlength=size + 1)[1:]
+    intercept, slope = prior_intercept.copy(), np.minimum(prior_slope, MAX_SLOPE)
+    free = np.ones(size, bool)
+    for attempt in range(2):
+        for _ in range(iterations):
+            p = 1 / (1 + np.exp(-np.clip(intercept[segments] + slope[segments] * x, -30, 30)))
+            w = p * (1 - p)
+            residual = y - p
+            g0 = _sums(segments, residual, size) - penalty * (intercept - prior_intercept)
+            g1 = _sums(segments, residual * x, size) - penalty * (slope - prior_slope)
+            h00 = _sums(segments, w, size) + penalty
+            h01 = _sums(segments, w * x, size)
+            h11 = _sums(segments, w * x * x, size) + penalty
+            determinant = np.maximum(h00 * h11 - h01 * h01, 1e-12)
+            step0 = np.where(free, (h11 * g0 - h01 * g1) / determinant, g0 / h00)
+            step1 = np.where(free, (h00 * g1 - h01 * g0) / determinant, 0)
+            intercept += step0
+            slope += step1
+            if max(np.abs(step0).max(initial=0), np.abs(step1).max(initial=0)) < tolerance:
+                break
+        capped = free & (slope > MAX_SLOPE)
+        if attempt or not capped.any():
+            break
+        free &= ~capped
+        slope[capped] = MAX_SLOPE
+    p = 1 / (1 + np.exp(-np.clip(intercept[segments] + slope[segments] * x, -30, 30)))
+    w = p * (1 - p)
+    h00 = _sums(segments, w, size) + penalty
+    h01 = _sums(segments, w * x, size)
+    h11 = _sums(segments, w * x * x, size) + penalty
+    slope_error = np.where(free, np.sqrt(h00 / np.maximum(h00 * h11 - h01 * h01, 1e-12)), np.inf)
+    return intercept, slope, samples, slope_error
+
+
+def fit_hierarchy(x, y, levels, penalty, **options):
+    """Fit each level of segments shrunk towards its parent level's fit.
+
+    levels is a list of (codes, size, parents): row codes in [-1, size) and,
+    for every level but the first, each code's parent code in the previous
+    level. The first level is fitted without a penalty. x is standardised
+    over the first level's rows while fitting, so the penalty weighs against
+    the same amount of evidence however widely prices vary. Returns a list of
+    (intercept, slope, samples, slope_error) per level, in terms of the
+    unstandardised x.
+    """
+    rows = levels[0][0] >= 0
+    centre = x[rows].mean() if rows.any() else 0.0
+    scale = x[rows].std() if rows.any() else 1.0
+    scale = scale if scale > 0 else 1.0
+    z = (x - centre) / scale
+    fits = []
+    prior_intercept = prior_slope = None
+    for codes, size, parents in levels:
+        if parents is None:
+            prior_intercept, prior_slope, weight = np.zeros(size), np.zeros(size), 1e-6
+        else:
+            prior_intercept, prior_slope, weight = prior_intercept[parents], prior_slope[parents], penalty
+        intercept, slope, samples, slope_error = segment_fit(
+            z, y, codes, size, prior_intercept, prior_slope, weight, **options
+        )
+        fits.append((intercept - slope * centre / scale, slope / scale, samples, slope_error / scale))
+        prior_intercept, prior_slope = intercept, slope
+    return fits
+
+
+def segment_quantiles(x, codes, size, quantiles):
+    """Quantiles of x per segment code in [0, size), interpolated like np.percentile; NaN for empty segments.
+
+    One sort of the rows by (code, x) serves every segment and quantile.
+    Returns an array of shape (len(quantiles), size).
+    """
+    rows = codes >= 0
+    values, segments = x[rows], codes[rows]
+    values = values[np.lexsort((values, segments))]
+    counts = np.bincount(segments, minlength=size)
+    starts = np.cumsum(counts) - counts
+    result = np.full((len(quantiles), size), np.nan)
+    filled = counts > 0
+    for row, quantile in enumerate(quantiles):
+        position = starts[filled] + quantile * (counts[filled] - 1)
+        lower = np.floor(position).astype(np.intp)
+        upper = np.minimum(lower + 1, starts[filled] + counts[filled] - 1)
+        result[row, filled] = values[lower] + (values[upper] - values[lower]) * (position - lower)
+    return result
+
+
+def log_loss(y, p):
+    p = np.clip(p, 1e-12, 1 - 1e-12)
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))) if len(y) else None
+
+
+def acceptance(intercept, slope, ratio):
+    """Acceptance probability at price / budget = ratio (a float or an array)"""
+    z = intercept + slope * np.log(np.maximum(ratio, 1e-9))
+    return 1 / (1 + np.exp(-np.clip(z, -30, 30)))
+
+
+def revenue_optimal_ratio(intercept, slope, low, high):
+    """The price / budget ratio in [low, high] maximising ratio x acceptance.
+
+    Setting the derivative of r * P(r) to zero gives P = 1 + 1 / slope, which
+    has a solution only when acceptance is elastic (slope < -1); otherwise
+    raising the price always pays and the optimum is the upper bound.
+    """
+    if slope >= -1:
+        return high
+    target = 1 + 1 / slope
+    ratio = math.exp((math.log(target / (1 - target)) - intercept) / slope)
+    return min(max(ratio, low), high)
+
+
+def price_search(intercept, slope, budget, cost, low, high, points=200, refine=True):
+    """Search [low, high] for the price maximising expected margin (price - cost) x acceptance.
+
+    One vectorised pass evaluates a grid of `points` prices; refine repeats it
+    on a grid spanning the best price's neighbours, which narrows the optimum
+    to (high - low) / points^2. Returns the optimum as (price, acceptance,
+    expected margin) and the coarse grid as (prices, acceptance, expected margins).
+    """
+    prices = np.linspace(low, high, points)
+    accepted = acceptance(intercept, slope, prices / budget)
+    margins = (prices - cost) * accepted
+    best = int(margins.argmax())
+    optimum = prices[best], accepted[best], margins[best]
+    if refine and points > 2:
+        fine = np.linspace(prices[max(best - 1, 0)], prices[min(best + 1, points - 1)], points)
+        fine_accepted = acceptance(intercept, slope, fine / budget)
+        fine_margins = (fine - cost) * fine_accepted
+        fine_best = int(fine_margins.argmax())
+        if fine_margins[fine_best] > optimum[2]:
+            optimum = fine[fine_best], fine_accepted[fine_best], fine_margins[fine_best]
+    return tuple(float(value) for value in optimum), (prices, accepted, margins)
+
+
+class ElasticityModel:
+    """A fitted model document, indexed for constant-time segment lookups."""
+
+    def __init__(self, document):
+        self.document = document
+        self.version = document["version"]
+        self.ratio_range = tuple(document["ratio_range"])
+        self.month_seasons = {
+            month: season for season, months in document["seasons"].items() for month in months
+        }
+        self._segments = {
+            (segment.get("destination"), segment.get("travel_type"), segment.get("season")): self._entry(segment)
+            for segment in document["segments"]
+        }
+        self._overall = self._entry(document["overall"])
+
+    def _entry(self, segment):
+        # Models fitted before per-segment ranges and errors were stored use the model-wide range
+        low, high = segment.get("ratio_range") or self.ratio_range
+        ratios = (low, segment.get("median_ratio") or math.sqrt(low * high), high)
+        error = segment.get("slope_error", 0.0)
+        sensitive = error is not None and segment["slope"] + SIGNIFICANCE * error < MAX_SLOPE
+        return segment["intercept"], segment["slope"], segment["samples"], ratios, sensitive
+
+    def season(self, month):
+        return self.month_seasons.get(month)
+
+    def lookup(self, destination=None, travel_type=None, month=None, price_sensitive=False):
+        """(intercept, slope, samples, segment, ratios, sensitive) of the most specific segment fitted.
+
+        Falls back from destination x travel type x season to travel type x
+        season, travel type and finally the overall curve. ratios are the
+        segment's (low, median, high) quoted price / budget ratios; sensitive
+        is whether its slope lies SIGNIFICANCE standard errors below
+        MAX_SLOPE. price_sensitive also skips segments that are not: their
+        acceptance did not clearly fall with price (capped slopes included),
+        so they say nothing about where to price and their parent's curve is
+        used instead. The overall curve is returned either way.
+        """
+        season = self.season(month)
+        for key in ((destination, travel_type, season), (None, travel_type, season), (None, travel_type, None)):
+            entry = self._segments.get(key)
+            if entry is not None and (entry[4] or not price_sensitive):
+                intercept, slope, samples, ratios, sensitive = entry
+                segment = {"destination": key[0], "travel_type": key[1], "season": key[2]}
+                return intercept, slope, samples, segment, ratios, sensitive
+        intercept, slope, samples, ratios, sensitive = self._overall
+        return intercept, slope, samples, {}, ratios, sensitive
+
+    def coefficients(self, destination=None, travel_type=None, month=None):
+        """(intercept, slope, samples, segment) of the most specific segment fitted; see lookup()"""
+        return self.lookup(destination, travel_type, month)[:4]
+
+    def conversion(self, ratio, destination=None, travel_type=None, month=None):
+        intercept, slope, _, _ = self.coefficients(destination, travel_type, month)
+        return float(acceptance(intercept, slope, ratio))
+
+    def elasticity(self, ratio, destination=None, travel_type=None, month=None):
+        """d log P / d log price at the ratio: the % change in acceptance per 1% price change"""
+        intercept, slope, _, _ = self.coefficients(destination, travel_type, month)
+        return float(slope * (1 - acceptance(intercept, slope, ratio)))
+
+
+class PricingModels:
+    def __init__(self, db, collection="pricing_models", check_seconds=60):
+        """Serves the newest fitted model, checking for a newer version at most every check_seconds."""
+        self.db = db
+        self.collection = collection
+        self.check_seconds = check_seconds
+        self._model = None
+        self._checked_at = None
+
+    async def current(self):
+        """The newest model, or None before the first fit."""
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_seconds:
+            return self._model
+        latest = await self.db[self.collection].find_one({}, {"_id": 0, "version": 1}, sort=[("version", DESCENDING)])
+        if latest is not None and (self._model is None or latest["version"] != self._model.version):
+            document = await self.db[self.collection].find_one({"version": latest["version"]}, {"_id": 0})
+            self._model = ElasticityModel(document)
+        self._checked_at = time.monotonic()
+        return self._model
+
+    async def save(self, document):
+        """Store a fitted model as the next version; returns the version."""
+        while True:
+            latest = await self.db[self.collection].find_one({}, {"version": 1}, sort=[("version", DESCENDING)])
+            version = latest["version"] + 1 if latest else 1
+            try:
+                await self.db[self.collection].insert_one(
+                    {**document, "version": version, "fitted_at": datetime.now(timezone.utc)}
+                )
+            except DuplicateKeyError:
+                continue  # another worker saved this version first
+            self._checked_at = None
+            logger.info(f"Saved pricing model v{version} ({document['overall']['samples']} quotations)")
+            return version
+
+    async def history(self, limit=10):
+        return await self.db[self.collection].find(
+            {}, {"_id": 0, "segments": 0}
+        ).sort("version", DESCENDING).to_list(limit)
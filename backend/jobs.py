@@ -0,0 +1,270 @@
+"""Background job queue persisted in the Mongo `jobs` collection.
+
+Handlers enqueue work and return; dispatch loops claim jobs atomically with
+find_one_and_update, run them with a per-type concurrency limit and retry
+failures with exponential backoff. A job whose lease expires (its worker
+died) is claimed again.
+
+The API process runs the dispatch loop itself unless JOB_WORKER_MODE is
+"external", in which case workers run as separate processes:
+
+    python jobs.py --processes 2 [--types notify_managers reconcile_booking_payments]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Queued jobs carry a dedupe key when scheduled; claiming a job releases it
+INDEXES = [
+    IndexModel([("id", ASCENDING)], unique=True),
+    IndexModel([("type", ASCENDING), ("status", ASCENDING), ("run_at", ASCENDING)]),
+    IndexModel(
+        [("dedupe_key", ASCENDING)], unique=True, partialFilterExpression={"dedupe_key": {"$exists": True}}
+    ),
+]
+
+
+class JobHandler:
+    __slots__ = ("func", "concurrency", "max_attempts", "backoff_seconds")
+
+    def __init__(self, func, concurrency, max_attempts, backoff_seconds):
+        self.func = func
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+
+
+class JobQueue:
+    def __init__(self, db, collection="jobs", poll_interval=1.0, lease_seconds=300):
+        self.db = db
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.handlers = {}
+        self._semaphores = {}
+        self._running = set()
+        self._wakeup = None
+        self._dispatch_task = None
+        self._stopping = False
+
+    def handler(self, job_type, concurrency=4, max_attempts=5, backoff_seconds=2.0):
+        """Register an async function(payload) as the handler for a job type."""
+        def decorator(func):
+            self.handlers[job_type] = JobHandler(func, concurrency, max_attempts, backoff_seconds)
+            return func
+        return decorator
+
+    async def enqueue(self, job_type, payload=None, delay_seconds=0, dedupe_key=None):
+        """Queue a job; returns its id.
+
+        With a dedupe_key, a job still queued under the same key is kept
+        instead and its id returned (the unique index makes this atomic).
+        """
+        if job_type not in self.handlers:
+            raise ValueError(f"No handler registered for job type '{job_type}'")
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "payload": payload or {},
+            "status": "queued",  # queued, running, done, failed
+            "attempts": 0,
+            "max_attempts": self.handlers[job_type].max_attempts,
+            "run_at": now + timedelta(seconds=delay_seconds),
+            "locked_until": None,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if dedupe_key is not None:
+            job["dedupe_key"] = dedupe_key
+        while True:
+            try:
+                await self.db[self.collection].insert_one(job)
+                break
+            except DuplicateKeyError:
+                if dedupe_key is None:
+                    raise
+                pending = await self.db[self.collection].find_one({"dedupe_key": dedupe_key}, {"id": 1})
+                if pending is not None:
+                    return pending["id"]
+                job.pop("_id", None)  # claimed meanwhile: the key is free again
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job["id"]
+
+    async def schedule(self, job_type, payload=None, delay_seconds=0):
+        """Enqueue a job unless an identical one is already queued; returns its id.
+
+        Meant for periodic jobs: every worker can call it on startup, and the
+        handler re-schedules the next run, without the chain multiplying. A
+        running job no longer holds its key, so its own re-schedule goes through.
+        """
+        dedupe_key = f"{job_type}:{json.dumps(payload or {}, sort_keys=True, default=str)}"
+        return await self.enqueue(job_type, payload, delay_seconds, dedupe_key=dedupe_key)
+
+    async def _claim(self, job_type):
+        now = datetime.now(timezone.utc)
+        return await self.db[self.collection].find_one_and_update(
+            {
+                "type": job_type,
+                "$or": [
+                    {"status": "queued", "run_at": {"$lte": now}},
+                    {"status": "running", "locked_until": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "worker": self.worker_id,
+                    "locked_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+                "$unset": {"dedupe_key": ""},
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _run(self, job, semaphore):
+        handler = self.handlers[job["type"]]
+        try:
+            await handler.func(job["payload"])
+        except Exception as e:
+            now = datetime.now(timezone.utc)
+            if job["attempts"] >= job["max_attempts"]:
+                update = {"status": "failed", "finished_at": now}
+                logger.exception(f"Job {job['type']} {job['id']} failed permanently")
+            else:
+                delay = handler.backoff_seconds * 2 ** (job["attempts"] - 1) * random.uniform(0.8, 1.2)
+                update = {"status": "queued", "run_at": now + timedelta(seconds=delay)}
+                logger.warning(f"Job {job['type']} {job['id']} failed (attempt {job['attempts']}), retrying in {delay:.1f}s")
+            await self.db[self.collection].update_one(
+                {"id": job["id"]},
+                {"$set": {**update, "locked_until": None, "last_error": str(e), "updated_at": now}},
+            )
+        else:
+            now = datetime.now(timezone.utc)
+            await self.db[self.collection].update_one(
+                {"id": job["id"]},
+                {"$set": {"status": "done", "locked_until": None, "finished_at": now, "updated_at": now}},
+            )
+        finally:
+            semaphore.release()
+
+    async def _dispatch(self, job_types):
+        while not self._stopping:
+            claimed = False
+            for job_type in job_types:
+                semaphore = self._semaphores[job_type]
+                while not semaphore.locked() and not self._stopping:
+                    await semaphore.acquire()
+                    try:
+                        job = await self._claim(job_type)
+                    except Exception:
+                        semaphore.release()
+                        logger.exception("Could not claim jobs")
+                        break
+                    if job is None:
+                        semaphore.release()
+                        break
+                    claimed = True
+                    task = asyncio.create_task(self._run(job, semaphore))
+                    self._running.add(task)
+                    task.add_done_callback(self._running.discard)
+
+            if not claimed:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def start(self, job_types=None):
+        job_types = list(job_types or self.handlers)
+        unknown = set(job_types) - set(self.handlers)
+        if unknown:
+            raise ValueError(f"No handler registered for job types {sorted(unknown)}")
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._semaphores = {t: asyncio.Semaphore(self.handlers[t].concurrency) for t in job_types}
+        self._dispatch_task = asyncio.create_task(self._dispatch(job_types))
+        logger.info(f"Job worker {self.worker_id} started for {job_types}")
+
+    async def stop(self, timeout=10):
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._dispatch_task is not None:
+            await self._dispatch_task
+        if self._running:
+            # Unfinished jobs keep their lease and are retried after it expires
+            await asyncio.wait(self._running, timeout=timeout)
+
+    async def stats(self):
+        rows = await self.db[self.collection].aggregate([
+            {"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}}
+        ]).to_list(None)
+        stats = {}
+        for row in rows:
+            stats.setdefault(row["_id"]["type"], {})[row["_id"]["status"]] = row["count"]
+        return stats
+
+
+def run_worker(job_types=None):
+    # Importing the API module registers the handlers on its job_queue
+    import server
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        server.job_queue.start(job_types)
+        await stop.wait()
+        await server.job_queue.stop()
+        server.db.close()
+
+    asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--types", nargs="*", help="Job types to run (default: all registered)")
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        run_worker(args.types)
+        return
+
+    workers = [multiprocessing.Process(target=run_worker, args=(args.types,)) for _ in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+
+if __name__ == "__main__":
+    main()
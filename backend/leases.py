@@ -0,0 +1,38 @@
+"""Named leases in the Mongo `leases` collection.
+
+A lease lets one worker at a time run a maintenance task (e.g. a rollup
+rebuild) across processes and hosts. It expires on its own, so a worker that
+dies while holding it blocks the task for at most `seconds`.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+
+class Lease:
+    def __init__(self, db, name, seconds=900, collection="leases"):
+        self.db = db
+        self.name = name
+        self.seconds = seconds
+        self.collection = collection
+        # Unique per holder, so two leases taken in one process do not share it
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def acquire(self):
+        """Take the lease unless someone else holds an unexpired one; returns whether it was taken."""
+        now = datetime.now(timezone.utc)
+        try:
+            await self.db[self.collection].find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"until": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "until": now + timedelta(seconds=self.seconds), "acquired_at": now}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False  # held by another owner: the upsert collided with its document
+        return True
+
+    async def release(self):
+        await self.db[self.collection].delete_one({"_id": self.name, "owner": self.owner})
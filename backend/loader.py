@@ -0,0 +1,91 @@
+"""Request-scoped batching loaders (the DataLoader pattern) over Motor.
+
+Every load(key) made during one event-loop tick is collected and resolved by
+a single batch call, typically one `{key: {"$in": keys}}` query, and the
+result is cached for the rest of the request. Expanding N rows with
+`asyncio.gather` therefore costs one query per collection per level of
+nesting instead of N find_one calls.
+"""
+import asyncio
+
+
+class DataLoader:
+    def __init__(self, batch_fn, max_batch_size=1000):
+        """batch_fn(keys) returns a dict of key -> value; missing keys load as None."""
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self._cache = {}
+        self._pending = []
+
+    def load(self, key):
+        """An awaitable for the value of `key`, shared by every caller in the request."""
+        future = self._cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._cache[key] = loop.create_future()
+            if key is None:
+                future.set_result(None)
+                return future
+            if not self._pending:
+                # Runs after every callback already queued, i.e. once the current tick is done
+                loop.call_soon(self._dispatch)
+            self._pending.append(key)
+        return future
+
+    async def load_many(self, keys):
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    def _dispatch(self):
+        pending, self._pending = self._pending, []
+        for i in range(0, len(pending), self.max_batch_size):
+            asyncio.ensure_future(self._resolve(pending[i:i + self.max_batch_size]))
+
+    async def _resolve(self, keys):
+        try:
+            values = await self.batch_fn(keys)
+        except Exception as e:
+            for key in keys:
+                # Drop failed keys so a later load retries them
+                future = self._cache.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key in keys:
+            future = self._cache[key]
+            if not future.done():
+                future.set_result(values.get(key))
+
+
+def documents_by(collection, key="id", projection=None):
+    """A batch function loading documents from `collection` by `key`."""
+    projection = {"_id": 0, **(projection or {})}
+
+    async def batch(keys):
+        documents = await collection.find({key: {"$in": list(keys)}}, projection).to_list(None)
+        return {document[key]: document for document in documents}
+    return batch
+
+
+class Loaders:
+    """Named DataLoaders for one request, created on first use."""
+
+    def __init__(self, batch_fns):
+        self._batch_fns = batch_fns
+        self._loaders = {}
+
+    def __getitem__(self, name):
+        loader = self._loaders.get(name)
+        if loader is None:
+            loader = self._loaders[name] = DataLoader(self._batch_fns[name])
+        return loader
+
+
+def with_fallback(batch_fn, fallback_fn):
+    """A batch function loading the keys batch_fn does not find with fallback_fn, e.g. from an archive."""
+    async def batch(keys):
+        values = await batch_fn(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            values.update(await fallback_fn(missing))
+        return values
+    return batch
@@ -0,0 +1,288 @@
+"""Online schema migrations with per-document schema versions.
+
+Each collection's documents carry `schema_version`; migrations registered for
+a collection upgrade a document from version N-1 to N. The migrator rewrites
+outdated documents in the background in `bulk_write` batches, throttled to a
+duty cycle so it never monopolises the database. Each write is conditional
+on the document's `version` so concurrent API writes are never overwritten
+(skipped documents are picked up by the next pass). Progress is checkpointed
+in the `migrations` collection, so a restarted worker resumes where the last
+one stopped, and a lease keeps a single worker migrating each collection.
+
+Until a document has been rewritten, readers upgrade it in memory with
+upgrade_documents(). The API process runs the migrator itself unless
+MIGRATION_MODE is "external"; it can also be run offline:
+
+    python migrations.py [--collections bookings quotations]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class Migration:
+    __slots__ = ("collection", "version", "name", "upgrade", "prepare")
+
+    def __init__(self, collection, version, name, upgrade, prepare=None):
+        self.collection = collection
+        self.version = version
+        self.name = name
+        self.upgrade = upgrade
+        self.prepare = prepare
+
+
+class Migrator:
+    def __init__(self, db, collection="migrations", batch_size=500, duty_cycle=0.25, lease_seconds=120):
+        self.db = db
+        self.collection = collection
+        self.batch_size = batch_size
+        self.duty_cycle = duty_cycle
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.migrations = {}
+        self.lazy_upgrades = 0
+        self._task = None
+
+    def register(self, collection, version, name, prepare=None):
+        """Register function(document, context) -> fields to $set as the upgrade to `version`.
+
+        prepare(db, documents), if given, is awaited once per batch and its
+        result passed as context (e.g. ledger totals for a batch of bookings).
+        Upgrades must tolerate missing fields: readers may pass projections.
+        """
+        def decorator(func):
+            versions = self.migrations.setdefault(collection, [])
+            if versions and versions[-1].version != version - 1 or not versions and version != 1:
+                raise ValueError(f"Migrations for {collection} must be registered in order (got version {version})")
+            versions.append(Migration(collection, version, name, func, prepare))
+            return func
+        return decorator
+
+    def target_version(self, collection):
+        versions = self.migrations.get(collection)
+        return versions[-1].version if versions else 0
+
+    def outdated_query(self, collection):
+        # Matches documents below the target version, including those without one
+        return {"schema_version": {"$not": {"$gte": self.target_version(collection)}}}
+
+    async def _apply(self, collection, documents):
+        """Upgrade outdated documents in place; returns {id(document): fields changed} for them."""
+        target = self.target_version(collection)
+        changes = {id(document): {} for document in documents if document.get("schema_version", 0) < target}
+        if not changes:
+            return changes
+        for migration in self.migrations[collection]:
+            pending = [
+                document for document in documents
+                if id(document) in changes and document.get("schema_version", 0) < migration.version
+            ]
+            if not pending:
+                continue
+            context = await migration.prepare(self.db, pending) if migration.prepare else None
+            for document in pending:
+                fields = {**(migration.upgrade(document, context) or {}), "schema_version": migration.version}
+                document.update(fields)
+                changes[id(document)].update(fields)
+        return changes
+
+    async def upgrade_documents(self, collection, documents):
+        """Lazily upgrade documents read before the background migration reached them."""
+        self.lazy_upgrades += len(await self._apply(collection, documents))
+        return documents
+
+    async def upgrade_and_save(self, collection, document):
+        """Upgrade one document and persist it now, e.g. before a positional update into it."""
+        changes = (await self._apply(collection, [document])).get(id(document))
+        if changes:
+            await self.db[collection].update_one(
+                {"_id": document["_id"], "version": document.get("version")}, {"$set": changes}
+            )
+        return document
+
+    async def upgrade_matching(self, collection, query):
+        """Upgrade the outdated documents matching `query` now, unthrottled; returns how many were rewritten.
+
+        For documents that must be current before the API serves them, e.g.
+        ones that range queries would miss until upgraded. Documents skipped
+        after a concurrent write are read again until none match.
+        """
+        source = self.db[collection]
+        query = {**query, **self.outdated_query(collection)}
+        migrated = 0
+        while True:
+            documents = await source.find(query).limit(self.batch_size).to_list(None)
+            if not documents:
+                return migrated
+            changes = await self._apply(collection, documents)
+            result = await source.bulk_write([
+                UpdateOne({"_id": document["_id"], "version": document.get("version")}, {"$set": changes[id(document)]})
+                for document in documents
+            ], ordered=False)
+            migrated += result.modified_count
+
+    async def _acquire(self, collection, checkpoint):
+        now = datetime.now(timezone.utc)
+        try:
+            return await self.db[self.collection].find_one_and_update(
+                {"_id": collection, "$or": [
+                    {"owner": self.worker_id},
+                    {"lease_until": {"$lt": now}},
+                    {"lease_until": {"$exists": False}},
+                ]},
+                {"$set": {**checkpoint, "owner": self.worker_id, "lease_until": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            return None  # another worker holds the lease
+
+    async def migrate(self, collection, max_passes=5):
+        """Bring every document in `collection` to the target version; returns the checkpoint."""
+        target = self.target_version(collection)
+        checkpoint = await self.db[self.collection].find_one({"_id": collection}) or {}
+        if checkpoint.get("target_version") != target:
+            # A new migration was registered: scan the collection again from the start
+            checkpoint = {}
+        last_id, passes = checkpoint.get("last_id"), checkpoint.get("passes", 0)
+        migrated, conflicts = checkpoint.get("migrated", 0), checkpoint.get("conflicts", 0)
+        acquired = await self._acquire(collection, {
+            "target_version": target,
+            "last_id": last_id,
+            "passes": passes,
+            "migrated": migrated,
+            "conflicts": conflicts,
+            "status": "running",
+        })
+        if acquired is None:
+            logger.info(f"Migration of {collection} is running elsewhere")
+            return None
+
+        source = self.db[collection]
+        started = time.monotonic()
+        while passes < max_passes:
+            query = self.outdated_query(collection)
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            batch_started = time.monotonic()
+            documents = await source.find(query).sort("_id", 1).limit(self.batch_size).to_list(None)
+            if not documents:
+                # End of a pass: documents skipped after write conflicts need another one
+                passes += 1
+                last_id = None
+                if not await source.count_documents(self.outdated_query(collection), limit=1):
+                    break
+                continue
+
+            changes = await self._apply(collection, documents)
+            operations = [
+                # Only while nobody wrote the document since it was read
+                UpdateOne({"_id": document["_id"], "version": document.get("version")}, {"$set": changes[id(document)]})
+                for document in documents
+            ]
+            result = await source.bulk_write(operations, ordered=False)
+            migrated += result.modified_count
+            conflicts += len(operations) - result.matched_count
+            last_id = documents[-1]["_id"]
+
+            now = datetime.now(timezone.utc)
+            await self.db[self.collection].update_one({"_id": collection}, {"$set": {
+                "last_id": last_id,
+                "passes": passes,
+                "migrated": migrated,
+                "conflicts": conflicts,
+                "updated_at": now,
+                "lease_until": now + timedelta(seconds=self.lease_seconds),
+            }})
+            # Throttle: sleep long enough that batches use at most duty_cycle of the time
+            elapsed = time.monotonic() - batch_started
+            await asyncio.sleep(elapsed * (1 / self.duty_cycle - 1))
+
+        remaining = await source.count_documents(self.outdated_query(collection))
+        finished = {
+            "last_id": None,
+            "passes": 0,
+            "migrated": migrated,
+            "conflicts": conflicts,
+            "status": "complete" if not remaining else "incomplete",
+            "finished_at": datetime.now(timezone.utc),
+            "duration_seconds": round(time.monotonic() - started, 2),
+            "lease_until": datetime.now(timezone.utc),
+        }
+        await self.db[self.collection].update_one({"_id": collection}, {"$set": finished})
+        logger.info(f"Migrated {migrated} {collection} documents to schema v{target} ({remaining} remaining)")
+        return finished
+
+    async def run(self, collections=None):
+        for collection in collections or list(self.migrations):
+            try:
+                await self.migrate(collection)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Migration of {collection} failed; it resumes from its checkpoint next run")
+
+    async def progress(self):
+        """Per collection: target version, outdated documents left and the checkpoint."""
+        checkpoints = {
+            checkpoint.pop("_id"): checkpoint
+            async for checkpoint in self.db[self.collection].find({"_id": {"$in": list(self.migrations)}})
+        }
+        report = {}
+        for collection, versions in self.migrations.items():
+            checkpoint = checkpoints.get(collection, {})
+            report[collection] = {
+                "target_version": self.target_version(collection),
+                "migrations": [f"v{migration.version}: {migration.name}" for migration in versions],
+                "remaining": await self.db[collection].count_documents(self.outdated_query(collection)),
+                "status": checkpoint.get("status", "pending"),
+                "migrated": checkpoint.get("migrated", 0),
+                "conflicts": checkpoint.get("conflicts", 0),
+                "updated_at": checkpoint.get("updated_at"),
+                "finished_at": checkpoint.get("finished_at"),
+                "owner": checkpoint.get("owner"),
+            }
+        return {"collections": report, "lazy_upgrades": self.lazy_upgrades}
+
+    def start(self, collections=None):
+        self._task = asyncio.create_task(self.run(collections))
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run schema migrations")
+    parser.add_argument("--collections", nargs="*", help="Collections to migrate (default: all with migrations)")
+    args = parser.parse_args()
+
+    # Importing the API module registers the migrations on its migrator
+    import server
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def run():
+        try:
+            await server.migrator.run(args.collections)
+        finally:
+            server.db.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
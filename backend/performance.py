@@ -0,0 +1,144 @@
+"""Salesperson performance kept as running aggregates.
+
+One document per salesperson in `salesperson_metrics` holds counters that
+are $inc'd on each state transition: a request is assigned, first quoted
+or won, and a quotation is created or accepted. Dashboards read and divide
+these counters instead of scanning request and quotation history.
+rebuild() recomputes them from the source collections and their archives
+into a staging collection that is renamed into place, one rebuild at a time.
+"""
+import logging
+import uuid
+from datetime import datetime, timezone
+
+from archive import archive_collection
+from leases import Lease
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "salesperson_metrics"
+COUNTERS = (
+    "requests_assigned",     # requests routed to the salesperson
+    "requests_quoted",       # ... that received a first quotation
+    "response_hours_total",  # summed request -> first quotation time
+    "requests_won",          # ... that ended in a booking
+    "quotations_created",    # quotations the salesperson wrote
+    "quotations_won",        # ... that the customer accepted
+)
+
+
+async def record(db, salesperson_id, **increments):
+    """Add increments (see COUNTERS) to a salesperson's running totals."""
+    if not salesperson_id or not increments:
+        return
+    unknown = set(increments) - set(COUNTERS)
+    if unknown:
+        raise ValueError(f"Unknown performance counters {sorted(unknown)}")
+    await db[COLLECTION].update_one(
+        {"_id": salesperson_id},
+        {"$inc": increments, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+
+def _percent(numerator, denominator):
+    return round(numerator / denominator * 100, 1) if denominator else None
+
+
+def summarize(counters):
+    """Rates derived from a counters document (or summed counters)."""
+    counters = {name: counters.get(name, 0) for name in COUNTERS}
+    quoted = counters["requests_quoted"]
+    return {
+        **counters,
+        "response_hours_total": round(counters["response_hours_total"], 2),
+        "conversion_rate": _percent(counters["requests_won"], counters["requests_assigned"]),
+        "win_rate": _percent(counters["quotations_won"], counters["quotations_created"]),
+        "avg_response_hours": round(counters["response_hours_total"] / quoted, 2) if quoted else None,
+    }
+
+
+async def salesperson_summary(db, salesperson_id):
+    return summarize(await db[COLLECTION].find_one({"_id": salesperson_id}) or {})
+
+
+async def team_summaries(db, salesperson_ids=None):
+    """Per-salesperson summaries plus the team's combined rates."""
+    query = {} if salesperson_ids is None else {"_id": {"$in": list(salesperson_ids)}}
+    team = dict.fromkeys(COUNTERS, 0)
+    members = []
+    async for document in db[COLLECTION].find(query):
+        members.append({"salesperson_id": document["_id"], **summarize(document)})
+        for name in COUNTERS:
+            team[name] += document.get(name, 0)
+    return summarize(team), members
+
+
+async def rebuild(db, lease_seconds=900):
+    """Recompute every salesperson's counters from requests and quotations; returns the document count.
+
+    Returns None without doing anything while another rebuild holds the lease.
+    """
+    lease = Lease(db, f"{COLLECTION}_rebuild", lease_seconds)
+    if not await lease.acquire():
+        logger.info("Salesperson metrics are being rebuilt elsewhere")
+        return None
+    try:
+        return await _rebuild(db)
+    finally:
+        await lease.release()
+
+
+async def _rebuild(db):
+    totals = {}
+
+    def add(salesperson_id, values):
+        if salesperson_id:
+            counters = totals.setdefault(salesperson_id, dict.fromkeys(COUNTERS, 0))
+            for name, value in values.items():
+                counters[name] += value or 0
+
+    # Archived requests and quotations are still part of everyone's history
+    for collection in ("travel_requests", archive_collection("travel_requests")):
+        async for row in db[collection].aggregate([
+            {"$match": {"assigned_salesperson": {"$ne": None}}},
+            {"$group": {
+                "_id": "$assigned_salesperson",
+                "requests_assigned": {"$sum": 1},
+                "requests_quoted": {"$sum": {"$cond": [{"$ifNull": ["$first_quoted_at", False]}, 1, 0]}},
+                "response_hours_total": {"$sum": {"$cond": [
+                    {"$ifNull": ["$first_quoted_at", False]},
+                    {"$divide": [{"$subtract": ["$first_quoted_at", "$created_at"]}, 3_600_000]},
+                    0,
+                ]}},
+                "requests_won": {"$sum": {"$cond": [{"$eq": ["$status", "confirmed"]}, 1, 0]}},
+            }},
+        ]):
+            add(row.pop("_id"), row)
+
+    for collection in ("quotations", archive_collection("quotations")):
+        async for row in db[collection].aggregate([
+            {"$group": {
+                "_id": "$salesperson_id",
+                "quotations_created": {"$sum": 1},
+                "quotations_won": {"$sum": {"$cond": [{"$eq": ["$status", "accepted"]}, 1, 0]}},
+            }},
+        ]):
+            add(row.pop("_id"), row)
+
+    if not totals:
+        await db[COLLECTION].delete_many({})
+        return 0
+    # Counters are swapped in whole: $inc upserts never meet a half-filled collection
+    now = datetime.now(timezone.utc)
+    staging = db[f"{COLLECTION}_rebuild_{uuid.uuid4().hex[:12]}"]
+    try:
+        await staging.insert_many([
+            {"_id": salesperson_id, **counters, "updated_at": now}
+            for salesperson_id, counters in totals.items()
+        ])
+        await staging.rename(COLLECTION, dropTarget=True)
+    except BaseException:
+        await staging.drop()
+        raise
+    return len(totals)
@@ -0,0 +1,78 @@
+"""Sparse field selection for list endpoints (`?fields=id,title,status`).
+
+A field list becomes a Mongo projection, so unselected fields are never read
+from the database, and a partial pydantic model built from the full one, so
+only selected fields are validated and serialised. Partial models keep the
+full model's field types, field validators and "before" model validators
+(e.g. legacy upgrades); "after" validators are skipped since they derive
+values that are already stored.
+"""
+from functools import lru_cache
+
+from pydantic import TypeAdapter, create_model, field_validator, model_validator
+
+ALWAYS_INCLUDED = ("id",)
+# Read but not returned: lets readers upgrade projected documents lazily (see migrations.py)
+ALWAYS_PROJECTED = ("schema_version",)
+# Also read but not returned whenever the keyed field is selected: legacy
+# quotation options are upgraded using the quotation's margin and selection
+PROJECTION_DEPENDENCIES = {"options": ("margin", "selected_option")}
+
+
+def parse_fields(model, fields):
+    """Validate a comma-separated field list against a model; None selects every field."""
+    if fields is None or not fields.strip():
+        return None
+    selected = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = selected - set(model.model_fields)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    selected.update(name for name in ALWAYS_INCLUDED if name in model.model_fields)
+    return tuple(sorted(selected))
+
+
+def mongo_projection(fields):
+    dependencies = tuple(name for field in fields for name in PROJECTION_DEPENDENCIES.get(field, ()))
+    return {"_id": 0, **{name: 1 for name in ALWAYS_PROJECTED + tuple(fields) + dependencies}}
+
+
+def _unbound(decorator):
+    # Decorator.func is bound to the original model; rebind it to the partial one
+    return classmethod(getattr(decorator.func, "__func__", decorator.func))
+
+
+@lru_cache(maxsize=256)
+def partial_model(model, fields):
+    """A model with only `fields` (a sorted tuple from parse_fields) of `model`."""
+    decorators = model.__pydantic_decorators__
+    validators = {}
+    for name, decorator in decorators.field_validators.items():
+        targets = [field for field in decorator.info.fields if field in fields]
+        if targets:
+            validators[name] = field_validator(*targets, mode=decorator.info.mode)(_unbound(decorator))
+    for name, decorator in decorators.model_validators.items():
+        if decorator.info.mode == "before":
+            validators[name] = model_validator(mode="before")(_unbound(decorator))
+    return create_model(
+        f"{model.__name__}Fields",
+        __validators__=validators,
+        **{name: (info.annotation, info) for name, info in model.model_fields.items() if name in fields},
+    )
+
+
+@lru_cache(maxsize=256)
+def partial_list_adapter(model, fields):
+    """A list adapter for the partial model, or for the full model when fields is None."""
+    return TypeAdapter(list[partial_model(model, fields) if fields else model])
+
+
+def dump_partial(model, fields, documents):
+    """Validate projected documents with the partial model and serialise them to JSON bytes."""
+    adapter = partial_list_adapter(model, fields)
+    return adapter.dump_json(adapter.validate_python(documents))
+
+
+def jsonable_partial(model, fields, documents):
+    """Like dump_partial, but returns JSON-compatible dicts that can still be extended."""
+    adapter = partial_list_adapter(model, fields)
+    return adapter.dump_python(adapter.validate_python(documents), mode="json")
@@ -0,0 +1,237 @@
+"""Token-bucket rate limiting middleware with per-route policies.
+
+Each policy refills `rate` tokens per second up to `burst`; a request takes one
+token from the bucket for (policy, client) or is rejected with 429 and a
+Retry-After header. Clients are identified by IP, or for per-user policies by
+the subject of a bearer token that verifies. Buckets live in process memory (one dict
+lookup and a few float operations per request) unless a shared store is
+given, e.g. MongoBucketStore for multi-worker deployments.
+"""
+import json
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+class RatePolicy:
+    __slots__ = ("name", "path", "methods", "rate", "burst", "per", "regex")
+
+    def __init__(self, path, rate, burst, per="ip", methods=None, name=None):
+        """rate is tokens per second; per is "ip" or "user" (falls back to IP without a token)."""
+        if per not in ("ip", "user"):
+            raise ValueError(f"Unknown rate limit key '{per}'")
+        self.path = path
+        self.methods = frozenset(m.upper() for m in methods) if methods else None
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.per = per
+        self.name = name or f"{','.join(sorted(self.methods or ['*']))} {path}"
+        # Path templates like /api/quotations/{id}/document match one segment per parameter
+        self.regex = re.compile("^" + re.sub(r"\\\{[^/]+?\\\}", "[^/]+", re.escape(path)) + "$") if "{" in path else None
+
+    @classmethod
+    def per_minute(cls, path, requests, burst=None, **kwargs):
+        return cls(path, requests / 60.0, burst or requests, **kwargs)
+
+    def applies_to(self, method):
+        return self.methods is None or method in self.methods
+
+
+class MemoryBucketStore:
+    """Per-process buckets: key -> [tokens, last refill time, rate, burst], least recently used first."""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+
+    def _sweep(self, now):
+        # Buckets that have refilled completely are indistinguishable from new ones
+        self._buckets = OrderedDict(
+            (key, bucket) for key, bucket in self._buckets.items()
+            if bucket[0] + (now - bucket[1]) * bucket[2] < bucket[3]
+        )
+        # Then drop the least recently used; clearing everything would hand
+        # every throttled client a fresh burst. Leave headroom so sweeps stay rare.
+        for _ in range(len(self._buckets) - self.maxsize * 9 // 10):
+            self._buckets.popitem(last=False)
+
+    async def take(self, key, rate, burst, now):
+        """Take one token; returns (allowed, seconds until a token is available)."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.maxsize:
+                self._sweep(now)
+            self._buckets[key] = [burst - 1.0, now, rate, burst]
+            return True, 0.0
+        self._buckets.move_to_end(key)
+        tokens = bucket[0] + (now - bucket[1]) * rate
+        if tokens > burst:
+            tokens = burst
+        bucket[1] = now
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            return True, 0.0
+        bucket[0] = tokens
+        return False, (1.0 - tokens) / rate
+
+
+class MongoBucketStore:
+    """Buckets shared between workers, updated atomically with a pipeline update.
+
+    Documents expire through a TTL index on expires_at once they would have
+    refilled. If Mongo is unavailable requests are allowed rather than failed.
+    """
+
+    def __init__(self, db, collection="rate_limits"):
+        self.db = db
+        self.collection = collection
+
+    async def take(self, key, rate, burst, now):
+        current = datetime.now(timezone.utc)
+        refilled = {"$min": [burst, {"$add": [
+            {"$ifNull": ["$tokens", burst]},
+            {"$multiply": [
+                {"$divide": [{"$subtract": [current, {"$ifNull": ["$refilled_at", current]}]}, 1000]},
+                rate,
+            ]},
+        ]}]}
+        try:
+            bucket = await self.db[self.collection].find_one_and_update(
+                {"_id": key},
+                [
+                    {"$set": {"tokens": refilled, "refilled_at": current}},
+                    {"$set": {
+                        "allowed": {"$gte": ["$tokens", 1]},
+                        "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                        "expires_at": current + timedelta(seconds=burst / rate),
+                    }},
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except Exception:
+            logger.exception("Shared rate limit store unavailable, allowing request")
+            return True, 0.0
+        if bucket["allowed"]:
+            return True, 0.0
+        return False, (1.0 - bucket["tokens"]) / rate
+
+
+def client_ip(scope, trusted_proxies=0):
+    """The peer address, or the address appended by the last of `trusted_proxies` proxies."""
+    if trusted_proxies:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                hops = [hop.strip() for hop in value.decode("latin-1").split(",")]
+                if len(hops) >= trusted_proxies:
+                    return hops[-trusted_proxies]
+                break
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class _BoundedCache(dict):
+    """A dict that is simply emptied when full; entries are cheap to recompute."""
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def put(self, key, value):
+        if len(self) >= self.maxsize:
+            self.clear()
+        self[key] = value
+        return value
+
+
+def bearer_token(scope):
+    """The bearer token of the request, unverified, or None."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.partition(b" ")
+            return token.decode("latin-1") if scheme.lower() == b"bearer" and token else None
+    return None
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, policies, store=None, trusted_proxies=0, enabled=True, verify_token=None):
+        """verify_token(token) returns the subject of a valid token, or None.
+
+        Per-user policies only key on subjects it returns; without it, or for
+        tokens it rejects, they fall back to the client IP. Keying on an
+        unverified claim would let anyone drain another user's bucket.
+        """
+        self.app = app
+        self.verify_token = verify_token
+        self.store = store or MemoryBucketStore()
+        self.trusted_proxies = trusted_proxies
+        self.enabled = enabled
+        self.rejected = 0
+        self._exact = {}
+        self._templates = []
+        self._resolved = _BoundedCache(10000)
+        for policy in policies:
+            if policy.regex is None:
+                self._exact.setdefault(policy.path, []).append(policy)
+            else:
+                self._templates.append(policy)
+
+    def _resolve(self, method, path):
+        for policy in self._exact.get(path, ()):
+            if policy.applies_to(method):
+                return policy
+        for policy in self._templates:
+            if policy.applies_to(method) and policy.regex.match(path):
+                return policy
+        return None
+
+    def policy_for(self, method, path):
+        key = (method, path)
+        if key in self._resolved:
+            return self._resolved[key]
+        return self._resolved.put(key, self._resolve(method, path))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        policy = self.policy_for(scope["method"], scope["path"])
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        identity = None
+        if policy.per == "user" and self.verify_token is not None:
+            token = bearer_token(scope)
+            subject = self.verify_token(token) if token else None
+            if subject is not None:
+                identity = "user:" + subject
+        if identity is None:
+            identity = "ip:" + client_ip(scope, self.trusted_proxies)
+        allowed, retry_after = await self.store.take(
+            f"{policy.name}|{identity}", policy.rate, policy.burst, time.monotonic()
+        )
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        self.rejected += 1
+        body = json.dumps({"detail": "Too many requests, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,195 @@
+"""Quotation document rendering (HTML and PDF).
+
+Rendering is CPU-bound, so QuotationRenderer runs it in a process pool and
+caches the output per (quotation id, quotation version, request version,
+format). The render functions are plain module-level functions so they can
+be pickled into worker processes.
+"""
+import asyncio
+import html
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+FORMATS = {"html": "text/html; charset=utf-8", "pdf": "application/pdf"}
+
+
+def _money(value):
+    return f"{float(value or 0):,.2f}"
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value.strftime("%d %b %Y")
+    return str(value or "")
+
+
+def quotation_lines(quotation, request=None):
+    """Plain-text layout shared by both renderers: (style, text) tuples."""
+    lines = [("title", quotation["title"])]
+    if request:
+        lines.append(("meta", f"Prepared for {request.get('customer_name', '')}"))
+        lines.append(("meta", f"Travel: {_date(request.get('departure_date'))} to {_date(request.get('return_date'))}, "
+                              f"{request.get('travelers_count', '')} travellers"))
+        lines.append(("meta", "Destinations: " + ", ".join(request.get("destinations", []))))
+    lines.append(("meta", f"Prepared by {quotation.get('salesperson_name', '')} on {_date(quotation.get('updated_at'))}, "
+                          f"valid for {quotation.get('validity_days', 7)} days"))
+
+    for index, option in enumerate(quotation.get("options", [])):
+        recommended = " (recommended)" if index == quotation.get("selected_option", 0) else ""
+        lines.append(("heading", f"{option.get('name', 'Option')}{recommended}"))
+        if option.get("duration"):
+            lines.append(("meta", option["duration"]))
+        for item in option.get("line_items", []):
+            quantity = item.get("quantity", 1)
+            quantity = int(quantity) if float(quantity).is_integer() else quantity
+            lines.append(("item", f"{item.get('component', '').title()}: {item.get('name', '')} x {quantity}"))
+        lines.append(("total", f"Package price: INR {_money(option.get('price'))}"))
+
+    lines.append(("total", f"Quoted total: INR {_money(quotation.get('total_price'))}"))
+    return lines
+
+
+def render_quotation_html(quotation, request=None):
+    body = []
+    tags = {"title": "h1", "heading": "h2", "meta": "p", "total": "p"}
+    items_open = False
+    for style, text in quotation_lines(quotation, request):
+        if style == "item":
+            if not items_open:
+                body.append("<ul>")
+                items_open = True
+            body.append(f"<li>{html.escape(text)}</li>")
+            continue
+        if items_open:
+            body.append("</ul>")
+            items_open = False
+        body.append(f'<{tags[style]} class="{style}">{html.escape(text)}</{tags[style]}>')
+    if items_open:
+        body.append("</ul>")
+
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>{html.escape(quotation['title'])}</title>"
+        "<style>body{font-family:Helvetica,Arial,sans-serif;margin:40px;color:#1f2937}"
+        "h1{color:#ea580c}.meta{color:#6b7280}.total{font-weight:bold}</style>"
+        "</head><body>" + "".join(body) + "</body></html>"
+    )
+
+
+def _pdf_text(text):
+    text = text.encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def render_quotation_pdf(quotation, request=None):
+    """Minimal multi-page PDF 1.4 using the built-in Helvetica fonts."""
+    styles = {"title": ("F2", 18, 28), "heading": ("F2", 13, 22), "meta": ("F1", 10, 14),
+              "item": ("F1", 10, 14), "total": ("F2", 11, 18)}
+    page_height, margin = 842, 50
+
+    pages, current, y = [], [], page_height - margin
+    for style, text in quotation_lines(quotation, request):
+        font, size, leading = styles[style]
+        if y - leading < margin:
+            pages.append(current)
+            current, y = [], page_height - margin
+        y -= leading
+        indent = margin + (15 if style == "item" else 0)
+        current.append(f"BT /{font} {size} Tf {indent} {y} Td ({_pdf_text(text)}) Tj ET")
+    pages.append(current)
+
+    # Objects: 1 catalog, 2 pages, 3-4 fonts, then a (page, content) pair per page
+    objects = [None, None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>"]
+    page_refs = []
+    for commands in pages:
+        stream = "\n".join(commands).encode("latin-1")
+        page_number = len(objects) + 1
+        page_refs.append(f"{page_number} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 {page_height}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {page_number + 1} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(page_refs)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(output)
+
+
+def render_quotation(quotation, request, fmt):
+    if fmt == "pdf":
+        return render_quotation_pdf(quotation, request)
+    return render_quotation_html(quotation, request).encode("utf-8")
+
+
+def document_version(quotation):
+    """Cache version token: the version counter when present, else the last update time."""
+    if quotation.get("version") is not None:
+        return str(quotation["version"])
+    updated_at = quotation.get("updated_at")
+    return updated_at.isoformat() if isinstance(updated_at, datetime) else str(updated_at)
+
+
+class QuotationRenderer:
+    def __init__(self, max_workers=None, cache_size=256):
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.cache_size = cache_size
+        self._pool = None
+        self._cache = OrderedDict()
+        self._inflight = {}
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    async def render(self, quotation, request=None, fmt="pdf"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}'")
+        # The document shows the travel request too, so its edits must miss the cache
+        key = (quotation["id"], document_version(quotation), document_version(request) if request else None, fmt)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor(), render_quotation, quotation, request, fmt)
+        self._inflight[key] = future
+        try:
+            document = await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+
+        self._cache[key] = document
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return document
+
+    async def render_many(self, items, fmt="pdf"):
+        """Render (quotation, request) pairs concurrently across the pool."""
+        return await asyncio.gather(*(self.render(quotation, request, fmt) for quotation, request in items))
+
+    def invalidate(self, quotation_id):
+        for key in [key for key in self._cache if key[0] == quotation_id]:
+            del self._cache[key]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
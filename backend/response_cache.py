@@ -0,0 +1,140 @@
+"""Two-tier cache for read-heavy route handlers.
+
+Tier 1 is a per-process LRU with per-entry TTLs. Tier 2 is optional and
+shared between workers (a Mongo collection with a TTL index). Concurrent
+misses for the same key are coalesced so only one computation runs.
+"""
+import asyncio
+import functools
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+# Route parameters that never contribute to the cache key
+UNKEYED_PARAMS = {"request", "response", "current_user"}
+
+
+class MongoCacheTier:
+    """Shared tier stored in a Mongo collection; expired entries are removed by a TTL index."""
+
+    def __init__(self, db, collection="response_cache"):
+        self.db = db
+        self.collection = collection
+
+    async def get(self, key):
+        entry = await self.db[self.collection].find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}
+        )
+        return entry["value"] if entry else None
+
+    async def set(self, key, value, ttl):
+        await self.db[self.collection].replace_one(
+            {"_id": key},
+            {"value": value, "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl)},
+            upsert=True,
+        )
+
+    async def clear(self):
+        await self.db[self.collection].delete_many({})
+
+
+class ResponseCache:
+    def __init__(self, maxsize=1024, shared=None):
+        self.maxsize = maxsize
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0, "coalesced": 0}
+
+    @property
+    def size(self):
+        """Entries held in the local tier, including expired ones not yet evicted"""
+        return len(self._entries)
+
+    def _get_local(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _set_local(self, key, value, ttl):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key, ttl, compute):
+        entry = self._get_local(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry[0]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._fill(key, ttl, compute))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fill(self, key, ttl, compute):
+        if self.shared is not None:
+            value = await self.shared.get(key)
+            if value is not None:
+                self.stats["shared_hits"] += 1
+                self._set_local(key, value, ttl)
+                return value
+
+        self.stats["misses"] += 1
+        value = jsonable_encoder(await compute())
+        self._set_local(key, value, ttl)
+        if self.shared is not None:
+            await self.shared.set(key, value, ttl)
+        return value
+
+    async def clear(self):
+        self._entries.clear()
+        if self.shared is not None:
+            await self.shared.clear()
+
+
+def cache_key(func, scope, kwargs):
+    current_user = kwargs.get("current_user")
+    if scope == "user":
+        scope_value = current_user.id
+    elif scope == "role":
+        scope_value = current_user.role
+    else:
+        scope_value = "*"
+    params = sorted((name, repr(value)) for name, value in kwargs.items() if name not in UNKEYED_PARAMS)
+    raw = repr((func.__module__, func.__qualname__, scope_value, params))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def cached(cache, ttl=60, scope="role"):
+    """Cache an async route handler's JSON-encoded result.
+
+    scope is "global", "role" or "user"; role and user scoping read the
+    handler's current_user argument. Handlers must be called with keyword
+    arguments, which is how FastAPI invokes them.
+    """
+    if scope not in ("global", "role", "user"):
+        raise ValueError(f"Unknown cache scope '{scope}'")
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            key = cache_key(func, scope, kwargs)
+            return await cache.get_or_compute(key, ttl, lambda: func(**kwargs))
+        return wrapper
+    return decorator
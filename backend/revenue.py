@@ -0,0 +1,289 @@
+"""Revenue rollups maintained incrementally from the payment ledger.
+
+Every booking, captured payment and refund $inc's one day bucket and one
+month bucket in `revenue_buckets`, keyed by salesperson. Dashboards and
+range queries then read a handful of small documents instead of summing
+payment_transactions. The buckets can be rebuilt from the raw ledger in
+parallel time chunks:
+
+    python revenue.py --chunks 16 --concurrency 4
+
+A rebuild fills a staging collection of its own and swaps it in at the end,
+so increments written while it runs are lost; run it when payments are quiet.
+A lease keeps it to one rebuild at a time. It reads archived bookings and
+their ledger entries as well.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from archive import archive_collection
+from leases import Lease
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "revenue_buckets"
+GRANULARITIES = ("day", "month")
+METRICS = ("booked", "captured", "refunded", "payments", "refunds")
+BUCKET_INDEXES = [
+    IndexModel([("granularity", ASCENDING), ("period", ASCENDING), ("salesperson_id", ASCENDING)]),
+]
+
+# Bookings written before salesperson_id existed fall back to their quotation's
+# salesperson, which may have been archived already
+SALESPERSON_LOOKUP = [
+    {"$lookup": {"from": "quotations", "localField": "quotation_id", "foreignField": "id", "as": "quotation"}},
+    {"$lookup": {
+        "from": archive_collection("quotations"), "localField": "quotation_id", "foreignField": "id",
+        "as": "archived_quotation",
+    }},
+    {"$addFields": {"salesperson_id": {"$ifNull": ["$salesperson_id", {"$arrayElemAt": [
+        {"$concatArrays": ["$quotation.salesperson_id", "$archived_quotation.salesperson_id"]}, 0
+    ]}]}}},
+]
+# (bookings, payment_transactions) per tier: transactions are archived with their booking
+TIERS = (
+    ("bookings", "payment_transactions"),
+    (archive_collection("bookings"), archive_collection("payment_transactions")),
+)
+
+
+def period_start(when, granularity):
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    day = when.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return day if granularity == "day" else day.replace(day=1)
+
+
+def bucket_id(granularity, period, salesperson_id):
+    return f"{granularity}:{period:%Y-%m-%d}:{salesperson_id or '-'}"
+
+
+async def record(db, when, salesperson_id, **amounts):
+    """Add amounts (see METRICS) to the day and month buckets containing `when`."""
+    unknown = set(amounts) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown revenue metrics {sorted(unknown)}")
+    await db[COLLECTION].bulk_write([
+        UpdateOne(
+            {"_id": bucket_id(granularity, period_start(when, granularity), salesperson_id)},
+            {
+                "$setOnInsert": {
+                    "granularity": granularity,
+                    "period": period_start(when, granularity),
+                    "salesperson_id": salesperson_id,
+                },
+                "$inc": amounts,
+            },
+            upsert=True,
+        )
+        for granularity in GRANULARITIES
+    ], ordered=False)
+
+
+def _salesperson_match(salesperson_ids):
+    return {} if salesperson_ids is None else {"salesperson_id": {"$in": list(salesperson_ids)}}
+
+
+async def outstanding_before(db, when, salesperson_ids=None):
+    """Booked minus net captured over every bucket before `when` (month buckets, then days)."""
+    month = period_start(when, "month")
+    clauses = [{"granularity": "month", "period": {"$lt": month}}]
+    if when > month:
+        clauses.append({"granularity": "day", "period": {"$gte": month, "$lt": when}})
+    rows = await db[COLLECTION].aggregate([
+        {"$match": {"$or": clauses, **_salesperson_match(salesperson_ids)}},
+        {"$group": {"_id": None, "balance": {"$sum": {
+            "$subtract": [{"$ifNull": ["$booked", 0]}, {"$subtract": [
+                {"$ifNull": ["$captured", 0]}, {"$ifNull": ["$refunded", 0]}
+            ]}]
+        }}}},
+    ]).to_list(1)
+    return rows[0]["balance"] if rows else 0
+
+
+async def revenue_series(db, start, end, granularity="month", salesperson_ids=None):
+    """Per-period totals for [start, end) with a running outstanding balance."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {GRANULARITIES}")
+    start = period_start(start, granularity)
+    rows, opening = await asyncio.gather(
+        db[COLLECTION].aggregate([
+            {"$match": {
+                "granularity": granularity,
+                "period": {"$gte": start, "$lt": end},
+                **_salesperson_match(salesperson_ids),
+            }},
+            {"$group": {"_id": "$period", **{metric: {"$sum": f"${metric}"} for metric in METRICS}}},
+            {"$sort": {"_id": 1}},
+        ]).to_list(None),
+        outstanding_before(db, start, salesperson_ids),
+    )
+
+    totals = dict.fromkeys(METRICS, 0)
+    balance = opening
+    buckets = []
+    for row in rows:
+        values = {metric: round(row.get(metric) or 0, 2) for metric in METRICS}
+        net = values["captured"] - values["refunded"]
+        balance += values["booked"] - net
+        for metric in METRICS:
+            totals[metric] += values[metric]
+        buckets.append({
+            "period": row["_id"].strftime("%Y-%m-%d" if granularity == "day" else "%Y-%m"),
+            **values,
+            "net_revenue": round(net, 2),
+            "outstanding": round(balance, 2),
+        })
+    totals = {metric: round(value, 2) for metric, value in totals.items()}
+    totals["net_revenue"] = round(totals["captured"] - totals["refunded"], 2)
+    return {
+        "granularity": granularity,
+        "opening_outstanding": round(opening, 2),
+        "closing_outstanding": round(balance, 2),
+        "totals": totals,
+        "buckets": buckets,
+    }
+
+
+async def _rebuild_chunk(db, start, end, bookings_collection, transactions_collection):
+    """Day-level totals per salesperson for bookings and ledger entries created in [start, end)."""
+    day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}
+    bookings, transactions = await asyncio.gather(
+        db[bookings_collection].aggregate([
+            {"$match": {"created_at": {"$gte": start, "$lt": end}, "booking_status": {"$ne": "cancelled"}}},
+            *SALESPERSON_LOOKUP,
+            {"$group": {"_id": {"day": day, "sp": "$salesperson_id"}, "booked": {"$sum": "$total_amount"}}},
+        ]).to_list(None),
+        db[transactions_collection].aggregate([
+            {"$match": {"created_at": {"$gte": start, "$lt": end}, "status": "completed"}},
+            {"$lookup": {"from": bookings_collection, "localField": "booking_id", "foreignField": "id", "as": "booking"}},
+            {"$unwind": "$booking"},
+            {"$project": {
+                "amount": 1,
+                "created_at": 1,
+                "salesperson_id": "$booking.salesperson_id",
+                "quotation_id": "$booking.quotation_id",
+            }},
+            *SALESPERSON_LOOKUP,
+            {"$group": {
+                "_id": {"day": day, "sp": "$salesperson_id"},
+                "captured": {"$sum": {"$cond": [{"$gt": ["$amount", 0]}, "$amount", 0]}},
+                "refunded": {"$sum": {"$cond": [{"$lt": ["$amount", 0]}, {"$multiply": ["$amount", -1]}, 0]}},
+                "payments": {"$sum": {"$cond": [{"$gt": ["$amount", 0]}, 1, 0]}},
+                "refunds": {"$sum": {"$cond": [{"$lt": ["$amount", 0]}, 1, 0]}},
+            }},
+        ]).to_list(None),
+    )
+    return bookings + transactions
+
+
+async def rebuild(db, chunks=8, concurrency=4, lease_seconds=1800):
+    """Recompute every bucket from bookings and payment_transactions; returns the bucket count.
+
+    Returns None without doing anything while another rebuild holds the lease.
+    """
+    lease = Lease(db, f"{COLLECTION}_rebuild", lease_seconds)
+    if not await lease.acquire():
+        logger.info("Revenue buckets are being rebuilt elsewhere")
+        return None
+    try:
+        return await _rebuild(db, chunks, concurrency)
+    finally:
+        await lease.release()
+
+
+async def _rebuild(db, chunks, concurrency):
+    bounds = []
+    for collection in (name for tier in TIERS for name in tier):
+        rows = await db[collection].aggregate([
+            {"$group": {"_id": None, "first": {"$min": "$created_at"}, "last": {"$max": "$created_at"}}}
+        ]).to_list(1)
+        if rows and rows[0]["first"] is not None:
+            bounds += [rows[0]["first"], rows[0]["last"]]
+
+    buckets = {}
+    if bounds:
+        # Chunks cover whole days so no day bucket is split between them
+        first = period_start(min(bounds), "day")
+        days = (period_start(max(bounds), "day") - first).days + 1
+        step = max(1, -(-days // chunks))
+        ranges = [
+            (first + timedelta(days=offset), first + timedelta(days=min(offset + step, days)))
+            for offset in range(0, days, step)
+        ]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_chunk(start, end, tier):
+            async with semaphore:
+                return await _rebuild_chunk(db, start.replace(tzinfo=None), end.replace(tzinfo=None), *tier)
+
+        started = time.perf_counter()
+        pending = [run_chunk(start, end, tier) for start, end in ranges for tier in TIERS]
+        for rows in await asyncio.gather(*pending):
+            for row in rows:
+                day = datetime.strptime(row["_id"]["day"], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+                salesperson_id = row["_id"].get("sp")
+                for granularity in GRANULARITIES:
+                    period = period_start(day, granularity)
+                    bucket = buckets.setdefault(bucket_id(granularity, period, salesperson_id), {
+                        "granularity": granularity,
+                        "period": period,
+                        "salesperson_id": salesperson_id,
+                        **dict.fromkeys(METRICS, 0),
+                    })
+                    for metric in METRICS:
+                        bucket[metric] += row.get(metric, 0)
+        logger.info("Aggregated %d chunks in %.1fs", len(ranges), time.perf_counter() - started)
+
+    # A staging collection per run: an overlapping run (after a lease expired) cannot drop it
+    staging = db[f"{COLLECTION}_rebuild_{uuid.uuid4().hex[:12]}"]
+    documents = [{"_id": key, **bucket} for key, bucket in buckets.items()]
+    if not documents:
+        await db[COLLECTION].delete_many({})
+        return 0
+    try:
+        await staging.create_indexes(BUCKET_INDEXES)
+        for i in range(0, len(documents), 1000):
+            await staging.insert_many(documents[i:i + 1000], ordered=False)
+        await staging.rename(COLLECTION, dropTarget=True)
+    except BaseException:
+        await staging.drop()
+        raise
+    return len(documents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild revenue buckets from the payment ledger")
+    parser.add_argument("--chunks", type=int, default=8, help="Number of time ranges to aggregate")
+    parser.add_argument("--concurrency", type=int, default=4, help="Chunks aggregated at once")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def run():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        try:
+            count = await rebuild(client[os.environ['DB_NAME']], chunks=args.chunks, concurrency=args.concurrency)
+        finally:
+            client.close()
+        if count is not None:
+            logger.info("Rebuilt %d revenue buckets", count)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
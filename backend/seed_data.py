@@ -0,0 +1,431 @@
+"""Synthetic data generator for scale testing.
+
+Generates travel requests, multi-option quotations, bookings and payment
+ledgers in the same document shapes the API writes, with skewed destination
+and salesperson popularity, and bulk-inserts them in parallel batches.
+
+Usage:
+    python seed_data.py --requests 1000000 --customers 50000 --salespeople 60
+
+Revenue buckets and salesperson metrics are rebuilt once the data is in.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from itertools import accumulate
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from passlib.context import CryptContext
+from pymongo import UpdateOne
+
+import performance
+import revenue
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+DESTINATIONS = [
+    "Goa", "Manali", "Kerala", "Rajasthan", "Shimla", "Ladakh", "Andaman",
+    "Mumbai", "Delhi", "Jaipur", "Udaipur", "Rishikesh", "Darjeeling", "Ooty",
+    "Coorg", "Varanasi", "Agra", "Munnar", "Sikkim", "Kashmir", "Pondicherry",
+    "Hampi", "Dubai", "Singapore", "Bali", "Thailand", "Maldives", "Sri Lanka",
+]
+TRAVEL_TYPES = ["leisure", "business", "honeymoon", "group", "pilgrimage"]
+TRAVEL_TYPE_WEIGHTS = [50, 25, 10, 10, 5]
+TRANSPORT_MODES = ["Flight", "Train", "Bus", "Car", "Cruise"]
+MEAL_PREFERENCES = ["Vegetarian", "Non-Vegetarian", "Mixed", "Vegan", "Jain"]
+HOTEL_TIERS = {3: "Comfort Inn", 4: "Grand Residency", 5: "Palace Resort"}
+ACTIVITIES = [
+    "Sightseeing", "Team Building", "Adventure Sports", "Cultural Show",
+    "Spa", "Water Sports", "Trekking", "City Tour", "Wildlife Safari",
+]
+OPTION_TIERS = [("Premium", 1.25), ("Standard", 1.0), ("Budget", 0.8)]
+PAYMENT_METHODS = ["card", "upi", "netbanking", "bank_transfer"]
+
+
+def zipf_cum_weights(n, skew):
+    """Cumulative Zipf weights so rank 1 is the most popular of n items."""
+    return list(accumulate(1.0 / (rank ** skew) for rank in range(1, n + 1)))
+
+
+class SyntheticDataGenerator:
+    def __init__(self, salespeople, customers, seed=42, days=730,
+                 destination_skew=1.1, salesperson_skew=0.8,
+                 quote_rate=0.7, accept_rate=0.35):
+        self.rng = random.Random(seed)
+        self.salespeople = salespeople
+        self.customers = customers
+        self.days = days
+        self.quote_rate = quote_rate
+        self.accept_rate = accept_rate
+        self.now = datetime.now(timezone.utc)
+
+        destinations = list(DESTINATIONS)
+        self.rng.shuffle(destinations)
+        self.destinations = destinations
+        self.destination_weights = zipf_cum_weights(len(destinations), destination_skew)
+        self.salesperson_weights = zipf_cum_weights(len(salespeople), salesperson_skew)
+        self.travel_type_weights = list(accumulate(TRAVEL_TYPE_WEIGHTS))
+
+    def _pick(self, items, cum_weights):
+        return self.rng.choices(items, cum_weights=cum_weights)[0]
+
+    def _request(self):
+        rng = self.rng
+        customer = rng.choice(self.customers)
+        salesperson = self._pick(self.salespeople, self.salesperson_weights)
+        destination = self._pick(self.destinations, self.destination_weights)
+        travel_type = self._pick(TRAVEL_TYPES, self.travel_type_weights)
+
+        created_at = self.now - timedelta(days=rng.random() * self.days)
+        departure = (created_at + timedelta(days=rng.randint(7, 120))).replace(hour=0, minute=0, second=0, microsecond=0)
+        duration = rng.randint(2, 10)
+        adults = rng.randint(1, 4) if travel_type != "group" else rng.randint(8, 40)
+        children = rng.randint(0, 3) if travel_type in ("leisure", "pilgrimage") else 0
+        infants = rng.randint(0, 1) if children else 0
+        travelers = adults + children + infants
+
+        budget_per_person = travel_type in ("business", "group")
+        base = rng.lognormvariate(11.2, 0.5) * max(1, duration / 4)
+        if budget_per_person:
+            base /= max(1, travelers / 3)
+
+        extra_destinations = rng.sample(self.destinations, rng.randint(0, 2))
+        return {
+            "id": str(uuid.uuid4()),
+            "title": f"{travel_type.title()} Trip to {destination}",
+            "customer_id": customer["id"],
+            "customer_name": customer["name"],
+            "travel_type": travel_type,
+            "travelers_count": travelers,
+            "adults": adults,
+            "children": children,
+            "infants": infants,
+            "departure_date": departure,
+            "return_date": departure + timedelta(days=duration),
+            "is_flexible_dates": rng.random() < 0.3,
+            "budget_min": round(base * 0.8, -2),
+            "budget_max": round(base * 1.2, -2),
+            "budget_per_person": budget_per_person,
+            "destinations": [destination] + [d for d in extra_destinations if d != destination],
+            "transport_modes": rng.sample(TRANSPORT_MODES, rng.randint(1, 2)),
+            "accommodation_star": rng.choice([3, 3, 4, 4, 4, 5]),
+            "meal_preference": rng.choice(MEAL_PREFERENCES),
+            "special_requirements": rng.choice([None, "Airport pickup required",
+                                                "Kid-friendly resort with pool",
+                                                "Conference hall required",
+                                                "Wheelchair accessible rooms"]),
+            "status": "pending",
+            "assigned_salesperson": salesperson["id"],
+            "created_at": created_at,
+            "updated_at": created_at,
+            "version": 1,
+        }
+
+    def _line_item(self, component, name, quantity, unit_cost):
+        return {
+            "id": str(uuid.uuid4()),
+            "component": component,
+            "name": name,
+            "quantity": quantity,
+            "unit_cost": unit_cost,
+            "total_cost": round(quantity * unit_cost, 2),
+        }
+
+    def _quotation(self, request, salesperson):
+        rng = self.rng
+        created_at = request["created_at"] + timedelta(hours=rng.expovariate(1 / 6.0))
+        star = request["accommodation_star"] or 3
+        destination = request["destinations"][0]
+        travelers = request["travelers_count"]
+        nights = max(1, (request["return_date"] - request["departure_date"]).days)
+        reference = request["budget_max"] or 100000
+
+        options = []
+        for tier, factor in OPTION_TIERS[:rng.randint(1, 3)]:
+            # Split the tier's cost basis across components, then mark it up
+            cost_basis = reference * factor * rng.uniform(0.7, 0.95)
+            rooms = max(1, (travelers + 1) // 2)
+            activities = rng.sample(ACTIVITIES, rng.randint(1, 3))
+            line_items = [
+                self._line_item("hotel", f"{HOTEL_TIERS[star]} {destination} ({star} Star)",
+                                rooms * nights, round(cost_basis * 0.45 / (rooms * nights), -1)),
+                self._line_item("transport", request["transport_modes"][0], travelers,
+                                round(cost_basis * 0.3 / travelers, -1)),
+                self._line_item("meal", rng.choice(["All Meals Included", "Breakfast & Dinner", "Breakfast Only"]),
+                                travelers, round(cost_basis * 0.1 / travelers, -1)),
+            ] + [
+                self._line_item("activity", activity, 1, round(cost_basis * 0.15 / len(activities), -1))
+                for activity in activities
+            ]
+            cost = round(sum(item["total_cost"] for item in line_items), 2)
+            markup = rng.uniform(10, 30)
+            price = round(cost * (1 + markup / 100), 2)
+            options.append({
+                "id": chr(65 + len(options)),
+                "name": f"Option {chr(65 + len(options))} - {tier}",
+                "duration": f"{nights + 1} Days {nights} Nights",
+                "markup_percentage": markup,
+                "line_items": line_items,
+                "cost": cost,
+                "price": price,
+                "margin": round((price - cost) / price * 100, 2),
+            })
+
+        accepted = rng.random() < self.accept_rate
+        if accepted:
+            quotation_status = "accepted"
+        else:
+            quotation_status = rng.choices(
+                ["draft", "sent", "pending_approval", "approved", "rejected"],
+                weights=[10, 35, 5, 10, 40],
+            )[0]
+
+        return {
+            "id": str(uuid.uuid4()),
+            "request_id": request["id"],
+            "salesperson_id": salesperson["id"],
+            "salesperson_name": salesperson["name"],
+            "title": f"{request['title']} - Quotation",
+            "options": options,
+            "selected_option": 0,
+            "total_price": options[0]["price"],
+            "margin": options[0]["margin"],
+            "validity_days": 7,
+            "status": quotation_status,
+            "created_at": created_at,
+            "updated_at": created_at + timedelta(hours=rng.uniform(1, 96)),
+            "version": 1,
+        }
+
+    def _booking(self, request, quotation):
+        rng = self.rng
+        created_at = quotation["updated_at"]
+        total = quotation["total_price"]
+        transactions = []
+        amount_paid = 0.0
+        for i in range(rng.choices([0, 1, 2, 3], weights=[10, 40, 35, 15])[0]):
+            amount = round(total * rng.choice([0.25, 0.3, 0.5]), 2)
+            amount = min(amount, total - amount_paid)
+            if amount <= 0:
+                break
+            amount_paid += amount
+            transactions.append({
+                "id": str(uuid.uuid4()),
+                "booking_id": None,
+                "amount": amount,
+                "payment_method": rng.choice(PAYMENT_METHODS),
+                "transaction_id": f"TXN-{str(uuid.uuid4())[:8].upper()}",
+                "status": "completed",
+                "gateway_response": None,
+                "created_at": created_at + timedelta(days=i * rng.randint(1, 14)),
+            })
+
+        cancelled = rng.random() < 0.05
+        if cancelled and amount_paid:
+            transactions.append({
+                "id": str(uuid.uuid4()),
+                "booking_id": None,
+                "amount": -amount_paid,
+                "payment_method": "refund",
+                "transaction_id": f"REF-{str(uuid.uuid4())[:8].upper()}",
+                "status": "completed",
+                "gateway_response": None,
+                "created_at": created_at + timedelta(days=rng.randint(1, 30)),
+            })
+
+        if amount_paid >= total:
+            payment_status = "paid"
+        elif amount_paid:
+            payment_status = "partial"
+        else:
+            payment_status = "pending"
+        if cancelled and amount_paid:
+            payment_status = "refunded"
+
+        departed = request["departure_date"] < self.now
+        booking = {
+            "id": str(uuid.uuid4()),
+            "quotation_id": quotation["id"],
+            "request_id": request["id"],
+            "customer_id": request["customer_id"],
+            "customer_name": request["customer_name"],
+            "salesperson_id": quotation["salesperson_id"],
+            "total_amount": total,
+            "amount_paid": amount_paid,
+            "payment_status": payment_status,
+            "booking_status": "cancelled" if cancelled else ("completed" if departed else "confirmed"),
+            "travel_date": request["departure_date"],
+            "operation_notes": None,
+            "created_at": created_at,
+            "updated_at": max([created_at] + [t["created_at"] for t in transactions]),
+            "version": 1,
+        }
+        for transaction in transactions:
+            transaction["booking_id"] = booking["id"]
+        return booking, transactions
+
+    def generate_batch(self, size):
+        """Generate one batch of related documents keyed by collection name."""
+        batch = {"travel_requests": [], "quotations": [], "bookings": [], "payment_transactions": []}
+        salespeople_by_id = {sp["id"]: sp for sp in self.salespeople}
+        for _ in range(size):
+            request = self._request()
+            batch["travel_requests"].append(request)
+            if self.rng.random() >= self.quote_rate:
+                continue
+
+            quotation = self._quotation(request, salespeople_by_id[request["assigned_salesperson"]])
+            batch["quotations"].append(quotation)
+            request["status"] = "quoted"
+            request["first_quoted_at"] = quotation["created_at"]
+            request["updated_at"] = quotation["created_at"]
+            if quotation["status"] != "accepted":
+                if quotation["status"] == "rejected" and self.rng.random() < 0.5:
+                    request["status"] = "cancelled"
+                continue
+
+            booking, transactions = self._booking(request, quotation)
+            batch["bookings"].append(booking)
+            batch["payment_transactions"].extend(transactions)
+            request["status"] = "cancelled" if booking["booking_status"] == "cancelled" else "confirmed"
+            request["updated_at"] = booking["created_at"]
+        return batch
+
+
+def generate_users(salespeople, customers, password_hash, seed=42):
+    """Build salesperson and customer user documents sharing one password hash."""
+    rng = random.Random(seed)
+    first_names = ["Aarav", "Diya", "Vivaan", "Ananya", "Ishaan", "Kavya", "Rohan",
+                   "Meera", "Arjun", "Saanvi", "Kabir", "Nisha", "Dev", "Priya"]
+    last_names = ["Sharma", "Iyer", "Patel", "Reddy", "Nair", "Gupta", "Singh",
+                  "Menon", "Das", "Kapoor", "Joshi", "Rao"]
+    now = datetime.now(timezone.utc)
+
+    def user(role, index, department=None):
+        name = f"{rng.choice(first_names)} {rng.choice(last_names)}"
+        return {
+            "id": str(uuid.uuid4()),
+            "email": f"{role}{index}@synthetic.demo",
+            "password": password_hash,
+            "name": name,
+            "role": role,
+            "department": department,
+            "phone": f"+91-9{rng.randint(100000000, 999999999)}",
+            "created_at": now,
+        }
+
+    return (
+        [user("salesperson", i, "Sales") for i in range(salespeople)],
+        [user("customer", i) for i in range(customers)],
+    )
+
+
+async def seed(db, requests, salespeople=40, customers=10000, batch_size=5000,
+               concurrency=8, seed=42, days=730, password="demo123"):
+    """Generate and bulk-insert a synthetic dataset, returning per-collection counts."""
+    password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(password)
+    sales_users, customer_users = generate_users(salespeople, customers, password_hash, seed)
+    for i in range(0, len(customer_users), batch_size):
+        await db.users.insert_many(customer_users[i:i + batch_size], ordered=False)
+    await db.users.insert_many(sales_users, ordered=False)
+
+    generator = SyntheticDataGenerator(sales_users, customer_users, seed=seed, days=days)
+    counts = {"users": len(sales_users) + len(customer_users)}
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = set()  # in-flight batches, plus failed ones until their errors are raised
+
+    def finished(task):
+        if not task.cancelled() and task.exception() is None:
+            pending.discard(task)
+
+    async def insert_batch(batch):
+        try:
+            await asyncio.gather(*(
+                db[name].insert_many(docs, ordered=False)
+                for name, docs in batch.items() if docs
+            ))
+        finally:
+            semaphore.release()
+
+    started = time.perf_counter()
+    remaining = requests
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        await semaphore.acquire()
+        # insert_batch releases the semaphore before its task is done and
+        # discarded, so a finished batch here is not necessarily a failed one
+        if any(task.done() and not task.cancelled() and task.exception() is not None for task in pending):
+            semaphore.release()
+            break  # a batch failed: stop generating and report it below
+        batch = generator.generate_batch(size)
+        for name, docs in batch.items():
+            counts[name] = counts.get(name, 0) + len(docs)
+        task = asyncio.create_task(insert_batch(batch))
+        pending.add(task)
+        task.add_done_callback(finished)
+        remaining -= size
+
+        done = requests - remaining
+        elapsed = time.perf_counter() - started
+        logger.info("Seeded %d/%d requests (%.0f req/s)", done, requests, done / elapsed if elapsed else 0)
+
+    errors = [result for result in await asyncio.gather(*pending, return_exceptions=True) if isinstance(result, BaseException)]
+    if errors:
+        raise errors[0]
+
+    # Rollups and change counters describe whatever was there before: rebuild
+    # the rollups and bump the counters so cached responses and ETags move on
+    await asyncio.gather(revenue.rebuild(db), performance.rebuild(db))
+    await db.collection_changes.bulk_write(
+        [UpdateOne({"_id": name}, {"$inc": {"version": 1}}, upsert=True) for name in counts],
+        ordered=False,
+    )
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed MongoDB with synthetic TripFlow data")
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--salespeople", type=int, default=40)
+    parser.add_argument("--customers", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--days", type=int, default=730, help="Spread request creation over this many past days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="Drop seeded collections and synthetic users first")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def run():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+        if args.drop:
+            await db.users.delete_many({"email": {"$regex": r"@synthetic\.demo$"}})
+            for name in ("travel_requests", "quotations", "bookings", "payment_transactions"):
+                await db[name].drop()
+        try:
+            counts = await seed(
+                db, args.requests, salespeople=args.salespeople, customers=args.customers,
+                batch_size=args.batch_size, concurrency=args.concurrency, seed=args.seed, days=args.days,
+            )
+        finally:
+            client.close()
+        for name, count in counts.items():
+            logger.info("%s: %d", name, count)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
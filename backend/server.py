@@ -1,30 +1,278 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response, UploadFile, File, status
+from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
+import asyncio
 import logging
+import time
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone, timedelta
+import csv
+import codecs
+import io
+import zipfile
+import re
+import hashlib
+import itertools
+import base64
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timezone, timedelta
 import jwt
+import numpy as np
 from passlib.context import CryptContext
 
+try:
+    import openpyxl
+except ImportError:  # XLSX uploads are rejected when openpyxl is missing
+    openpyxl = None
+from compression import CompressionMiddleware
+from ratelimit import RateLimitMiddleware, RatePolicy, MongoBucketStore
+from projection import parse_fields, mongo_projection, dump_partial, jsonable_partial
+from loader import Loaders, documents_by, with_fallback
+from response_cache import ResponseCache, MongoCacheTier, cached
+from assignment import AssignmentEngine, OPEN_STATUSES
+from rendering import QuotationRenderer, FORMATS as DOCUMENT_FORMATS
+from jobs import INDEXES as JOB_INDEXES, JobQueue
+from migrations import Migrator
+from archive import ArchivePolicy, Archiver, archive_collection, find_with_history
+from columnar import Column, Snapshot, Table, group_counts, group_sums, masked_codes, ratios
+from elasticity import FEATURE as ELASTICITY_FEATURE, PricingModels, acceptance, fit_hierarchy, log_loss, price_search, revenue_optimal_ratio, segment_quantiles
+from concurrency import StateMachine, WriteConflict, compare_and_set, read_modify_write, versioned
+from revenue import BUCKET_INDEXES as REVENUE_BUCKET_INDEXES, record as record_revenue, revenue_series, rebuild as rebuild_revenue_buckets
+from performance import record as record_performance, salesperson_summary, team_summaries, rebuild as rebuild_performance_metrics
+
+PROCESS_STARTED_AT = time.monotonic()
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+class LazyDatabase:
+    """Proxy that creates the Mongo client on first collection access."""
+
+    def __init__(self, mongo_url, db_name):
+        self._mongo_url = mongo_url
+        self._db_name = db_name
+        self._client = None
+        self._db = None
+
+    def _database(self):
+        if self._db is None:
+            self._client = AsyncIOMotorClient(self._mongo_url)
+            self._db = self._client[self._db_name]
+        return self._db
+
+    def __getattr__(self, name):
+        return getattr(self._database(), name)
+
+    def __getitem__(self, name):
+        return self._database()[name]
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+db = LazyDatabase(os.environ['MONGO_URL'], os.environ['DB_NAME'])
+
+# Response cache: per-process LRU, optionally backed by a shared Mongo TTL collection
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 60))
+SHARED_RESPONSE_CACHE = os.environ.get("RESPONSE_CACHE_SHARED", "").lower() == "mongo"
+response_cache = ResponseCache(
+    maxsize=int(os.environ.get("RESPONSE_CACHE_SIZE", 1024)),
+    shared=MongoCacheTier(db) if SHARED_RESPONSE_CACHE else None,
+)
+
+# In-memory salesperson workload, loaded during warm-up and updated on every assignment
+assignment_engine = AssignmentEngine()
+
+# Quotation documents are rendered in a process pool and cached per version
+quotation_renderer = QuotationRenderer(
+    max_workers=int(os.environ["RENDER_WORKERS"]) if os.environ.get("RENDER_WORKERS") else None,
+    cache_size=int(os.environ.get("RENDER_CACHE_SIZE", 256)),
+)
+
+# Slow side effects run as background jobs. With JOB_WORKER_MODE=external the API
+# only enqueues them and `python jobs.py --processes N` does the work.
+JOB_WORKER_MODE = os.environ.get("JOB_WORKER_MODE", "inline")
+JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", 7))
+job_queue = JobQueue(db, poll_interval=float(os.environ.get("JOB_POLL_INTERVAL", 1.0)))
+
+# Schema migrations run in the background in the API process unless
+# MIGRATION_MODE=external (then run `python migrations.py`)
+MIGRATION_MODE = os.environ.get("MIGRATION_MODE", "inline")
+migrator = Migrator(
+    db,
+    batch_size=int(os.environ.get("MIGRATION_BATCH_SIZE", 500)),
+    duty_cycle=float(os.environ.get("MIGRATION_DUTY_CYCLE", 0.25)),
+)
+
+# Delta sync: deletions leave tombstones that are kept this long; clients whose
+# token is older must resync from scratch
+SYNC_TOMBSTONE_DAYS = int(os.environ.get("SYNC_TOMBSTONE_DAYS", 30))
+SYNC_CLOCK_SKEW_SECONDS = float(os.environ.get("SYNC_CLOCK_SKEW_SECONDS", 5))
+# A full sync is returned in pages of at most this many documents
+SYNC_PAGE_SIZE = int(os.environ.get("SYNC_PAGE_SIZE", 1000))
+
+# Hot/cold tiering: finished records older than ARCHIVE_AFTER_DAYS move to
+# *_archive collections, and untouched draft quotations expire, on a schedule
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
+ARCHIVE_INTERVAL_HOURS = float(os.environ.get("ARCHIVE_INTERVAL_HOURS", 24))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", 500))
+DRAFT_TTL_DAYS = int(os.environ.get("DRAFT_TTL_DAYS", 30))
+
+# Manager analytics run on an in-process columnar snapshot refreshed at most
+# every ANALYTICS_REFRESH_SECONDS; each table keeps at most ANALYTICS_MAX_ROWS rows
+ANALYTICS_REFRESH_SECONDS = float(os.environ.get("ANALYTICS_REFRESH_SECONDS", 30))
+ANALYTICS_MAX_ROWS = int(os.environ.get("ANALYTICS_MAX_ROWS", 1_000_000))
+
+# Price elasticity models are refitted from quotation outcomes every
+# PRICING_MODEL_REFIT_HOURS; PRICING_MODEL_PENALTY is the ridge strength pulling
+# sparse segments towards their parent segment's curve
+PRICING_MODEL_REFIT_HOURS = float(os.environ.get("PRICING_MODEL_REFIT_HOURS", 24))
+PRICING_MODEL_PENALTY = float(os.environ.get("PRICING_MODEL_PENALTY", 5))
+
+# Rate limit buckets are per process unless RATE_LIMIT_BACKEND=mongo shares them between workers
+SHARED_RATE_LIMITS = os.environ.get("RATE_LIMIT_BACKEND", "").lower() == "mongo"
+
+# Indexes built during warm-up, keyed by collection
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("role", ASCENDING)]),
+    ],
+    "travel_requests": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("customer_id", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("updated_at", ASCENDING)]),
+        IndexModel([("assigned_salesperson", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("schema_version", ASCENDING)]),
+        IndexModel([("departure_date", ASCENDING)]),
+        IndexModel(
+            [("title", TEXT), ("destinations", TEXT), ("customer_name", TEXT), ("special_requirements", TEXT)],
+            weights={"title": 10, "destinations": 8, "customer_name": 5, "special_requirements": 2},
+            name="travel_requests_text"
+        ),
+    ],
+    "quotations": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("request_id", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("updated_at", ASCENDING)]),
+        IndexModel([("salesperson_id", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("schema_version", ASCENDING)]),
+        IndexModel(
+            [("title", TEXT), ("options.hotel", TEXT), ("options.activities", TEXT), ("options.line_items.name", TEXT)],
+            weights={"title": 10, "options.hotel": 5, "options.activities": 3, "options.line_items.name": 4},
+            name="quotations_text"
+        ),
+        IndexModel([("options.line_items.component", ASCENDING), ("options.line_items.name", ASCENDING)]),
+    ],
+    "bookings": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("customer_id", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("updated_at", ASCENDING)]),
+        IndexModel([("quotation_id", ASCENDING)], unique=True),
+        IndexModel([("schema_version", ASCENDING)]),
+        IndexModel([("booking_status", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("travel_date", ASCENDING), ("booking_status", ASCENDING)]),
+    ],
+    "payment_transactions": [
+        IndexModel([("booking_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "approval_requests": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("updated_at", ASCENDING)]),
+        IndexModel([("requested_by", ASCENDING), ("updated_at", ASCENDING)]),
+    ],
+    # Archives are only read for history, by the same keys as the list endpoints
+    archive_collection("travel_requests"): [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("customer_id", ASCENDING)]),
+    ],
+    archive_collection("quotations"): [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("request_id", ASCENDING)]),
+    ],
+    archive_collection("bookings"): [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("customer_id", ASCENDING)]),
+    ],
+    archive_collection("payment_transactions"): [
+        IndexModel([("booking_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "tombstones": [
+        IndexModel([("collection", ASCENDING), ("deleted_at", ASCENDING)]),
+        IndexModel([("deleted_at", ASCENDING)], expireAfterSeconds=SYNC_TOMBSTONE_DAYS * 86400),
+    ],
+    "revenue_buckets": REVENUE_BUCKET_INDEXES,
+    "pricing_models": [
+        IndexModel([("version", ASCENDING)], unique=True),
+    ],
+    "jobs": JOB_INDEXES + [
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=JOB_RETENTION_DAYS * 86400),
+    ],
+    "notifications": [
+        IndexModel([("user_id", ASCENDING), ("read", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+}
+if SHARED_RATE_LIMITS:
+    INDEXES["rate_limits"] = [IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0)]
+if SHARED_RESPONSE_CACHE:
+    INDEXES["response_cache"] = [IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0)]
 
 # Security setup
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", 15))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", 7))
+
+def load_signing_keys():
+    """Parse JWT_SIGNING_KEYS ("kid:secret,kid:secret") into a kid -> secret map.
+
+    New tokens are signed with JWT_ACTIVE_KID (default: the first key); every
+    listed key is still accepted, so a retired key can stay in the list until
+    its tokens expire. Without configuration, SECRET_KEY is used as kid "default".
+    """
+    keys = {}
+    for entry in os.environ.get("JWT_SIGNING_KEYS", "").split(","):
+        kid, _, secret = entry.strip().partition(":")
+        if kid and secret:
+            keys[kid] = secret
+    if not keys:
+        keys = {"default": SECRET_KEY}
+    active_kid = os.environ.get("JWT_ACTIVE_KID", next(iter(keys)))
+    if active_kid not in keys:
+        raise RuntimeError(f"JWT_ACTIVE_KID '{active_kid}' is not in JWT_SIGNING_KEYS")
+    return keys, active_kid
+
+SIGNING_KEYS, ACTIVE_KID = load_signing_keys()
+
+def load_legacy_token_cutoff() -> Optional[datetime]:
+    """Until when tokens without a kid (issued before key rotation) are accepted.
+
+    They were signed with the public SECRET_KEY, so they are only accepted
+    while SECRET_KEY is itself a configured signing key and before
+    JWT_LEGACY_TOKENS_UNTIL (an ISO datetime); without it, never.
+    """
+    until = os.environ.get("JWT_LEGACY_TOKENS_UNTIL")
+    if not until or SECRET_KEY not in SIGNING_KEYS.values():
+        return None
+    cutoff = datetime.fromisoformat(until)
+    return cutoff if cutoff.tzinfo else cutoff.replace(tzinfo=timezone.utc)
+
+LEGACY_TOKENS_UNTIL = load_legacy_token_cutoff()
 
 security = HTTPBearer()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -68,6 +316,36 @@ class Token(BaseModel):
     access_token: str
     token_type: str
     user: User
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class RefreshedToken(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+
+# Travel dates are stored as UTC datetimes so they can be range-queried on an index
+TRAVEL_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d %b %Y", "%d %B %Y", "%b %d, %Y")
+
+def parse_travel_date(value) -> datetime:
+    """Normalise a travel date (datetime, date or free-form string) to an aware UTC datetime"""
+    if isinstance(value, str):
+        text = value.strip()
+        for fmt in TRAVEL_DATE_FORMATS:
+            try:
+                value = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            value = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if not isinstance(value, datetime):
+        raise ValueError(f"Invalid travel date: {value!r}")
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
 
 class TravelRequest(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -79,8 +357,8 @@ class TravelRequest(BaseModel):
     adults: int
     children: int
     infants: int
-    departure_date: str
-    return_date: str
+    departure_date: datetime
+    return_date: datetime
     is_flexible_dates: bool = False
     budget_min: Optional[float] = None
     budget_max: Optional[float] = None
@@ -92,8 +370,115 @@ class TravelRequest(BaseModel):
     special_requirements: Optional[str] = None
     status: str = "pending"  # pending, quoted, confirmed, cancelled
     assigned_salesperson: Optional[str] = None
+    first_quoted_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 1
+    schema_version: int = Field(default_factory=lambda: migrator.target_version("travel_requests"))
+
+    @field_validator("departure_date", "return_date", mode="before")
+    @classmethod
+    def normalise_travel_dates(cls, value):
+        return parse_travel_date(value)
+
+# Quotation pricing: option prices are always computed server-side from line item costs
+LINE_ITEM_COMPONENTS = {"hotel", "transport", "activity", "meal", "tax", "other"}
+COMPONENT_ALIASES = {"accommodation": "hotel", "activities": "activity", "meals": "meal", "taxes": "tax"}
+
+def price_option(cost: float, markup_percentage: float) -> tuple:
+    """Selling price and margin (% of price) for a cost basis and markup"""
+    price = round(cost * (1 + markup_percentage / 100), 2)
+    margin = round((price - cost) / price * 100, 2) if price else 0.0
+    return price, margin
+
+def legacy_option_to_typed(option: dict, margin: float) -> dict:
+    """Convert a free-form option ({price, hotel, transport, activities, meals})
+    into line items. Legacy options only carry a package price, so the whole cost
+    basis (backed out of the quotation margin) goes on one package line."""
+    price = float(option.get("price", 0) or 0)
+    margin = min(max(float(margin or 0), 0.0), 99.0)
+    line_items = []
+    if option.get("hotel"):
+        line_items.append({"component": "hotel", "name": option["hotel"]})
+    if option.get("transport"):
+        line_items.append({"component": "transport", "name": option["transport"]})
+    for activity in option.get("activities") or []:
+        line_items.append({"component": "activity", "name": activity})
+    if option.get("meals"):
+        line_items.append({"component": "meal", "name": option["meals"]})
+    line_items.append({"component": "other", "name": "Package", "unit_cost": round(price * (1 - margin / 100), 2)})
+    option_id = option.get("id") or option.get("name")
+    # Stable ids keep line items addressable across reads of a not yet migrated quotation
+    for index, item in enumerate(line_items, 1):
+        item["id"] = f"{option_id}-{index}"
+    return {
+        "id": option_id,
+        "name": option.get("name", "Option"),
+        "duration": option.get("duration"),
+        "markup_percentage": margin / (100 - margin) * 100,
+        "line_items": line_items
+    }
+
+class LineItem(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    component: str  # hotel, transport, activity, meal, tax, other
+    name: str
+    quantity: float = 1
+    unit_cost: float = 0
+    total_cost: float = 0
+
+    @model_validator(mode="before")
+    @classmethod
+    def accept_builder_fields(cls, data):
+        # QuotationBuilder sends category/description/unit_price and numeric ids
+        if isinstance(data, dict):
+            data = dict(data)
+            if "component" not in data and "category" in data:
+                data["component"] = data.pop("category")
+            if "name" not in data and "description" in data:
+                data["name"] = data.pop("description")
+            if "unit_cost" not in data and "unit_price" in data:
+                data["unit_cost"] = data.pop("unit_price")
+            if "id" in data:
+                data["id"] = str(data["id"])
+            if isinstance(data.get("component"), str):
+                component = data["component"].lower()
+                data["component"] = COMPONENT_ALIASES.get(component, component)
+        return data
+
+    @model_validator(mode="after")
+    def compute_total(self):
+        if self.component not in LINE_ITEM_COMPONENTS:
+            raise ValueError(f"component must be one of {sorted(LINE_ITEM_COMPONENTS)}")
+        self.total_cost = round(self.quantity * self.unit_cost, 2)
+        return self
+
+class QuotationOption(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    duration: Optional[str] = None
+    markup_percentage: float = 0
+    line_items: List[LineItem] = []
+    cost: float = 0
+    price: float = 0
+    margin: float = 0
+
+    @model_validator(mode="before")
+    @classmethod
+    def accept_builder_fields(cls, data):
+        if isinstance(data, dict):
+            data = dict(data)
+            if "markup_percentage" not in data and "margin_percentage" in data:
+                data["markup_percentage"] = data.pop("margin_percentage")
+            if "id" in data:
+                data["id"] = str(data["id"])
+        return data
+
+    @model_validator(mode="after")
+    def compute_pricing(self):
+        self.cost = round(sum(item.total_cost for item in self.line_items), 2)
+        self.price, self.margin = price_option(self.cost, self.markup_percentage)
+        return self
 
 class Quotation(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -101,26 +486,176 @@ class Quotation(BaseModel):
     salesperson_id: str
     salesperson_name: str
     title: str
-    options: List[dict]  # Multiple quotation options A, B, C
-    total_price: float
-    margin: float
+    options: List[QuotationOption]  # Multiple quotation options A, B, C
+    selected_option: int = 0  # Option whose price is quoted as total_price
+    total_price: float = 0
+    margin: float = 0
     validity_days: int = 7
     status: str = "draft"  # draft, sent, approved, rejected, accepted
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 1
+    schema_version: int = Field(default_factory=lambda: migrator.target_version("quotations"))
+
+    @model_validator(mode="before")
+    @classmethod
+    def upgrade_legacy_options(cls, data):
+        if isinstance(data, dict) and data.get("options"):
+            data = dict(data)
+            data["options"] = [
+                legacy_option_to_typed(option, data.get("margin", 0))
+                if isinstance(option, dict) and "line_items" not in option else option
+                for option in data["options"]
+            ]
+        return data
+
+    @model_validator(mode="after")
+    def compute_totals(self):
+        if self.options:
+            self.selected_option = min(max(self.selected_option, 0), len(self.options) - 1)
+            selected = self.options[self.selected_option]
+            self.total_price, self.margin = selected.price, selected.margin
+        return self
+
+class QuotationCreate(BaseModel):
+    request_id: str
+    title: str
+    options: List[QuotationOption]
+    selected_option: int = 0
+    validity_days: int = 7
+
+class LineItemUpdate(BaseModel):
+    name: Optional[str] = None
+    quantity: Optional[float] = None
+    unit_cost: Optional[float] = None
+
+    @field_validator("name", "quantity", "unit_cost")
+    @classmethod
+    def reject_null(cls, value):
+        # Omit a field to leave it unchanged; null would blank a required value
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+class QuotationAcceptance(BaseModel):
+    option_id: Optional[str] = None  # defaults to the quotation's selected option
 
 class Booking(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     quotation_id: str
+    request_id: Optional[str] = None
+    option_id: Optional[str] = None
     customer_id: str
     customer_name: str
+    salesperson_id: Optional[str] = None
     total_amount: float
+    amount_paid: float = 0
     payment_status: str = "pending"  # pending, partial, paid, refunded
     booking_status: str = "confirmed"  # confirmed, cancelled, completed
-    travel_date: str
+    travel_date: datetime
     operation_notes: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 1
+    schema_version: int = Field(default_factory=lambda: migrator.target_version("bookings"))
+
+    @field_validator("travel_date", mode="before")
+    @classmethod
+    def normalise_travel_date(cls, value):
+        return parse_travel_date(value)
+
+class TravelRequestUpdate(BaseModel):
+    title: Optional[str] = None
+    departure_date: Optional[datetime] = None
+    return_date: Optional[datetime] = None
+    is_flexible_dates: Optional[bool] = None
+    budget_min: Optional[float] = None
+    budget_max: Optional[float] = None
+    special_requirements: Optional[str] = None
+    status: Optional[str] = None
+
+    @field_validator("departure_date", "return_date", mode="before")
+    @classmethod
+    def normalise_travel_dates(cls, value):
+        return parse_travel_date(value) if value is not None else None
+
+class BookingUpdate(BaseModel):
+    booking_status: Optional[str] = None
+    operation_notes: Optional[str] = None
+
+# Status lifecycles. Updates are guarded by the states a transition is allowed
+# from, so an illegal move matches nothing instead of needing a read first.
+REQUEST_STATES = StateMachine("request", {
+    "pending": ["quoted", "confirmed", "cancelled"],
+    "quoted": ["confirmed", "cancelled"],
+    "confirmed": ["cancelled"],
+    "cancelled": [],
+})
+QUOTATION_STATES = StateMachine("quotation", {
+    "draft": ["sent", "pending_approval"],
+    "sent": ["pending_approval", "accepted", "rejected"],
+    "pending_approval": ["approved", "draft"],  # a rejected discount sends it back to draft
+    "approved": ["sent", "pending_approval", "accepted"],
+    "rejected": ["draft"],
+    "accepted": [],
+})
+APPROVAL_STATES = StateMachine("approval", {
+    "pending": ["approved", "rejected"],
+    "approved": [],
+    "rejected": [],
+})
+BOOKING_STATES = StateMachine("booking", {
+    "confirmed": ["completed", "cancelled"],
+    "completed": [],
+    "cancelled": [],
+}, field="booking_status")
+
+# Schema migrations for documents written by older releases. The migrator
+# rewrites them in the background; list reads upgrade them lazily meanwhile.
+def upgrade_travel_dates(document: dict, fields: List[str]) -> dict:
+    """Legacy string travel dates as datetimes; unparseable values are logged and left alone"""
+    upgraded = {}
+    for field in fields:
+        if isinstance(document.get(field), str):
+            try:
+                upgraded[field] = parse_travel_date(document[field])
+            except ValueError:
+                logger.warning(f"Unparseable travel date {document[field]!r} in {document.get('id')}, leaving it unchanged")
+    return upgraded
+
+@migrator.register("travel_requests", 1, "travel dates as datetimes")
+def migrate_request_dates(document: dict, context) -> dict:
+    return upgrade_travel_dates(document, ["departure_date", "return_date"])
+
+@migrator.register("quotations", 1, "typed options priced from line items")
+def migrate_quotation_options(document: dict, context) -> dict:
+    options = document.get("options")
+    if not options or all(isinstance(option, dict) and "line_items" in option for option in options):
+        return {}
+    typed = [
+        QuotationOption(**(option if "line_items" in option else legacy_option_to_typed(option, document.get("margin", 0)))).dict()
+        for option in options
+    ]
+    selected = min(max(document.get("selected_option", 0), 0), len(typed) - 1)
+    return {"options": typed, "total_price": typed[selected]["price"], "margin": typed[selected]["margin"]}
+
+async def booking_ledger_totals(db, documents: List[dict]) -> dict:
+    """Net captured amounts for bookings written before amount_paid was stored"""
+    booking_ids = [document["id"] for document in documents if "amount_paid" not in document and "id" in document]
+    if not booking_ids:
+        return {}
+    rows = await db.payment_transactions.aggregate([
+        {"$match": {"booking_id": {"$in": booking_ids}, "status": "completed"}},
+        {"$group": {"_id": "$booking_id", "amount_paid": {"$sum": "$amount"}}}
+    ]).to_list(None)
+    return {row["_id"]: max(0, round(row["amount_paid"], 2)) for row in rows}
+
+@migrator.register("bookings", 1, "travel dates as datetimes, amount_paid from the ledger", prepare=booking_ledger_totals)
+def migrate_booking_payments(document: dict, ledger: dict) -> dict:
+    upgraded = upgrade_travel_dates(document, ["travel_date"])
+    if "amount_paid" not in document and "id" in document:
+        upgraded["amount_paid"] = ledger.get(document["id"], 0)
+    return upgraded
 
 # Authentication functions
 def verify_password(plain_password, hashed_password):
@@ -129,19 +664,92 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+class VerifiedTokenCache:
+    """LRU of verified token payloads keyed by token hash, each entry bounded by its exp."""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = hashlib.sha256(token.encode()).digest()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        payload, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    def put(self, token: str, payload: dict):
+        expires_at = payload.get("exp")
+        if expires_at is None:
+            return
+        key = hashlib.sha256(token.encode()).digest()
+        self._entries[key] = (payload, expires_at)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+token_cache = VerifiedTokenCache(int(os.environ.get("TOKEN_CACHE_SIZE", 10000)))
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, token_type: str = "access"):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, "type": token_type})
+    encoded_jwt = jwt.encode(
+        to_encode, SIGNING_KEYS[ACTIVE_KID], algorithm=ALGORITHM, headers={"kid": ACTIVE_KID}
+    )
     return encoded_jwt
 
+def create_refresh_token(email: str):
+    return create_access_token(
+        {"sub": email, "jti": str(uuid.uuid4())},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        token_type="refresh",
+    )
+
+def decode_token(token: str, token_type: str = "access") -> dict:
+    """Verify a JWT, skipping signature checks for tokens already verified by this worker.
+
+    Raises jwt.PyJWTError for invalid, expired or wrong-type tokens.
+    """
+    payload = token_cache.get(token)
+    if payload is None:
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid:
+            key = SIGNING_KEYS.get(kid)
+            if key is None:
+                raise jwt.InvalidTokenError(f"Unknown signing key '{kid}'")
+        elif LEGACY_TOKENS_UNTIL is not None and datetime.now(timezone.utc) < LEGACY_TOKENS_UNTIL:
+            # Tokens issued before key rotation carry no kid and were signed with SECRET_KEY
+            key = SECRET_KEY
+        else:
+            raise jwt.InvalidTokenError("Token has no signing key id")
+        payload = jwt.decode(token, key, algorithms=[ALGORITHM])
+        token_cache.put(token, payload)
+    if payload.get("type", "access") != token_type:
+        raise jwt.InvalidTokenError("Wrong token type")
+    return payload
+
+def token_subject(token: str) -> Optional[str]:
+    """The subject of a valid access token, else None; picks per-user rate limit buckets"""
+    try:
+        return decode_token(token).get("sub")
+    except jwt.PyJWTError:
+        return None
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(credentials.credentials)
         email: str = payload.get("sub")
         if email is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
@@ -160,12 +768,15 @@ async def init_mock_data():
     if existing_users > 0:
         return
     
+    # Hash the shared demo password once, off the event loop
+    demo_password = await asyncio.to_thread(get_password_hash, "demo123")
+
     # Mock users for each role
     mock_users = [
         {
             "id": str(uuid.uuid4()),
             "email": "customer@demo.com",
-            "password": get_password_hash("demo123"),
+            "password": demo_password,
             "name": "John Customer",
             "role": "customer",
             "phone": "+91-9876543210",
@@ -174,7 +785,7 @@ async def init_mock_data():
         {
             "id": str(uuid.uuid4()),
             "email": "sales@demo.com", 
-            "password": get_password_hash("demo123"),
+            "password": demo_password,
             "name": "Sarah Sales",
             "role": "salesperson",
             "department": "Sales",
@@ -184,7 +795,7 @@ async def init_mock_data():
         {
             "id": str(uuid.uuid4()),
             "email": "manager@demo.com",
-            "password": get_password_hash("demo123"),
+            "password": demo_password,
             "name": "Mike Manager",
             "role": "sales_manager",
             "department": "Sales",
@@ -194,7 +805,7 @@ async def init_mock_data():
         {
             "id": str(uuid.uuid4()),
             "email": "ops@demo.com",
-            "password": get_password_hash("demo123"),
+            "password": demo_password,
             "name": "Olivia Operations",
             "role": "operations",
             "department": "Operations",
@@ -204,7 +815,7 @@ async def init_mock_data():
         {
             "id": str(uuid.uuid4()),
             "email": "admin@demo.com",
-            "password": get_password_hash("demo123"),
+            "password": demo_password,
             "name": "Alex Admin",
             "role": "admin",
             "department": "IT",
@@ -227,8 +838,8 @@ async def init_mock_data():
             "adults": 2,
             "children": 2,
             "infants": 0,
-            "departure_date": "2024-12-15",
-            "return_date": "2024-12-22",
+            "departure_date": datetime(2024, 12, 15, tzinfo=timezone.utc),
+            "return_date": datetime(2024, 12, 22, tzinfo=timezone.utc),
             "is_flexible_dates": False,
             "budget_min": 80000,
             "budget_max": 120000,
@@ -253,8 +864,8 @@ async def init_mock_data():
             "adults": 12,
             "children": 0,
             "infants": 0,
-            "departure_date": "2024-11-20",
-            "return_date": "2024-11-23",
+            "departure_date": datetime(2024, 11, 20, tzinfo=timezone.utc),
+            "return_date": datetime(2024, 11, 23, tzinfo=timezone.utc),
             "is_flexible_dates": True,
             "budget_min": 200000,
             "budget_max": 300000,
@@ -322,7 +933,7 @@ async def init_mock_data():
             "total_amount": 280000,
             "payment_status": "partial",
             "booking_status": "confirmed",
-            "travel_date": "2024-11-20",
+            "travel_date": datetime(2024, 11, 20, tzinfo=timezone.utc),
             "operation_notes": "Advance payment received. Hotel confirmed.",
             "created_at": datetime.now(timezone.utc),
             "updated_at": datetime.now(timezone.utc)
@@ -347,24 +958,283 @@ async def login(user_credentials: UserLogin):
     )
     
     user_obj = User(**user)
-    return Token(access_token=access_token, token_type="bearer", user=user_obj)
+    return Token(
+        access_token=access_token,
+        token_type="bearer",
+        user=user_obj,
+        refresh_token=create_refresh_token(user["email"])
+    )
+
+@api_router.post("/auth/refresh", response_model=RefreshedToken)
+async def refresh_access_token(refresh_request: RefreshRequest):
+    """Exchange a refresh token for a new access token without a database lookup"""
+    try:
+        payload = decode_token(refresh_request.refresh_token, token_type="refresh")
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    
+    access_token = create_access_token(
+        data={"sub": payload["sub"]}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return RefreshedToken(access_token=access_token, refresh_token=create_refresh_token(payload["sub"]))
 
 @api_router.get("/auth/me", response_model=User)
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
+# Conditional GET support: every write to a collection behind a list endpoint
+# bumps that collection's counter in `collection_changes`, and list ETags are
+# built from the counters, so an unchanged list is answered with 304 after one
+# indexed read instead of a scan of the caller's result set. Bumps follow the
+# write (and its transaction), so a response is never older than its ETag; the
+# estimated sizes also catch bulk loads made outside the API.
+async def record_change(*collections: str):
+    await db.collection_changes.bulk_write(
+        [UpdateOne({"_id": collection}, {"$inc": {"version": 1}}, upsert=True) for collection in set(collections)],
+        ordered=False
+    )
+
+async def collection_fingerprints(collections: list) -> list:
+    versions, *counts = await asyncio.gather(
+        db.collection_changes.find({"_id": {"$in": list(collections)}}).to_list(None),
+        *(db[collection].estimated_document_count() for collection in collections)
+    )
+    versions = {document["_id"]: document["version"] for document in versions}
+    return [(collection, versions.get(collection, 0), count) for collection, count in zip(collections, counts)]
+
+async def list_etag(request: Request, current_user: User, collections: list) -> str:
+    """Build a weak ETag for a response read from the given collections"""
+    fingerprints = await collection_fingerprints(collections)
+    scope = current_user.id if current_user.role == "customer" else current_user.role
+    digest = hashlib.sha1(
+        repr((request.url.path, str(request.query_params), scope, fingerprints)).encode()
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+def is_not_modified(request: Request, response: Response, etag: str) -> bool:
+    response.headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+# Conditional updates: a document's ETag is its version, and If-Match makes
+# the write a compare-and-swap against it (412 when it no longer matches)
+def document_etag(document: dict) -> str:
+    return f'"{document.get("version", 1)}"'
+
+def if_match_version(request: Request) -> Optional[int]:
+    if_match = request.headers.get("if-match")
+    if not if_match or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a document version ETag")
+
+def conflict_error(conflict: WriteConflict, label: str, precondition: bool = False) -> HTTPException:
+    """Map a failed conditional write to 404, 409 or (for If-Match requests) 412"""
+    if conflict.reason == "missing":
+        return HTTPException(status_code=404, detail=f"{label} not found")
+    if conflict.reason == "version":
+        if precondition:
+            return HTTPException(status_code=412, detail=f"{label} has changed since it was read")
+        return HTTPException(status_code=409, detail=f"{label} was modified concurrently, retry the update")
+    return HTTPException(
+        status_code=409,
+        detail=f"{label} cannot move from '{conflict.current_state}' to '{conflict.target}'"
+    )
+
+# Sparse fieldsets: ?fields=a,b selects top-level fields (plus id). The
+# ETag already covers the query string, so each field list caches separately.
+FIELDS_QUERY = Query(None, description="Comma-separated fields to return, e.g. id,title,status")
+INCLUDE_ARCHIVED_QUERY = Query(False, description="Also return archived (finished and older) records")
+
+def history_sources(collection: str, include_archived: bool) -> list:
+    """ETag sources for a list read from a hot collection and, with history, its archive"""
+    sources = [collection]
+    if include_archived:
+        sources.append(archive_collection(collection))
+    return sources
+
+def requested_fields(model, fields: Optional[str]) -> Optional[tuple]:
+    try:
+        return parse_fields(model, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def partial_response(model, fields: tuple, documents: list, etag: Optional[str] = None) -> Response:
+    """Serialise projected documents with the partial model, bypassing the full response_model"""
+    return Response(
+        content=dump_partial(model, fields, documents),
+        media_type="application/json",
+        headers={"ETag": etag} if etag else None
+    )
+
+# Related-document expansion: ?include=request,customer embeds related
+# documents. Rows are expanded concurrently through request-scoped loaders,
+# so each related collection is read with one $in query per nesting level.
+INCLUDE_QUERY = Query(None, description="Comma-separated related documents to embed, e.g. request,customer")
+USER_SUMMARY_PROJECTION = {"id": 1, "email": 1, "name": 1, "role": 1, "department": 1, "phone": 1, "created_at": 1}
+
+class PaymentSummary(BaseModel):
+    total_paid: float = 0
+    total_refunded: float = 0
+    transactions: int = 0
+    last_payment_at: Optional[datetime] = None
+
+async def payment_summaries(booking_ids: list, collection: str = "payment_transactions") -> dict:
+    rows = await db[collection].aggregate([
+        {"$match": {"booking_id": {"$in": booking_ids}, "status": "completed"}},
+        {"$group": {
+            "_id": "$booking_id",
+            "total_paid": {"$sum": {"$cond": [{"$gt": ["$amount", 0]}, "$amount", 0]}},
+            "total_refunded": {"$sum": {"$cond": [{"$lt": ["$amount", 0]}, {"$multiply": ["$amount", -1]}, 0]}},
+            "transactions": {"$sum": 1},
+            "last_payment_at": {"$max": "$created_at"}
+        }}
+    ]).to_list(None)
+    return {row.pop("_id"): row for row in rows}
+
+def request_loaders(include_archived: bool = INCLUDE_ARCHIVED_QUERY) -> Loaders:
+    """Batching loaders shared by everything that runs for one API request"""
+    batch_fns = {
+        "request": documents_by(db.travel_requests),
+        "quotation": documents_by(db.quotations),
+        "user": documents_by(db.users, projection=USER_SUMMARY_PROJECTION),
+        "payments": payment_summaries,
+    }
+    if include_archived:
+        # Archived rows refer to archived documents; look there for what is no longer hot
+        batch_fns["request"] = with_fallback(batch_fns["request"], documents_by(db[archive_collection("travel_requests")]))
+        batch_fns["quotation"] = with_fallback(batch_fns["quotation"], documents_by(db[archive_collection("quotations")]))
+        batch_fns["payments"] = with_fallback(
+            payment_summaries, lambda booking_ids: payment_summaries(booking_ids, archive_collection("payment_transactions"))
+        )
+    return Loaders(batch_fns)
+
+def embed(model, document: Optional[dict]) -> Optional[dict]:
+    return jsonable_partial(model, None, [document])[0] if document else None
+
+def requested_includes(include: Optional[str], available: dict) -> set:
+    """Parse ?include= against an endpoint's {name: local key fields} map"""
+    if not include:
+        return set()
+    names = {name.strip() for name in include.split(",") if name.strip()}
+    unknown = names - set(available)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown includes: {', '.join(sorted(unknown))} (available: {', '.join(sorted(available))})"
+        )
+    return names
+
+def with_include_keys(selected: Optional[tuple], includes: set, available: dict) -> Optional[tuple]:
+    """Add the local key fields that the includes need to a sparse field selection"""
+    if not selected or not includes:
+        return selected
+    return tuple(sorted(set(selected).union(*(available[name] for name in includes))))
+
+def include_etag_sources(includes: set) -> list:
+    """Embedded documents change the response too, so their collections join the ETag"""
+    return sorted({INCLUDE_ETAG_SOURCES[name] for name in includes if name in INCLUDE_ETAG_SOURCES})
+
+async def shaped_response(model, selected, documents, etag, includes=(), expand=None, loaders=None) -> Response:
+    """Serialise documents for ?fields= and/or ?include= requests"""
+    if not includes:
+        return partial_response(model, selected, documents, etag)
+    items = jsonable_partial(model, selected, documents)
+    await asyncio.gather(*(expand(item, includes, loaders) for item in items))
+    return JSONResponse(content=items, headers={"ETag": etag})
+
+REQUEST_INCLUDES = {"customer": ("customer_id",), "salesperson": ("assigned_salesperson",)}
+QUOTATION_INCLUDES = {"request": ("request_id",), "customer": ("request_id",), "salesperson": ("salesperson_id",)}
+BOOKING_INCLUDES = {
+    "quotation": ("quotation_id",),
+    "request": ("request_id", "quotation_id"),
+    "customer": ("customer_id",),
+    "payments": ("id",),
+}
+# Embedded users are left out: the API never changes a user once created, and
+# embedding a new one takes a write to the listed document itself
+INCLUDE_ETAG_SOURCES = {
+    "request": "travel_requests",
+    "quotation": "quotations",
+    "payments": "payment_transactions",
+}
+
+async def expand_travel_request(item: dict, includes: set, loaders: Loaders):
+    if "customer" in includes:
+        item["customer"] = embed(User, await loaders["user"].load(item["customer_id"]))
+    if "salesperson" in includes:
+        item["salesperson"] = embed(User, await loaders["user"].load(item["assigned_salesperson"]))
+
+async def expand_quotation(item: dict, includes: set, loaders: Loaders):
+    if "salesperson" in includes:
+        item["salesperson"] = embed(User, await loaders["user"].load(item["salesperson_id"]))
+    if "request" in includes or "customer" in includes:
+        request = await loaders["request"].load(item["request_id"])
+        if "request" in includes:
+            item["request"] = embed(TravelRequest, request)
+        if "customer" in includes:
+            item["customer"] = embed(User, await loaders["user"].load(request["customer_id"] if request else None))
+
+async def expand_booking(item: dict, includes: set, loaders: Loaders):
+    if "customer" in includes:
+        item["customer"] = embed(User, await loaders["user"].load(item["customer_id"]))
+    if "payments" in includes:
+        item["payments"] = PaymentSummary(**(await loaders["payments"].load(item["id"]) or {})).model_dump(mode="json")
+    quotation = None
+    if "quotation" in includes or ("request" in includes and not item.get("request_id")):
+        quotation = await loaders["quotation"].load(item["quotation_id"])
+    if "quotation" in includes:
+        item["quotation"] = embed(Quotation, quotation)
+    if "request" in includes:
+        # Bookings created before request_id was stored reach the request through their quotation
+        request_id = item.get("request_id") or (quotation or {}).get("request_id")
+        item["request"] = embed(TravelRequest, await loaders["request"].load(request_id))
+
 # Travel Request endpoints
 @api_router.get("/requests", response_model=List[TravelRequest])
-async def get_travel_requests(current_user: User = Depends(get_current_user)):
+async def get_travel_requests(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = FIELDS_QUERY,
+    include: Optional[str] = INCLUDE_QUERY,
+    include_archived: bool = INCLUDE_ARCHIVED_QUERY,
+    loaders: Loaders = Depends(request_loaders),
+    current_user: User = Depends(get_current_user)
+):
+    selected = requested_fields(TravelRequest, fields)
+    includes = requested_includes(include, REQUEST_INCLUDES)
+    selected = with_include_keys(selected, includes, REQUEST_INCLUDES)
     if current_user.role == "customer":
-        requests = await db.travel_requests.find({"customer_id": current_user.id}).to_list(1000)
+        query = {"customer_id": current_user.id}
     elif current_user.role in ["salesperson", "sales_manager"]:
-        requests = await db.travel_requests.find().to_list(1000)
+        query = {}
     elif current_user.role in ["operations", "admin"]:
-        requests = await db.travel_requests.find().to_list(1000)
+        query = {}
     else:
-        requests = []
+        return []
     
+    etag = await list_etag(request, current_user, [
+        *history_sources("travel_requests", include_archived), *include_etag_sources(includes)
+    ])
+    if is_not_modified(request, response, etag):
+        return not_modified_response(etag)
+    
+    if selected or includes:
+        requests = await migrator.upgrade_documents("travel_requests", await find_with_history(
+            db, "travel_requests", query, mongo_projection(selected) if selected else None, include_archived
+        ))
+        return await shaped_response(TravelRequest, selected, requests, etag, includes, expand_travel_request, loaders)
+    requests = await migrator.upgrade_documents(
+        "travel_requests", await find_with_history(db, "travel_requests", query, include_archived=include_archived)
+    )
     return [TravelRequest(**request) for request in requests]
 
 @api_router.post("/requests", response_model=TravelRequest)
@@ -372,123 +1242,1183 @@ async def create_travel_request(request_data: dict, current_user: User = Depends
     request_data["customer_id"] = current_user.id
     request_data["customer_name"] = current_user.name
     request_obj = TravelRequest(**request_data)
-    await db.travel_requests.insert_one(request_obj.dict())
+    assign_salesperson(request_obj)
+    try:
+        await db.travel_requests.insert_one(request_obj.dict())
+    except Exception:
+        release_assignment(request_obj.dict())
+        raise
+    await asyncio.gather(
+        record_change("travel_requests"),
+        record_performance(db, request_obj.assigned_salesperson, requests_assigned=1)
+    )
     return request_obj
 
-# Quotation endpoints
-@api_router.get("/quotations", response_model=List[Quotation])
-async def get_quotations(current_user: User = Depends(get_current_user)):
+@api_router.patch("/requests/{request_id}", response_model=TravelRequest)
+async def update_travel_request(
+    request_id: str,
+    update: TravelRequestUpdate,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
+    """Edit a travel request or move its status; If-Match makes the update conditional on the version"""
+
+    if current_user.role not in ["customer", "salesperson", "sales_manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    changes = update.dict(exclude_unset=True)
+    target = changes.pop("status", None)
+    if not changes and target is None:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    if target is not None and target not in REQUEST_STATES.states:
+        raise HTTPException(status_code=400, detail=f"status must be one of {sorted(REQUEST_STATES.states)}")
+    if target == "confirmed":
+        raise HTTPException(status_code=400, detail="Requests are confirmed by accepting a quotation")
+    if current_user.role == "customer" and target not in (None, "cancelled"):
+        raise HTTPException(status_code=403, detail="Customers can only cancel their requests")
+
+    key = {"id": request_id}
     if current_user.role == "customer":
-        # Get quotations for customer's requests
-        customer_requests = await db.travel_requests.find({"customer_id": current_user.id}).to_list(1000)
-        request_ids = [req["id"] for req in customer_requests]
-        quotations = await db.quotations.find({"request_id": {"$in": request_ids}}).to_list(1000)
-    else:
-        quotations = await db.quotations.find().to_list(1000)
+        key["customer_id"] = current_user.id
+    expected_version = if_match_version(request)
+    now = datetime.now(timezone.utc)
+    try:
+        # The previous status decides whether the request leaves its salesperson's open workload
+        previous = await compare_and_set(
+            db.travel_requests, key, {"$set": changes},
+            version=expected_version,
+            machine=REQUEST_STATES if target else None, target=target,
+            now=now, return_document=ReturnDocument.BEFORE
+        )
+    except WriteConflict as conflict:
+        raise conflict_error(conflict, "Request", precondition=expected_version is not None)
+    await record_change("travel_requests")
+
+    updated = {**previous, **changes, "updated_at": now, "version": previous.get("version", 1) + 1}
+    if target:
+        updated["status"] = target
+        if target not in OPEN_STATUSES:
+            release_assignment(previous)
+    response.headers["ETag"] = document_etag(updated)
+    return TravelRequest(**updated)
+
+# Salesperson assignment
+def as_utc(value: datetime) -> datetime:
+    """Mongo returns naive UTC datetimes; make them comparable with aware ones"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def assign_salesperson(request_obj: TravelRequest):
+    if request_obj.assigned_salesperson is None:
+        salesperson = assignment_engine.assign(request_obj.destinations)
+        if salesperson:
+            request_obj.assigned_salesperson = salesperson.id
+
+def release_assignment(request: dict):
+    """Take a request off its salesperson's open workload"""
+    if request.get("assigned_salesperson") and request.get("status", "pending") in OPEN_STATUSES:
+        assignment_engine.release(request["assigned_salesperson"])
+
+async def record_first_quotation(request_id: str):
+    """Stamp the request's first quotation time and feed the response time to the assignment engine"""
+    now = datetime.now(timezone.utc)
+    request = await db.travel_requests.find_one_and_update(
+        {"id": request_id, "first_quoted_at": None},
+        versioned({"$set": {"first_quoted_at": now}}, now),
+        projection={"created_at": 1, "assigned_salesperson": 1}
+    )
+    if request:
+        await record_change("travel_requests")
+    if request and request.get("assigned_salesperson"):
+        hours = (now - as_utc(request["created_at"])).total_seconds() / 3600
+        assignment_engine.record_response(request["assigned_salesperson"], hours)
+        await record_performance(db, request["assigned_salesperson"], requests_quoted=1, response_hours_total=hours)
+
+async def record_assignments(documents: List[dict]):
+    """Count newly inserted requests in their salespeople's running metrics"""
+    counts = Counter(document["assigned_salesperson"] for document in documents if document.get("assigned_salesperson"))
+    await asyncio.gather(*(
+        record_performance(db, salesperson_id, requests_assigned=count) for salesperson_id, count in counts.items()
+    ))
+
+@api_router.get("/assignment/workload")
+async def get_assignment_workload(current_user: User = Depends(get_current_user)):
+    """Get the current open workload per salesperson"""
     
-    return [Quotation(**quotation) for quotation in quotations]
+    if current_user.role not in ["sales_manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return assignment_engine.snapshot()
 
-# Booking endpoints
-@api_router.get("/bookings", response_model=List[Booking])
-async def get_bookings(current_user: User = Depends(get_current_user)):
-    if current_user.role == "customer":
-        bookings = await db.bookings.find({"customer_id": current_user.id}).to_list(1000)
-    else:
-        bookings = await db.bookings.find().to_list(1000)
+# Bulk intake: rows are read and validated a batch at a time in a worker thread
+# and inserted in unordered batches, so large uploads never sit in memory whole
+BULK_INSERT_BATCH_SIZE = 1000
+BULK_MAX_REPORTED_ERRORS = 1000
+BULK_LIST_FIELDS = {"destinations", "transport_modes"}
+BULK_BOOL_FIELDS = {"is_flexible_dates", "budget_per_person"}
+
+class BulkIntakeResult(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    failed: int = 0
+    errors: List[dict] = []
+    errors_truncated: bool = False
+    # Set when reading stopped partway; rows before it were still processed
+    read_error: Optional[str] = None
+
+def normalize_request_row(row: dict) -> dict:
+    """Coerce spreadsheet-style cells into TravelRequest field types"""
+    normalized = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        key = re.sub(r"\s+", "_", str(key).strip().lower())
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == "":
+            continue
+        if key in BULK_LIST_FIELDS and isinstance(value, str):
+            value = [item.strip() for item in re.split(r"[;,|]", value) if item.strip()]
+        elif key in BULK_BOOL_FIELDS and isinstance(value, str):
+            value = value.lower() in ("1", "true", "yes", "y")
+        normalized[key] = value
     
-    return [Booking(**booking) for booking in bookings]
+    if "travelers_count" not in normalized:
+        counts = [normalized.get(field) for field in ("adults", "children", "infants")]
+        if all(count is not None for count in counts):
+            normalized["travelers_count"] = sum(int(count) for count in counts)
+    return normalized
 
-# Dashboard stats endpoints
-@api_router.get("/dashboard/stats")
-async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
-    stats = {}
+def describe_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors()
+    )
+
+def parse_request_rows(rows, first_row: int, current_user: User, read_errors=()):
+    """Read and validate up to one batch of rows; runs in a worker thread.
     
-    if current_user.role == "customer":
-        stats = {
-            "active_requests": await db.travel_requests.count_documents({"customer_id": current_user.id, "status": {"$in": ["pending", "quoted"]}}),
-            "total_bookings": await db.bookings.count_documents({"customer_id": current_user.id}),
-            "pending_payments": await db.bookings.count_documents({"customer_id": current_user.id, "payment_status": {"$in": ["pending", "partial"]}})
-        }
-    elif current_user.role == "salesperson":
-        stats = {
-            "assigned_requests": await db.travel_requests.count_documents({"assigned_salesperson": current_user.id}),
-            "pending_quotations": await db.quotations.count_documents({"salesperson_id": current_user.id, "status": "draft"}),
-            "conversion_rate": 75.5,  # Mock data
-            "avg_response_time": "4.2 hours"  # Mock data
-        }
-    elif current_user.role == "sales_manager":
-        stats = {
-            "team_performance": 85.2,  # Mock data
-            "pending_approvals": await db.quotations.count_documents({"status": "pending_approval"}),
-            "monthly_revenue": 2500000,  # Mock data
-            "team_size": 8  # Mock data
-        }
-    elif current_user.role == "operations":
-        stats = {
-            "confirmed_bookings": await db.bookings.count_documents({"booking_status": "confirmed"}),
-            "pending_payments": await db.bookings.count_documents({"payment_status": {"$in": ["pending", "partial"]}}),
-            "upcoming_trips": 15,  # Mock data
-            "customer_satisfaction": 4.8  # Mock data
-        }
-    elif current_user.role == "admin":
-        stats = {
-            "total_users": await db.users.count_documents({}),
-            "total_requests": await db.travel_requests.count_documents({}),
-            "total_quotations": await db.quotations.count_documents({}),
-            "system_health": "Excellent"  # Mock data
-        }
+    Returns (row number, TravelRequest) pairs, (row number, error) pairs and
+    the message of any `read_errors` exception raised while reading `rows`.
+    Fewer rows than BULK_INSERT_BATCH_SIZE in total means `rows` is exhausted.
+    """
+    parsed, errors = [], []
+    batch = enumerate(itertools.islice(rows, BULK_INSERT_BATCH_SIZE), start=first_row)
+    while True:
+        try:
+            row_number, row = next(batch)
+        except StopIteration:
+            return parsed, errors, None
+        except read_errors as e:
+            return parsed, errors, str(e)
+        try:
+            row_data = normalize_request_row(row)
+            row_data["customer_id"] = current_user.id
+            row_data["customer_name"] = current_user.name
+            parsed.append((row_number, TravelRequest(**row_data)))
+        except ValidationError as e:
+            errors.append((row_number, describe_validation_error(e)))
+        except (TypeError, ValueError) as e:
+            errors.append((row_number, str(e)))
+
+async def bulk_insert_requests(rows, current_user: User, read_errors=()) -> BulkIntakeResult:
+    """Validate and insert `rows`; a `read_errors` exception stops reading but keeps earlier rows"""
+    result = BulkIntakeResult()
     
-    return stats
+    def record_error(row_number: int, message: str):
+        result.failed += 1
+        if len(result.errors) < BULK_MAX_REPORTED_ERRORS:
+            result.errors.append({"row": row_number, "error": message})
+        else:
+            result.errors_truncated = True
+    
+    async def insert_batch(documents: List[dict], row_numbers: List[int]):
+        try:
+            await db.travel_requests.insert_many(documents, ordered=False)
+            result.inserted += len(documents)
+            await record_assignments(documents)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            result.inserted += e.details.get("nInserted", len(documents) - len(write_errors))
+            for write_error in write_errors:
+                release_assignment(documents[write_error["index"]])
+                record_error(row_numbers[write_error["index"]], write_error.get("errmsg", "Write failed"))
+            failed = {write_error["index"] for write_error in write_errors}
+            await record_assignments([document for index, document in enumerate(documents) if index not in failed])
+        await record_change("travel_requests")
+    
+    rows = iter(rows)
+    row_number = 1
+    pending_insert = None
+    try:
+        while True:
+            # Reading the file (openpyxl in particular) and validation are CPU-bound
+            parsed, errors, result.read_error = await asyncio.to_thread(
+                parse_request_rows, rows, row_number, current_user, read_errors
+            )
+            read = len(parsed) + len(errors)
+            result.received += read
+            row_number += read
+            for error_row, message in errors:
+                record_error(error_row, message)
+            
+            documents, row_numbers = [], []
+            for parsed_row, request_obj in parsed:
+                assign_salesperson(request_obj)
+                documents.append(request_obj.dict())
+                row_numbers.append(parsed_row)
+            if documents:
+                # Keep one batch in flight while the next one is parsed
+                if pending_insert:
+                    await pending_insert
+                pending_insert = asyncio.create_task(insert_batch(documents, row_numbers))
+            if read < BULK_INSERT_BATCH_SIZE or result.read_error:
+                break
+    finally:
+        # Never leave an insert running unreported, even if reading fails
+        if pending_insert:
+            await pending_insert
+    return result
 
-# Rate Optimization Models
-class RateRecommendation(BaseModel):
-    request_id: str
-    recommended_price: float
-    confidence: float
-    reasoning: str
-    seasonal_factor: float = 1.0
-    competitor_delta: float = 0.0
-    demand_factor: float = 1.0
+def iter_csv_rows(upload: UploadFile):
+    yield from csv.DictReader(codecs.iterdecode(upload.file, "utf-8-sig"))
 
-class ScenarioSimulation(BaseModel):
-    base_price: float
-    hotel_star: int = 3
-    transport_class: str = "economy"
-    duration_days: int = 3
-    estimated_conversion: float = 0.75
+def iter_xlsx_rows(upload: UploadFile):
+    workbook = openpyxl.load_workbook(upload.file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = next(rows, None) or []
+        for values in rows:
+            if any(value is not None for value in values):
+                yield dict(zip(headers, values))
+    finally:
+        workbook.close()
 
-class ApprovalRequest(BaseModel):
-    quotation_id: str
-    discount_percentage: float
-    reason: str
-    requested_by: str
+@api_router.post("/requests/bulk", response_model=BulkIntakeResult)
+async def bulk_create_travel_requests(rows: List[dict], current_user: User = Depends(get_current_user)):
+    """Create travel requests from a JSON array, reporting per-row errors"""
+    return await bulk_insert_requests(rows, current_user)
 
-class PaymentTransaction(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    booking_id: str
-    amount: float
-    payment_method: str
-    transaction_id: Optional[str] = None
-    status: str = "pending"  # pending, completed, failed, refunded
-    gateway_response: Optional[dict] = None
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+@api_router.post("/requests/bulk/upload", response_model=BulkIntakeResult)
+async def upload_travel_requests(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    """Create travel requests from a CSV or XLSX upload, reporting per-row errors"""
+    
+    filename = (file.filename or "").lower()
+    if filename.endswith(".csv") or file.content_type == "text/csv":
+        rows = iter_csv_rows(file)
+    elif filename.endswith(".xlsx"):
+        if openpyxl is None:
+            raise HTTPException(status_code=415, detail="XLSX uploads are not supported on this server")
+        rows = iter_xlsx_rows(file)
+    else:
+        raise HTTPException(status_code=415, detail="Upload a .csv or .xlsx file")
+    
+    result = await bulk_insert_requests(
+        rows, current_user, read_errors=(UnicodeDecodeError, csv.Error, zipfile.BadZipFile)
+    )
+    if result.read_error and result.received == 0:
+        raise HTTPException(status_code=400, detail=f"Could not parse upload: {result.read_error}")
+    return result
 
-# Rate Optimization Engine Endpoints
-@api_router.get("/rate-optimization/recommendations/{request_id}")
-async def get_rate_recommendations(
-    request_id: str, 
+# Quotation endpoints
+@api_router.get("/quotations", response_model=List[Quotation])
+async def get_quotations(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = FIELDS_QUERY,
+    include: Optional[str] = INCLUDE_QUERY,
+    include_archived: bool = INCLUDE_ARCHIVED_QUERY,
+    loaders: Loaders = Depends(request_loaders),
     current_user: User = Depends(get_current_user)
 ):
-    """Get AI-powered rate recommendations for a travel request"""
+    selected = requested_fields(Quotation, fields)
+    includes = requested_includes(include, QUOTATION_INCLUDES)
+    selected = with_include_keys(selected, includes, QUOTATION_INCLUDES)
+    if current_user.role == "customer":
+        # Get quotations for customer's requests
+        customer_requests = await find_with_history(
+            db, "travel_requests", {"customer_id": current_user.id}, {"id": 1}, include_archived
+        )
+        request_ids = [req["id"] for req in customer_requests]
+        query = {"request_id": {"$in": request_ids}}
+    else:
+        query = {}
     
-    # Mock rate recommendation logic
-    request = await db.travel_requests.find_one({"id": request_id})
-    if not request:
-        raise HTTPException(status_code=404, detail="Request not found")
+    etag = await list_etag(request, current_user, [
+        *history_sources("quotations", include_archived), *include_etag_sources(includes)
+    ])
+    if is_not_modified(request, response, etag):
+        return not_modified_response(etag)
     
-    # Simulate dynamic pricing based on request parameters
-    base_price = request.get("budget_max", 100000)
-    seasonal_factor = 1.2 if "12" in request.get("departure_date", "") else 1.0
+    if selected or includes:
+        quotations = await migrator.upgrade_documents("quotations", await find_with_history(
+            db, "quotations", query, mongo_projection(selected) if selected else None, include_archived
+        ))
+        return await shaped_response(Quotation, selected, quotations, etag, includes, expand_quotation, loaders)
+    quotations = await migrator.upgrade_documents(
+        "quotations", await find_with_history(db, "quotations", query, include_archived=include_archived)
+    )
+    return [Quotation(**quotation) for quotation in quotations]
+
+@api_router.post("/quotations", response_model=Quotation)
+async def create_quotation(quotation_data: QuotationCreate, current_user: User = Depends(get_current_user)):
+    """Create a draft quotation; option prices and totals are computed from line items"""
+    
+    if current_user.role not in ["salesperson", "sales_manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    if not await db.travel_requests.find_one({"id": quotation_data.request_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Request not found")
+    
+    quotation = Quotation(
+        **quotation_data.dict(),
+        salesperson_id=current_user.id,
+        salesperson_name=current_user.name
+    )
+    await db.quotations.insert_one(quotation.dict())
+    await asyncio.gather(
+        record_change("quotations"),
+        record_performance(db, current_user.id, quotations_created=1)
+    )
+    await record_first_quotation(quotation.request_id)
+    return quotation
+
+# Sent, approved or accepted quotations are priced as the customer or a manager
+# saw them; later changes go into a new version of the quotation instead
+EDITABLE_QUOTATION_STATUSES = ["draft"]
+
+def not_editable_error(quotation: dict) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail=f"Only draft quotations can be edited; this one is '{quotation.get('status')}'"
+    )
+
+@api_router.patch("/quotations/{quotation_id}/options/{option_id}/line-items/{item_id}", response_model=Quotation)
+async def update_quotation_line_item(
+    quotation_id: str,
+    option_id: str,
+    item_id: str,
+    update: LineItemUpdate,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
+    """Update one line item and apply the cost delta to its option and the quotation totals"""
+    
+    if current_user.role not in ["salesperson", "sales_manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    expected_version = if_match_version(request)
+    quotation = await db.quotations.find_one({"id": quotation_id})
+    if not quotation:
+        raise HTTPException(status_code=404, detail="Quotation not found")
+    if expected_version is not None and quotation.get("version", 1) != expected_version:
+        raise HTTPException(status_code=412, detail="Quotation has changed since it was read")
+    if quotation.get("status") not in EDITABLE_QUOTATION_STATUSES:
+        raise not_editable_error(quotation)
+    # Positional updates need the typed option layout on disk
+    await migrator.upgrade_and_save("quotations", quotation)
+    
+    option_index = next((i for i, option in enumerate(quotation["options"]) if option.get("id") == option_id), None)
+    option = quotation["options"][option_index] if option_index is not None else {}
+    item_index = next((i for i, item in enumerate(option.get("line_items", [])) if item.get("id") == item_id), None)
+    if item_index is None:
+        raise HTTPException(status_code=404, detail="Line item not found")
+    item = option["line_items"][item_index]
+    
+    changes = update.dict(exclude_unset=True)
+    try:
+        new_item = LineItem(**{**item, **changes})
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=describe_validation_error(e))
+    cost = round(option["cost"] + new_item.total_cost - item["total_cost"], 2)
+    price, margin = price_option(cost, option["markup_percentage"])
+    
+    now = datetime.now(timezone.utc)
+    option_path = f"options.{option_index}"
+    item_path = f"{option_path}.line_items.{item_index}"
+    update_fields = {
+        **{f"{item_path}.{field}": getattr(new_item, field) for field in changes},
+        f"{item_path}.total_cost": new_item.total_cost,
+        f"{option_path}.cost": cost,
+        f"{option_path}.price": price,
+        f"{option_path}.margin": margin
+    }
+    if option_index == quotation.get("selected_option", 0):
+        update_fields.update({"total_price": price, "margin": margin})
+    
+    try:
+        # Positions are only valid if nobody edited the quotation since our read
+        updated = await compare_and_set(
+            db.quotations, {"id": quotation_id}, {"$set": update_fields}, version=quotation.get("version", 1),
+            where={"status": {"$in": EDITABLE_QUOTATION_STATUSES}}, now=now
+        )
+    except WriteConflict as conflict:
+        if conflict.reason == "transition":
+            raise not_editable_error(conflict.document)
+        raise conflict_error(conflict, "Quotation", precondition=expected_version is not None)
+    await record_change("quotations")
+    quotation_renderer.invalidate(quotation_id)
+    response.headers["ETag"] = document_etag(updated)
+    return Quotation(**updated)
+
+ACCEPTABLE_QUOTATION_STATUSES = QUOTATION_STATES.sources("accepted")
+
+async def write_acceptance(quotation: dict, request: dict, option_index: int, booking: dict,
+                           session=None, expected_version: Optional[int] = None):
+    """Accept the quotation, confirm its request and create the booking.
+
+    Each write is conditional, so a concurrent accept fails with 409 instead of
+    creating a second booking.
+    """
+    now = booking["created_at"]
+    quotation_filter = {"id": quotation["id"], **QUOTATION_STATES.guard("accepted")}
+    if expected_version is not None:
+        quotation_filter["version"] = expected_version
+    accepted = await db.quotations.update_one(
+        quotation_filter,
+        versioned({"$set": {
+            "status": "accepted",
+            "selected_option": option_index,
+            "booking_id": booking["id"],
+            "accepted_at": now
+        }}, now),
+        session=session
+    )
+    if accepted.modified_count == 0:
+        raise HTTPException(status_code=409, detail="Quotation is no longer open for acceptance")
+
+    confirmed = await db.travel_requests.update_one(
+        {"id": request["id"], **REQUEST_STATES.guard("confirmed")},
+        versioned({"$set": {"status": "confirmed", "booking_id": booking["id"]}}, now),
+        session=session
+    )
+    if confirmed.modified_count == 0:
+        raise HTTPException(status_code=409, detail="Travel request already has an accepted quotation")
+
+    try:
+        await db.bookings.insert_one(booking, session=session)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A booking already exists for this quotation")
+
+async def write_acceptance_with_compensation(quotation: dict, request: dict, option_index: int, booking: dict,
+                                             expected_version: Optional[int] = None):
+    """Fallback for standalone servers without transactions: undo partial writes on failure"""
+    try:
+        await write_acceptance(quotation, request, option_index, booking, expected_version=expected_version)
+    except Exception:
+        # Only documents stamped with this booking id were changed by this call
+        await db.travel_requests.update_one(
+            {"id": request["id"], "booking_id": booking["id"]},
+            versioned({"$set": {"status": request["status"]}, "$unset": {"booking_id": ""}})
+        )
+        await db.quotations.update_one(
+            {"id": quotation["id"], "booking_id": booking["id"]},
+            versioned({
+                "$set": {
+                    "status": quotation["status"],
+                    "selected_option": quotation.get("selected_option", 0)
+                },
+                "$unset": {"booking_id": "", "accepted_at": ""}
+            })
+        )
+        raise
+
+@api_router.post("/quotations/{quotation_id}/accept", response_model=Booking)
+async def accept_quotation(
+    quotation_id: str,
+    http_request: Request,
+    acceptance: Optional[QuotationAcceptance] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Accept a quotation: mark it accepted, confirm the request and create the booking atomically"""
+
+    if current_user.role not in ["customer", "salesperson", "sales_manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    # With If-Match the customer accepts exactly the version (and prices) they saw
+    expected_version = if_match_version(http_request)
+    quotation = await db.quotations.find_one({"id": quotation_id})
+    if not quotation:
+        raise HTTPException(status_code=404, detail="Quotation not found")
+    if expected_version is not None and quotation.get("version", 1) != expected_version:
+        raise HTTPException(status_code=412, detail="Quotation has changed since it was read")
+    request = await db.travel_requests.find_one({"id": quotation["request_id"]})
+    if not request or (current_user.role == "customer" and request["customer_id"] != current_user.id):
+        raise HTTPException(status_code=404, detail="Quotation not found")
+    if quotation["status"] not in ACCEPTABLE_QUOTATION_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Quotation with status '{quotation['status']}' cannot be accepted")
+
+    priced = Quotation(**quotation)
+    if acceptance and acceptance.option_id:
+        option_index = next((i for i, option in enumerate(priced.options) if option.id == acceptance.option_id), None)
+        if option_index is None:
+            raise HTTPException(status_code=404, detail="Option not found")
+    else:
+        option_index = min(priced.selected_option, len(priced.options) - 1)
+    if option_index < 0:
+        raise HTTPException(status_code=400, detail="Quotation has no options")
+    option = priced.options[option_index]
+
+    booking = Booking(
+        quotation_id=quotation_id,
+        request_id=request["id"],
+        option_id=option.id,
+        customer_id=request["customer_id"],
+        customer_name=request["customer_name"],
+        salesperson_id=quotation.get("salesperson_id"),
+        total_amount=option.price,
+        travel_date=request["departure_date"]
+    )
+    booking_data = booking.dict()
+
+    try:
+        async with await db.client.start_session() as session:
+            await session.with_transaction(
+                lambda s: write_acceptance(
+                    quotation, request, option_index, booking_data, session=s, expected_version=expected_version
+                )
+            )
+    except OperationFailure as e:
+        if e.code != 20:  # IllegalOperation: transactions need a replica set or mongos
+            raise
+        await write_acceptance_with_compensation(
+            quotation, request, option_index, booking_data, expected_version=expected_version
+        )
+
+    release_assignment(request)
+    quotation_renderer.invalidate(quotation_id)
+    await asyncio.gather(
+        record_change("quotations", "travel_requests", "bookings"),
+        record_revenue(db, booking.created_at, booking.salesperson_id, booked=booking.total_amount),
+        record_performance(db, booking.salesperson_id, quotations_won=1),
+        record_performance(db, request.get("assigned_salesperson"), requests_won=1)
+    )
+    return booking
+
+# Quotation documents
+async def load_quotation_document(quotation_id: str, current_user: User):
+    quotation = await db.quotations.find_one({"id": quotation_id})
+    if not quotation:
+        raise HTTPException(status_code=404, detail="Quotation not found")
+    request = await db.travel_requests.find_one({"id": quotation["request_id"]}, {"_id": 0})
+    if current_user.role == "customer" and (not request or request["customer_id"] != current_user.id):
+        raise HTTPException(status_code=404, detail="Quotation not found")
+    return Quotation(**quotation).dict(), request
+
+# Quotations the customer has been given: those they can accept, and accepted ones
+ISSUED_QUOTATION_STATUSES = ACCEPTABLE_QUOTATION_STATUSES + ["accepted"]
+
+def zip_documents(files) -> bytes:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, document in files:
+            zf.writestr(name, document)
+    return archive.getvalue()
+
+@api_router.get("/quotations/documents/batch")
+async def render_quotations_batch(
+    date: str,
+    format: str = "pdf",
+    current_user: User = Depends(get_current_user)
+):
+    """Render every quotation issued to customers on a day (YYYY-MM-DD) and return them as a zip archive"""
+    
+    if current_user.role not in ["sales_manager", "operations", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    if format not in DOCUMENT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(DOCUMENT_FORMATS)}")
+    try:
+        day_start = datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+    
+    quotations = await db.quotations.find({
+        "status": {"$in": ISSUED_QUOTATION_STATUSES},
+        "updated_at": {"$gte": day_start, "$lt": day_start + timedelta(days=1)}
+    }).to_list(None)
+    requests = await db.travel_requests.find(
+        {"id": {"$in": list({q["request_id"] for q in quotations})}}, {"_id": 0}
+    ).to_list(None)
+    requests_by_id = {request["id"]: request for request in requests}
+    
+    items = [(Quotation(**q).dict(), requests_by_id.get(q["request_id"])) for q in quotations]
+    documents = await quotation_renderer.render_many(items, format)
+    
+    # DEFLATE is CPU-bound; zlib releases the GIL, so a thread is enough
+    archive = await asyncio.to_thread(zip_documents, [
+        (f"quotation-{quotation['id']}.{format}", document) for (quotation, _), document in zip(items, documents)
+    ])
+    return Response(
+        content=archive,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="quotations-{date}.zip"'}
+    )
+
+@api_router.get("/quotations/{quotation_id}/document")
+async def render_quotation_document(
+    quotation_id: str,
+    format: str = "pdf",
+    current_user: User = Depends(get_current_user)
+):
+    """Render a quotation as PDF or HTML"""
+    
+    if format not in DOCUMENT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(DOCUMENT_FORMATS)}")
+    
+    quotation, request = await load_quotation_document(quotation_id, current_user)
+    document = await quotation_renderer.render(quotation, request, format)
+    return Response(
+        content=document,
+        media_type=DOCUMENT_FORMATS[format],
+        headers={"Content-Disposition": f'inline; filename="quotation-{quotation_id}.{format}"'}
+    )
+
+# Booking endpoints
+@api_router.get("/bookings", response_model=List[Booking])
+async def get_bookings(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = FIELDS_QUERY,
+    include: Optional[str] = INCLUDE_QUERY,
+    include_archived: bool = INCLUDE_ARCHIVED_QUERY,
+    loaders: Loaders = Depends(request_loaders),
+    current_user: User = Depends(get_current_user)
+):
+    selected = requested_fields(Booking, fields)
+    includes = requested_includes(include, BOOKING_INCLUDES)
+    selected = with_include_keys(selected, includes, BOOKING_INCLUDES)
+    if current_user.role == "customer":
+        query = {"customer_id": current_user.id}
+    else:
+        query = {}
+    
+    etag = await list_etag(request, current_user, [
+        *history_sources("bookings", include_archived), *include_etag_sources(includes)
+    ])
+    if is_not_modified(request, response, etag):
+        return not_modified_response(etag)
+    
+    if selected or includes:
+        bookings = await migrator.upgrade_documents("bookings", await find_with_history(
+            db, "bookings", query, mongo_projection(selected) if selected else None, include_archived
+        ))
+        return await shaped_response(Booking, selected, bookings, etag, includes, expand_booking, loaders)
+    bookings = await migrator.upgrade_documents(
+        "bookings", await find_with_history(db, "bookings", query, include_archived=include_archived)
+    )
+    return [Booking(**booking) for booking in bookings]
+
+@api_router.patch("/bookings/{booking_id}", response_model=Booking)
+async def update_booking(
+    booking_id: str,
+    update: BookingUpdate,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
+    """Update operation notes or move the booking status; If-Match makes the update conditional on the version"""
+
+    if current_user.role not in ["operations", "sales_manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    changes = update.dict(exclude_unset=True)
+    target = changes.pop("booking_status", None)
+    if not changes and target is None:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    if target is not None and target not in BOOKING_STATES.states:
+        raise HTTPException(status_code=400, detail=f"booking_status must be one of {sorted(BOOKING_STATES.states)}")
+
+    expected_version = if_match_version(request)
+    try:
+        booking = await compare_and_set(
+            db.bookings, {"id": booking_id}, {"$set": changes},
+            version=expected_version, machine=BOOKING_STATES if target else None, target=target
+        )
+    except WriteConflict as conflict:
+        raise conflict_error(conflict, "Booking", precondition=expected_version is not None)
+    await record_change("bookings")
+
+    if target == "cancelled":
+        # Rollups count bookings by creation day, so the reversal goes to the same bucket
+        await record_revenue(
+            db, booking["created_at"], await booking_salesperson_id(booking), booked=-booking["total_amount"]
+        )
+    response.headers["ETag"] = document_etag(booking)
+    return Booking(**booking)
+
+CALENDAR_MAX_DAYS = 366
+
+@api_router.get("/operations/calendar")
+async def get_operations_calendar(
+    request: Request,
+    response: Response,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    current_user: User = Depends(get_current_user)
+):
+    """Trips per day between two dates (YYYY-MM-DD, inclusive; defaults to the current month)"""
+
+    if current_user.role not in ["operations", "sales_manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    try:
+        first_day = datetime.strptime(start, "%Y-%m-%d").replace(tzinfo=timezone.utc) if start else today.replace(day=1)
+        if end:
+            last_day = datetime.strptime(end, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        else:
+            last_day = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from and to must be YYYY-MM-DD")
+    if last_day < first_day:
+        raise HTTPException(status_code=400, detail="to must not be before from")
+    if (last_day - first_day).days >= CALENDAR_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {CALENDAR_MAX_DAYS} days")
+
+    # One range scan on the (travel_date, booking_status) index
+    query = {
+        "travel_date": {"$gte": first_day, "$lt": last_day + timedelta(days=1)},
+        "booking_status": {"$ne": "cancelled"}
+    }
+    etag = await list_etag(request, current_user, ["bookings"])
+    if is_not_modified(request, response, etag):
+        return not_modified_response(etag)
+
+    days = OrderedDict(
+        ((first_day + timedelta(days=offset)).strftime("%Y-%m-%d"), [])
+        for offset in range((last_day - first_day).days + 1)
+    )
+    total_trips = 0
+    async for booking in db.bookings.find(query, {"_id": 0}).sort("travel_date", ASCENDING):
+        booking = Booking(**booking)
+        days[booking.travel_date.strftime("%Y-%m-%d")].append(booking)
+        total_trips += 1
+
+    return {
+        "from": first_day.strftime("%Y-%m-%d"),
+        "to": last_day.strftime("%Y-%m-%d"),
+        "total_trips": total_trips,
+        "days": [
+            {"date": day, "trip_count": len(bookings), "bookings": bookings}
+            for day, bookings in days.items()
+        ]
+    }
+
+# Delta sync: clients keep a token and fetch only what changed since it.
+# Every write to a synced collection stamps updated_at; deletions go through
+# delete_with_tombstones so clients also learn what disappeared.
+SYNC_COLLECTIONS = OrderedDict([
+    ("requests", ("travel_requests", TravelRequest)),
+    ("quotations", ("quotations", Quotation)),
+    ("bookings", ("bookings", Booking)),
+    ("approvals", ("approval_requests", None)),
+])
+
+def encode_sync_token(watermark: datetime, resume: Optional[tuple] = None) -> str:
+    """A delta token, or with resume=(collection index, last _id) the next page of a full sync"""
+    millis = int(watermark.timestamp() * 1000)
+    if resume is None:
+        token = f"v1:{millis}"
+    else:
+        index, last_id = resume
+        token = f"v2:{millis}:{index}:{last_id or ''}"
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+
+def decode_sync_token(token: str) -> tuple:
+    """(watermark, resume): resume is None for delta tokens"""
+    try:
+        version, millis, *resume = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode().split(":")
+        watermark = datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc)
+        if version == "v1" and not resume:
+            return watermark, None
+        if version == "v2" and len(resume) == 2:
+            index, last_id = resume
+            return watermark, (int(index), ObjectId(last_id) if last_id else None)
+        raise ValueError(version)
+    except (ValueError, UnicodeDecodeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+async def sync_scopes(current_user: User) -> dict:
+    """Per synced collection: (document query, tombstone query) visible to the user"""
+    if current_user.role == "customer":
+        request_ids = await db.travel_requests.distinct("id", {"customer_id": current_user.id})
+        owned = {"customer_id": current_user.id}
+        return {
+            "requests": (owned, owned),
+            "quotations": ({"request_id": {"$in": request_ids}}, owned),
+            "bookings": (owned, owned),
+        }
+    if current_user.role in ["salesperson", "sales_manager", "operations", "admin"]:
+        scopes = {name: ({}, {}) for name in ["requests", "quotations", "bookings"]}
+        if current_user.role == "salesperson":
+            own_approvals = {"requested_by": current_user.id}
+            scopes["approvals"] = (own_approvals, own_approvals)
+        elif current_user.role in ["sales_manager", "admin"]:
+            scopes["approvals"] = ({}, {})
+        return scopes
+    return {}
+
+async def write_tombstones(collection: str, query: dict, archived: bool = False) -> list:
+    """Record tombstones (with their owners) for documents about to leave a synced collection; returns their ids"""
+    documents = await db[collection].find(
+        query, {"_id": 0, "id": 1, "customer_id": 1, "request_id": 1, "requested_by": 1}
+    ).to_list(None)
+    if not documents:
+        return []
+    if collection == "quotations":
+        request_ids = list({document["request_id"] for document in documents})
+        customers = {
+            request["id"]: request["customer_id"]
+            async for request in db.travel_requests.find({"id": {"$in": request_ids}}, {"id": 1, "customer_id": 1})
+        }
+        for document in documents:
+            document["customer_id"] = customers.get(document["request_id"])
+    now = datetime.now(timezone.utc)
+    await db.tombstones.insert_many([
+        {
+            "collection": collection,
+            "id": document["id"],
+            "customer_id": document.get("customer_id"),
+            "requested_by": document.get("requested_by"),
+            "archived": archived,
+            "deleted_at": now
+        }
+        for document in documents
+    ])
+    return [document["id"] for document in documents]
+
+async def delete_with_tombstones(collection: str, query: dict) -> int:
+    """Delete documents and record tombstones for delta sync"""
+    # Tombstones first, so no document can disappear without one
+    ids = await write_tombstones(collection, query)
+    if not ids:
+        return 0
+    result = await db[collection].delete_many({"id": {"$in": ids}})
+    await record_change(collection)
+    return result.deleted_count
+
+# Archived records leave the hot collections with tombstones, so synced
+# clients drop them like deletions; history reads still find them. A booking's
+# quotation and request stay hot as long as the booking does.
+archiver = Archiver(
+    db,
+    [
+        ArchivePolicy(
+            "bookings", ["completed", "cancelled"], ARCHIVE_AFTER_DAYS,
+            field=BOOKING_STATES.field, dependents=[("payment_transactions", "booking_id")]
+        ),
+        ArchivePolicy(
+            "quotations", ["accepted", "rejected"], ARCHIVE_AFTER_DAYS, referrers=[("bookings", "quotation_id")]
+        ),
+        ArchivePolicy(
+            "travel_requests", ["confirmed", "cancelled"], ARCHIVE_AFTER_DAYS,
+            referrers=[("quotations", "request_id"), ("bookings", "request_id")]
+        ),
+    ],
+    batch_size=ARCHIVE_BATCH_SIZE,
+    # Tombstones go first so no document leaves without one; those still hot lose theirs again
+    before_delete=lambda collection, ids: write_tombstones(collection, {"id": {"$in": ids}}, archived=True),
+    after_keep=lambda collection, ids: db.tombstones.delete_many(
+        {"collection": collection, "id": {"$in": ids}, "archived": True}
+    ),
+)
+
+async def expire_drafts() -> int:
+    """Delete draft quotations nobody touched for DRAFT_TTL_DAYS"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=DRAFT_TTL_DAYS)
+    # Not a TTL index: expired drafts need tombstones for delta sync
+    return await delete_with_tombstones("quotations", {"status": "draft", "updated_at": {"$lt": cutoff}})
+
+@api_router.get("/sync")
+async def sync_changes(since: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    """Requests, quotations, bookings and approvals changed or deleted since a sync token.
+
+    A full sync (no token, or one older than the tombstones) comes in pages
+    of SYNC_PAGE_SIZE documents: while has_more is set, the token fetches the
+    next page, and the last page's token is a delta token from when the full
+    sync started.
+    """
+
+    started = datetime.now(timezone.utc)
+    watermark, resume = decode_sync_token(since) if since else (None, None)
+    scopes = await sync_scopes(current_user)
+    if resume is not None:
+        return await sync_full_page(scopes, watermark, *resume)
+    # Tokens older than the tombstones cannot report every deletion
+    if watermark is None or watermark < started - timedelta(days=SYNC_TOMBSTONE_DAYS):
+        # Writes stamped just before `started` may still be in flight, so the
+        # delta after the full sync re-reads a short overlap
+        return await sync_full_page(scopes, started - timedelta(seconds=SYNC_CLOCK_SKEW_SECONDS), 0, None)
+
+    async def changed(name: str):
+        collection, model = SYNC_COLLECTIONS[name]
+        query, tombstone_query = scopes[name]
+        documents, deleted = await asyncio.gather(
+            db[collection].find({**query, "updated_at": {"$gte": watermark}}, {"_id": 0}).to_list(None),
+            db.tombstones.distinct("id", {**tombstone_query, "collection": collection, "deleted_at": {"$gte": watermark}})
+        )
+        return name, await sync_documents(collection, model, documents), deleted
+
+    results = await asyncio.gather(*(changed(name) for name in SYNC_COLLECTIONS if name in scopes))
+    # Clients apply changes idempotently by id, so the overlap is harmless
+    next_watermark = max(started - timedelta(seconds=SYNC_CLOCK_SKEW_SECONDS), watermark)
+    return {
+        "token": encode_sync_token(next_watermark),
+        "full": False,
+        "has_more": False,
+        "changes": {name: documents for name, documents, _ in results},
+        "deleted": {name: deleted for name, _, deleted in results},
+    }
+
+async def sync_documents(collection: str, model, documents: list) -> list:
+    if model:
+        return [model(**document) for document in await migrator.upgrade_documents(collection, documents)]
+    return documents
+
+async def sync_full_page(scopes: dict, watermark: datetime, index: int, last_id: Optional[ObjectId]) -> dict:
+    """One page of a full sync: collections in SYNC_COLLECTIONS order, each by _id from last_id.
+
+    Documents written after `watermark` may be missed or sent twice while
+    paging; the delta sync from `watermark` that follows catches them up.
+    """
+    names = [name for name in SYNC_COLLECTIONS if name in scopes]
+    changes = {name: [] for name in names}
+    remaining = SYNC_PAGE_SIZE
+    resume = None
+    for position in range(index, len(names)):
+        name = names[position]
+        collection, model = SYNC_COLLECTIONS[name]
+        query = scopes[name][0]
+        if position == index and last_id is not None:
+            query = {**query, "_id": {"$gt": last_id}}
+        documents = await db[collection].find(query).sort("_id", ASCENDING).limit(remaining).to_list(None)
+        if documents and len(documents) == remaining:
+            resume = (position, documents[-1]["_id"])
+        for document in documents:
+            del document["_id"]
+        changes[name] = await sync_documents(collection, model, documents)
+        remaining -= len(documents)
+        if resume is not None:
+            break
+    return {
+        "token": encode_sync_token(watermark, resume),
+        "full": True,
+        "has_more": resume is not None,
+        "changes": changes,
+        "deleted": {name: [] for name in names},
+    }
+
+# Search endpoints
+SEARCH_FACET_LIMIT = 20
+
+def search_facet(field: str, unwind: bool = False) -> list:
+    stages = [{"$unwind": f"${field}"}] if unwind else []
+    return stages + [
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": SEARCH_FACET_LIMIT}
+    ]
+
+async def run_search(collection: str, query: str, scope: dict, filters: dict, facets: dict, skip: int, limit: int) -> dict:
+    """Rank text matches by score and compute facet counts in one aggregation.
+
+    Facet counts cover every text match in scope; filters only narrow the results.
+    """
+    pipeline = [
+        {"$match": {"$text": {"$search": query}, **scope}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+        {"$facet": {
+            "results": [
+                {"$match": filters},
+                {"$sort": {"score": -1, "created_at": -1}},
+                {"$skip": skip},
+                {"$limit": limit},
+                {"$project": {"_id": 0}}
+            ],
+            "total": [{"$match": filters}, {"$count": "count"}],
+            **facets
+        }}
+    ]
+    result = (await db[collection].aggregate(pipeline).to_list(1))[0]
+    return {
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "results": result["results"],
+        "facets": {
+            name: {bucket["_id"]: bucket["count"] for bucket in result[name] if bucket["_id"] is not None}
+            for name in facets
+        }
+    }
+
+@api_router.get("/search")
+async def search(
+    q: str,
+    kind: str = Query("all", alias="type"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    travel_type: Optional[str] = None,
+    destination: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 20,
+    current_user: User = Depends(get_current_user)
+):
+    """Full-text search over travel requests and quotations with facet counts"""
+    
+    if kind not in ("all", "requests", "quotations"):
+        raise HTTPException(status_code=400, detail="type must be one of: all, requests, quotations")
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Search query is required")
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), 100)
+    skip = (page - 1) * page_size
+    
+    request_scope, quotation_scope = {}, {}
+    if current_user.role == "customer":
+        request_scope = {"customer_id": current_user.id}
+        customer_requests = await db.travel_requests.find(request_scope, {"id": 1}).to_list(1000)
+        quotation_scope = {"request_id": {"$in": [req["id"] for req in customer_requests]}}
+    
+    searches = {}
+    if kind in ("all", "requests"):
+        filters = {}
+        if status_filter:
+            filters["status"] = status_filter
+        if travel_type:
+            filters["travel_type"] = travel_type
+        if destination:
+            filters["destinations"] = destination
+        searches["requests"] = run_search(
+            "travel_requests", q, request_scope, filters,
+            {
+                "status": search_facet("status"),
+                "travel_type": search_facet("travel_type"),
+                "destination": search_facet("destinations", unwind=True)
+            },
+            skip, page_size
+        )
+    if kind in ("all", "quotations"):
+        searches["quotations"] = run_search(
+            "quotations", q, quotation_scope, {"status": status_filter} if status_filter else {},
+            {"status": search_facet("status")},
+            skip, page_size
+        )
+    
+    results = await asyncio.gather(*searches.values())
+    return {"query": q, "page": page, "page_size": page_size, **dict(zip(searches, results))}
+
+# Dashboard stats endpoints
+UPCOMING_TRIPS_DAYS = 30
+
+@api_router.get("/dashboard/stats")
+async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
+    stats = {}
+    
+    if current_user.role == "customer":
+        stats = {
+            "active_requests": await db.travel_requests.count_documents({"customer_id": current_user.id, "status": {"$in": ["pending", "quoted"]}}),
+            "total_bookings": await db.bookings.count_documents({"customer_id": current_user.id}),
+            "pending_payments": await db.bookings.count_documents({"customer_id": current_user.id, "payment_status": {"$in": ["pending", "partial"]}})
+        }
+    elif current_user.role == "salesperson":
+        performance = await salesperson_summary(db, current_user.id)
+        stats = {
+            "assigned_requests": await db.travel_requests.count_documents({"assigned_salesperson": current_user.id}),
+            "pending_quotations": await db.quotations.count_documents({"salesperson_id": current_user.id, "status": "draft"}),
+            "conversion_rate": performance["conversion_rate"] or 0,
+            "win_rate": performance["win_rate"] or 0,
+            "avg_response_time": (
+                f"{performance['avg_response_hours']:.1f} hours" if performance["avg_response_hours"] is not None else "N/A"
+            )
+        }
+    elif current_user.role == "sales_manager":
+        month_start = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        this_month = await revenue_series(db, month_start, next_month, "month")
+        team, _ = await team_summaries(db)
+        stats = {
+            "team_performance": team["win_rate"] or 0,
+            "pending_approvals": await db.quotations.count_documents({"status": "pending_approval"}),
+            "monthly_revenue": this_month["totals"]["net_revenue"],
+            "team_size": await db.users.count_documents({"role": "salesperson"})
+        }
+    elif current_user.role == "operations":
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        stats = {
+            "confirmed_bookings": await db.bookings.count_documents({"booking_status": "confirmed"}),
+            "pending_payments": await db.bookings.count_documents({"payment_status": {"$in": ["pending", "partial"]}}),
+            "upcoming_trips": await db.bookings.count_documents({
+                "travel_date": {"$gte": today, "$lt": today + timedelta(days=UPCOMING_TRIPS_DAYS)},
+                "booking_status": "confirmed"
+            }),
+            "customer_satisfaction": 4.8  # Mock data
+        }
+    elif current_user.role == "admin":
+        stats = {
+            "total_users": await db.users.count_documents({}),
+            "total_requests": await db.travel_requests.count_documents({}),
+            "total_quotations": await db.quotations.count_documents({}),
+            "system_health": "Excellent"  # Mock data
+        }
+    
+    return stats
+
+# Rate Optimization Models
+class RateRecommendation(BaseModel):
+    request_id: str
+    recommended_price: float
+    confidence: float
+    reasoning: str
+    seasonal_factor: float = 1.0
+    competitor_delta: float = 0.0
+    demand_factor: float = 1.0
+    estimated_conversion: Optional[float] = None
+    model_version: Optional[int] = None
+
+class ScenarioSimulation(BaseModel):
+    base_price: float
+    hotel_star: int = 3
+    transport_class: str = "economy"
+    duration_days: int = 3
+    estimated_conversion: float = 0.75
+    # Segment and reference price for the elasticity model; the budget defaults to base_price
+    budget: Optional[float] = None
+    destination: Optional[str] = None
+    travel_type: Optional[str] = None
+    travel_month: Optional[int] = Field(default=None, ge=1, le=12)
+
+class ApprovalRequest(BaseModel):
+    quotation_id: str
+    discount_percentage: float
+    reason: str
+    requested_by: str
+
+class PaymentTransaction(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    booking_id: str
+    amount: float
+    payment_method: str
+    transaction_id: Optional[str] = None
+    status: str = "pending"  # pending, completed, failed, refunded
+    gateway_response: Optional[dict] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+# Rate Optimization Engine Endpoints
+@api_router.get("/rate-optimization/recommendations/{request_id}")
+async def get_rate_recommendations(
+    request_id: str, 
+    current_user: User = Depends(get_current_user)
+):
+    """Get rate recommendations for a travel request from its segment's elasticity model"""
+    
+    request = await db.travel_requests.find_one({"id": request_id})
+    if not request:
+        raise HTTPException(status_code=404, detail="Request not found")
+    
+    model = await pricing_models.current()
+    if model is not None:
+        return elasticity_recommendation(model, request)
+
+    # No model fitted yet: fall back to rules of thumb
+    base_price = request.get("budget_max", 100000)
+    seasonal_factor = 1.2 if travel_month(request.get("departure_date")) == 12 else 1.0
     demand_factor = 1.1 if request.get("is_flexible_dates", False) else 1.0
     competitor_delta = 0.05  # 5% below competitor
     
@@ -524,18 +2454,117 @@ async def simulate_pricing_scenario(
         transport_multipliers.get(scenario.transport_class, 1.0) * 
         (scenario.duration_days / 3.0)  # 3 days baseline
     )
-    
-    # Estimate conversion probability (inverse relationship with price)
-    conversion_rate = max(0.2, 0.95 - (adjusted_price / scenario.base_price - 1) * 0.5)
-    
+    
+    ratio = adjusted_price / (scenario.budget or scenario.base_price)
+    model = await pricing_models.current()
+    if model is not None:
+        intercept, slope, samples, segment = model.coefficients(
+            scenario.destination, scenario.travel_type, scenario.travel_month
+        )
+        conversion_rate = float(acceptance(intercept, slope, ratio))
+        estimate = {
+            "model_version": model.version,
+            "segment": segment,
+            "segment_samples": samples,
+            "elasticity": round(slope * (1 - conversion_rate), 3),
+        }
+    else:
+        # No model fitted yet: conversion falls linearly with the price increase
+        conversion_rate = max(0.2, 0.95 - (ratio - 1) * 0.5)
+        estimate = {"model_version": None}
+    
+    return {
+        "adjusted_price": round(adjusted_price, 2),
+        "estimated_conversion": round(conversion_rate, 2),
+        "price_change_percentage": round((adjusted_price / scenario.base_price - 1) * 100, 1),
+        "margin_impact": round((adjusted_price - scenario.base_price) * 0.15, 2),  # 15% margin
+        **estimate
+    }
+
+@api_router.get("/rate-optimization/optimal-price/{request_id}")
+async def get_optimal_price(
+    request_id: str,
+    cost: Optional[float] = Query(None, gt=0),
+    over_budget: float = Query(0, ge=0, le=1),
+    points: int = Query(200, ge=10, le=2000),
+    refine: bool = True,
+    current_user: User = Depends(get_current_user)
+):
+    """Search the request's price range for the highest expected margin x conversion.
+
+    Prices run from the trip's cost to budget_max (plus an over_budget
+    fraction). Conversion comes from the request's segment in the elasticity
+    model. The cost is the ?cost= parameter, else the latest quotation's
+    selected option, else the segment's typical cost-to-budget ratio.
+    """
+    if current_user.role not in ["salesperson", "sales_manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    request = await db.travel_requests.find_one(
+        {"id": request_id},
+        {"_id": 0, "id": 1, "budget_min": 1, "budget_max": 1, "destinations": 1, "travel_type": 1, "departure_date": 1}
+    )
+    if not request:
+        raise HTTPException(status_code=404, detail="Request not found")
+    if not request.get("budget_max"):
+        raise HTTPException(status_code=422, detail="Request has no budget to price against")
+    model = await pricing_models.current()
+    if model is None:
+        raise HTTPException(status_code=503, detail="No pricing model has been fitted yet")
+
+    budget = request["budget_max"]
+    cost_source = "parameter"
+    if cost is None:
+        cost, cost_source = await quoted_cost(request_id), "quotation"
+    if cost is None:
+        cost, cost_source = typical_cost_ratio(analytics_snapshot, request.get("travel_type")) * budget, "history"
+    if not cost > 0:
+        raise HTTPException(status_code=422, detail="The trip's cost is unknown; pass it as ?cost=")
+    ceiling = budget * (1 + over_budget)
+    if cost >= ceiling:
+        raise HTTPException(status_code=422, detail="No price within the budget covers the trip's cost")
+
+    return optimal_price(model, request, cost, cost_source, ceiling, points, refine)
+
+def optimal_price(model, request: dict, cost: float, cost_source: str, ceiling: float, points: int, refine: bool) -> dict:
+    """The optimal-price response: the optimum found between cost and ceiling, and the curve searched"""
+    budget = request["budget_max"]
+    destination = first_destination(request.get("destinations"))
+    intercept, slope, samples, segment = model.coefficients(
+        destination, request.get("travel_type"), travel_month(request.get("departure_date"))
+    )
+    (price, conversion, expected_margin), (prices, conversions, margins) = price_search(
+        intercept, slope, budget, cost, cost, ceiling, points, refine
+    )
     return {
-        "adjusted_price": round(adjusted_price, 2),
-        "estimated_conversion": round(conversion_rate, 2),
-        "price_change_percentage": round((adjusted_price / scenario.base_price - 1) * 100, 1),
-        "margin_impact": round((adjusted_price - scenario.base_price) * 0.15, 2)  # 15% margin
+        "request_id": request["id"],
+        "model_version": model.version,
+        "segment": segment,
+        "segment_samples": samples,
+        "budget_min": request.get("budget_min"),
+        "budget_max": budget,
+        "cost": round(cost, 2),
+        "cost_source": cost_source,
+        "optimal": {
+            "price": round(price, 2),
+            "conversion": round(conversion, 4),
+            "expected_margin": round(expected_margin, 2),
+            "expected_revenue": round(price * conversion, 2),
+            "margin_percentage": round((price - cost) / price * 100, 2),
+            "price_to_budget": round(price / budget, 4),
+            "elasticity": round(slope * (1 - conversion), 3),
+        },
+        # Columns rather than one object per point: cheaper to build and to chart
+        "curve": {
+            "price": prices.round(2).tolist(),
+            "conversion": conversions.round(4).tolist(),
+            "expected_margin": margins.round(2).tolist(),
+            "expected_revenue": (prices * conversions).round(2).tolist(),
+        },
     }
 
 @api_router.get("/rate-optimization/competitor-rates/{destination}")
+@cached(response_cache, ttl=RESPONSE_CACHE_TTL, scope="global")
 async def get_competitor_rates(
     destination: str,
     current_user: User = Depends(get_current_user)
@@ -576,12 +2605,16 @@ async def create_quotation_version(
         salesperson_name=current_user.name,
         title=f"{original['title']} (v{len(original.get('versions', [])) + 2})",
         options=version_data.get("options", original["options"]),
-        total_price=version_data.get("total_price", original["total_price"]),
+        selected_option=version_data.get("selected_option", original.get("selected_option", 0)),
+        # Only used to back out the cost basis of legacy options; totals are recomputed
         margin=version_data.get("margin", original["margin"]),
         validity_days=version_data.get("validity_days", 7),
         status="draft"
     )
     
+    await record_first_quotation(original["request_id"])
+    quotation_renderer.invalidate(quotation_id)
+    
     # Store version history
     await db.quotation_versions.insert_one({
         "quotation_id": quotation_id,
@@ -597,15 +2630,12 @@ async def create_quotation_version(
 async def request_quotation_approval(
     quotation_id: str,
     approval_request: ApprovalRequest,
+    request: Request,
     current_user: User = Depends(get_current_user)
 ):
     """Request manager approval for quotation discount"""
     
-    quotation = await db.quotations.find_one({"id": quotation_id})
-    if not quotation:
-        raise HTTPException(status_code=404, detail="Quotation not found")
-    
-    # Store approval request
+    # Store the approval first, so a quotation is never left pending without one
     approval_data = {
         "id": str(uuid.uuid4()),
         "quotation_id": quotation_id,
@@ -614,16 +2644,38 @@ async def request_quotation_approval(
         "requested_by": current_user.id,
         "requested_by_name": current_user.name,
         "status": "pending",
-        "created_at": datetime.now(timezone.utc)
+        "created_at": datetime.now(timezone.utc),
+        "updated_at": datetime.now(timezone.utc),
+        "version": 1
     }
-    
     await db.approval_requests.insert_one(approval_data)
     
-    # Update quotation status
-    await db.quotations.update_one(
-        {"id": quotation_id},
-        {"$set": {"status": "pending_approval", "updated_at": datetime.now(timezone.utc)}}
+    # Then flag the quotation: the transition guard rejects a second pending approval
+    expected_version = if_match_version(request)
+    try:
+        quotation = await compare_and_set(
+            db.quotations, {"id": quotation_id}, {},
+            version=expected_version, machine=QUOTATION_STATES, target="pending_approval"
+        )
+    except WriteConflict as conflict:
+        await db.approval_requests.delete_one({"id": approval_data["id"]})
+        raise conflict_error(conflict, "Quotation", precondition=expected_version is not None)
+    except Exception:
+        await db.approval_requests.delete_one({"id": approval_data["id"]})
+        raise
+    
+    # Managers are notified in the background
+    await asyncio.gather(
+        record_change("quotations"),
+        job_queue.enqueue("notify_managers", {
+            "approval_id": approval_data["id"],
+            "quotation_id": quotation_id,
+            "quotation_title": quotation["title"],
+            "requested_by_name": current_user.name,
+            "discount_percentage": approval_request.discount_percentage
+        })
     )
+    quotation_renderer.invalidate(quotation_id)
     
     return {"message": "Approval request submitted", "approval_id": approval_data["id"]}
 
@@ -651,35 +2703,98 @@ async def make_approval_decision(
     
     if current_user.role not in ["sales_manager", "admin"]:
         raise HTTPException(status_code=403, detail="Access denied")
+    if decision.get("decision") not in ["approved", "rejected"]:
+        raise HTTPException(status_code=400, detail="decision must be 'approved' or 'rejected'")
     
-    approval = await db.approval_requests.find_one({"id": approval_id})
-    if not approval:
-        raise HTTPException(status_code=404, detail="Approval request not found")
-    
-    # Update approval status
-    await db.approval_requests.update_one(
-        {"id": approval_id},
-        {
-            "$set": {
-                "status": decision["decision"],  # "approved" or "rejected"
+    # Decide the approval; a concurrent or repeated decision fails the transition guard
+    try:
+        approval = await compare_and_set(
+            db.approval_requests, {"id": approval_id},
+            {"$set": {
                 "manager_comment": decision.get("comment", ""),
                 "decided_by": current_user.id,
                 "decided_by_name": current_user.name,
                 "decided_at": datetime.now(timezone.utc)
-            }
-        }
-    )
+            }},
+            machine=APPROVAL_STATES, target=decision["decision"]
+        )
+    except WriteConflict as conflict:
+        raise conflict_error(conflict, "Approval request")
     
     # Update quotation status
     quotation_status = "approved" if decision["decision"] == "approved" else "draft"
-    await db.quotations.update_one(
-        {"id": approval["quotation_id"]},
-        {"$set": {"status": quotation_status, "updated_at": datetime.now(timezone.utc)}}
-    )
+    try:
+        await compare_and_set(
+            db.quotations, {"id": approval["quotation_id"]}, {}, machine=QUOTATION_STATES, target=quotation_status
+        )
+        await record_change("quotations")
+    except WriteConflict as conflict:
+        logger.warning(f"Approval {approval_id} decided but quotation not updated: {conflict.reason}")
+    quotation_renderer.invalidate(approval["quotation_id"])
+    await job_queue.enqueue("notify_salesperson", {
+        "approval_id": approval_id,
+        "quotation_id": approval["quotation_id"],
+        "salesperson_id": approval["requested_by"],
+        "decision": decision["decision"],
+        "decided_by_name": current_user.name,
+        "comment": decision.get("comment", "")
+    })
     
     return {"message": f"Approval request {decision['decision']}"}
 
+@api_router.get("/analytics/component-prices")
+async def get_component_price_analytics(
+    component: str,
+    limit: int = 20,
+    current_user: User = Depends(get_current_user)
+):
+    """Aggregate line item costs per named component (e.g. per hotel or transport)"""
+    
+    if current_user.role not in ["salesperson", "sales_manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    component = COMPONENT_ALIASES.get(component.lower(), component.lower())
+    if component not in LINE_ITEM_COMPONENTS:
+        raise HTTPException(status_code=400, detail=f"component must be one of {sorted(LINE_ITEM_COMPONENTS)}")
+    
+    rows = await db.quotations.aggregate([
+        {"$match": {"options.line_items.component": component}},
+        {"$unwind": "$options"},
+        {"$unwind": "$options.line_items"},
+        {"$match": {"options.line_items.component": component}},
+        {"$group": {
+            "_id": "$options.line_items.name",
+            "quotations": {"$addToSet": "$id"},
+            "avg_unit_cost": {"$avg": "$options.line_items.unit_cost"},
+            "min_unit_cost": {"$min": "$options.line_items.unit_cost"},
+            "max_unit_cost": {"$max": "$options.line_items.unit_cost"},
+            "total_cost": {"$sum": "$options.line_items.total_cost"},
+            "line_items": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "name": "$_id",
+            "quotation_count": {"$size": "$quotations"},
+            "line_items": 1,
+            "avg_unit_cost": {"$round": ["$avg_unit_cost", 2]},
+            "min_unit_cost": 1,
+            "max_unit_cost": 1,
+            "total_cost": 1
+        }},
+        {"$sort": {"quotation_count": -1}},
+        {"$limit": min(max(limit, 1), 100)}
+    ]).to_list(100)
+    
+    return {"component": component, "items": rows}
+
 # Payment Processing Endpoints
+async def booking_salesperson_id(booking: dict) -> Optional[str]:
+    """Salesperson credited with a booking (older bookings only record it on the quotation)"""
+    if booking.get("salesperson_id"):
+        return booking["salesperson_id"]
+    quotation = await db.quotations.find_one({"id": booking["quotation_id"]}, {"salesperson_id": 1})
+    return quotation.get("salesperson_id") if quotation else None
+
 @api_router.post("/payments/capture")
 async def capture_payment(
     payment_data: dict,
@@ -705,19 +2820,27 @@ async def capture_payment(
     
     await db.payment_transactions.insert_one(transaction.dict())
     
-    # Update booking payment status
-    total_paid = booking.get("amount_paid", 0) + payment_data["amount"]
-    payment_status = "paid" if total_paid >= booking["total_amount"] else "partial"
+    # Update booking payment status; concurrent captures re-read and re-apply
+    def add_payment(current: dict) -> dict:
+        total_paid = current.get("amount_paid", 0) + payment_data["amount"]
+        return {"$set": {
+            "payment_status": "paid" if total_paid >= current["total_amount"] else "partial",
+            "amount_paid": total_paid
+        }}
     
-    await db.bookings.update_one(
-        {"id": payment_data["booking_id"]},
-        {
-            "$set": {
-                "payment_status": payment_status,
-                "amount_paid": total_paid,
-                "updated_at": datetime.now(timezone.utc)
-            }
-        }
+    try:
+        booking = await read_modify_write(db.bookings, {"id": booking["id"]}, booking, add_payment)
+    except WriteConflict:
+        # The ledger entry is written; the reconciler settles the booking totals from it
+        await job_queue.enqueue("reconcile_booking_payments", {"booking_id": booking["id"]})
+        booking = {**booking, **add_payment(booking)["$set"]}
+    total_paid = booking["amount_paid"]
+    await asyncio.gather(
+        record_change("payment_transactions", "bookings"),
+        record_revenue(
+            db, transaction.created_at, await booking_salesperson_id(booking),
+            captured=payment_data["amount"], payments=1
+        )
     )
     
     return {
@@ -730,11 +2853,21 @@ async def capture_payment(
 @api_router.get("/payments/transactions/{booking_id}")
 async def get_payment_transactions(
     booking_id: str,
+    fields: Optional[str] = FIELDS_QUERY,
+    include_archived: bool = INCLUDE_ARCHIVED_QUERY,
     current_user: User = Depends(get_current_user)
 ):
     """Get all payment transactions for a booking"""
     
-    transactions = await db.payment_transactions.find({"booking_id": booking_id}).to_list(100)
+    selected = requested_fields(PaymentTransaction, fields)
+    if selected:
+        transactions = await find_with_history(
+            db, "payment_transactions", {"booking_id": booking_id}, mongo_projection(selected), include_archived, limit=100
+        )
+        return partial_response(PaymentTransaction, selected, transactions)
+    transactions = await find_with_history(
+        db, "payment_transactions", {"booking_id": booking_id}, include_archived=include_archived, limit=100
+    )
     # Remove MongoDB ObjectId fields to avoid serialization issues
     for transaction in transactions:
         if "_id" in transaction:
@@ -751,6 +2884,10 @@ async def process_refund(
     if current_user.role not in ["operations", "admin"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
+    booking = await db.bookings.find_one({"id": refund_data["booking_id"]})
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    
     # Create refund transaction
     refund_transaction = PaymentTransaction(
         booking_id=refund_data["booking_id"],
@@ -761,6 +2898,12 @@ async def process_refund(
     )
     
     await db.payment_transactions.insert_one(refund_transaction.dict())
+    await record_change("payment_transactions")
+    await record_revenue(
+        db, refund_transaction.created_at, await booking_salesperson_id(booking),
+        refunded=abs(refund_data["amount"]), refunds=1
+    )
+    await job_queue.enqueue("reconcile_booking_payments", {"booking_id": refund_data["booking_id"]})
     
     return {
         "refund_id": refund_transaction.transaction_id,
@@ -768,59 +2911,808 @@ async def process_refund(
         "refund_amount": refund_data["amount"]
     }
 
-# Enhanced Analytics Endpoints
-@api_router.get("/analytics/conversion-rates")
-async def get_conversion_analytics(current_user: User = Depends(get_current_user)):
-    """Get conversion rate analytics"""
+# Revenue rollups
+@api_router.get("/analytics/revenue")
+async def get_revenue_analytics(
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    granularity: str = "month",
+    salesperson_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Booked, captured and refunded amounts with the outstanding balance per day or month"""
+    
+    if current_user.role not in ["salesperson", "sales_manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    if current_user.role == "salesperson":
+        salesperson_id = current_user.id
+    if granularity not in ["day", "month"]:
+        raise HTTPException(status_code=400, detail="granularity must be 'day' or 'month'")
     
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    try:
+        last_day = datetime.strptime(end, "%Y-%m-%d").replace(tzinfo=timezone.utc) if end else today
+        if start:
+            first_day = datetime.strptime(start, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        elif granularity == "day":
+            first_day = last_day - timedelta(days=29)
+        else:
+            first_day = (last_day.replace(day=1) - timedelta(days=335)).replace(day=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from and to must be YYYY-MM-DD")
+    if last_day < first_day:
+        raise HTTPException(status_code=400, detail="to must not be before from")
+    
+    series = await revenue_series(
+        db, first_day, last_day + timedelta(days=1), granularity,
+        [salesperson_id] if salesperson_id else None
+    )
+    return {
+        "from": first_day.strftime("%Y-%m-%d"),
+        "to": last_day.strftime("%Y-%m-%d"),
+        "salesperson_id": salesperson_id,
+        **series
+    }
+
+@api_router.get("/analytics/salesperson-performance")
+async def get_salesperson_performance(current_user: User = Depends(get_current_user)):
+    """Conversion rate, win rate and first-response time per salesperson, from running aggregates"""
+    
+    if current_user.role == "salesperson":
+        return {"salesperson_id": current_user.id, **await salesperson_summary(db, current_user.id)}
     if current_user.role not in ["sales_manager", "admin"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Mock analytics data
+    team, members = await team_summaries(db)
+    names = {
+        user["id"]: user["name"]
+        async for user in db.users.find({"id": {"$in": [m["salesperson_id"] for m in members]}}, {"id": 1, "name": 1})
+    }
+    for member in members:
+        member["name"] = names.get(member["salesperson_id"])
+    members.sort(key=lambda member: member["conversion_rate"] or 0, reverse=True)
+    return {"team": team, "salespeople": members}
+
+@api_router.post("/admin/performance/rebuild")
+async def rebuild_performance(current_user: User = Depends(get_current_user)):
+    """Queue a rebuild of the salesperson metrics from request and quotation history"""
+    
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    job_id = await job_queue.enqueue("rebuild_salesperson_metrics")
+    return {"message": "Salesperson metrics rebuild queued", "job_id": job_id}
+
+@api_router.post("/admin/revenue/rebuild")
+async def rebuild_revenue(current_user: User = Depends(get_current_user)):
+    """Queue a rebuild of the revenue buckets from the payment ledger"""
+    
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    job_id = await job_queue.enqueue("rebuild_revenue_buckets")
+    return {"message": "Revenue rebuild queued", "job_id": job_id}
+
+# Enhanced Analytics Endpoints
+ANALYTICS_SOURCES = ["travel_requests", "quotations", "bookings"]
+ANALYTICS_TOP_N = 20
+ANALYTICS_TREND_MONTHS = 12
+ANALYTICS_PRICE_BINS = 10
+ANALYTICS_MIN_SAMPLES = 20  # fewer decided quotations give no price points for a segment
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+SEASONS = ["peak", "high", "normal", "low"]
+
+def epoch_seconds(value) -> float:
+    return as_utc(value).timestamp() if isinstance(value, datetime) else np.nan
+
+def month_index(value) -> int:
+    """Months since year 0, so consecutive months have consecutive codes"""
+    return value.year * 12 + value.month - 1 if isinstance(value, datetime) else -1
+
+def travel_month(value) -> int:
+    """1-12, or 0 when the travel date is missing or unparseable"""
+    try:
+        return parse_travel_date(value).month if value is not None else 0
+    except ValueError:
+        return 0
+
+async def quotation_requests(quotations: list) -> dict:
+    """The request attributes quotation rows are segmented by, hot or archived"""
+    request_ids = list({quotation["request_id"] for quotation in quotations})
+    projection = {"_id": 0, "id": 1, "destinations": 1, "travel_type": 1, "departure_date": 1,
+                  "travelers_count": 1, "budget_max": 1}
+    requests = await find_with_history(
+        db, "travel_requests", {"id": {"$in": request_ids}}, projection, include_archived=True, limit=None
+    )
+    return {request["id"]: request for request in requests}
+
+def request_attribute(name: str, transform=lambda value: value):
+    def extract(quotation: dict, requests: dict):
+        request = requests.get(quotation["request_id"])
+        return transform(request.get(name)) if request else transform(None)
+    return extract
+
+def first_destination(destinations) -> Optional[str]:
+    return destinations[0] if destinations else None
+
+# Columns are read from the hot collections and, on a full load, their archives
+analytics_snapshot = Snapshot(
+    db,
+    [
+        Table(
+            "travel_requests",
+            [
+                Column("created_at", lambda d, _: epoch_seconds(d.get("created_at"))),
+                Column("created_month", lambda d, _: month_index(d.get("created_at")), np.int32),
+                Column("destination", lambda d, _: first_destination(d.get("destinations")), categorical=True),
+                Column("travel_type", lambda d, _: d.get("travel_type"), categorical=True),
+                Column("salesperson", lambda d, _: d.get("assigned_salesperson"), categorical=True),
+                Column("status", lambda d, _: d.get("status"), categorical=True),
+                Column("quoted", lambda d, _: bool(d.get("first_quoted_at")) or d.get("status") in ("quoted", "confirmed"), bool),
+            ],
+            sources=["travel_requests", archive_collection("travel_requests")],
+            projection={"_id": 0, "id": 1, "created_at": 1, "destinations": 1, "travel_type": 1,
+                        "assigned_salesperson": 1, "status": 1, "first_quoted_at": 1},
+            max_rows=ANALYTICS_MAX_ROWS,
+        ),
+        Table(
+            "quotations",
+            [
+                Column("created_at", lambda d, _: epoch_seconds(d.get("created_at"))),
+                Column("status", lambda d, _: d.get("status"), categorical=True),
+                Column("salesperson", lambda d, _: d.get("salesperson_id"), categorical=True),
+                Column("price", lambda d, _: d.get("total_price") or 0),
+                Column("margin", lambda d, _: d.get("margin") or 0),
+                Column("destination", request_attribute("destinations", first_destination), categorical=True),
+                Column("travel_type", request_attribute("travel_type"), categorical=True),
+                Column("travel_month", request_attribute("departure_date", travel_month), np.int8),
+                Column("travelers", request_attribute("travelers_count", lambda value: value or 1), np.int32),
+                Column("budget", request_attribute("budget_max", lambda value: value or np.nan)),
+            ],
+            sources=["quotations", archive_collection("quotations")],
+            projection={"_id": 0, "id": 1, "request_id": 1, "created_at": 1, "status": 1,
+                        "salesperson_id": 1, "total_price": 1, "margin": 1},
+            prepare=quotation_requests,
+            max_rows=ANALYTICS_MAX_ROWS,
+        ),
+        Table(
+            "bookings",
+            [
+                Column("created_at", lambda d, _: epoch_seconds(d.get("created_at"))),
+                Column("status", lambda d, _: d.get("booking_status"), categorical=True),
+                Column("total_amount", lambda d, _: d.get("total_amount") or 0),
+                Column("amount_paid", lambda d, _: d.get("amount_paid") or 0),
+            ],
+            sources=["bookings", archive_collection("bookings")],
+            projection={"_id": 0, "id": 1, "created_at": 1, "booking_status": 1, "total_amount": 1, "amount_paid": 1},
+            max_rows=ANALYTICS_MAX_ROWS,
+        ),
+    ],
+    refresh_seconds=ANALYTICS_REFRESH_SECONDS,
+    skew_seconds=SYNC_CLOCK_SKEW_SECONDS,
+    tombstone_days=SYNC_TOMBSTONE_DAYS,
+)
+
+def rounded(value, digits: int = 3):
+    """JSON-safe rounding: NaN (no data) becomes None"""
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+def finite_or_none(value) -> Optional[float]:
+    """JSON-safe float: NaN and infinities become None"""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+def conversion_by(table: Table, column: str, quoted, won, limit: int = ANALYTICS_TOP_N) -> dict:
+    """Won / quoted requests per label, for the `limit` labels with most quoted requests"""
+    codes = table.frame()[column]
+    size = len(table.dictionaries[column])
+    trials = group_counts(codes, size, quoted)
+    rates = ratios(group_counts(codes, size, won), trials)
+    labels = table.labels(column)
+    return {labels[code]: rounded(rates[code]) for code in np.argsort(-trials, kind="stable")[:limit] if trials[code]}
+
+def conversion_summary(snapshot: Snapshot, now: datetime) -> dict:
+    """Request conversion overall, by destination, by salesperson id and by month created.
+
+    Computed once per version of the requests table and month; the result is shared.
+    """
+    requests = snapshot["travel_requests"]
+    current_month = month_index(now)
+    return requests.derived(("conversion_summary", current_month), lambda: summarise_conversion(requests, current_month))
+
+def summarise_conversion(requests: Table, current_month: int) -> dict:
+    frame = requests.frame()
+    quoted = frame["quoted"]
+    won = quoted & requests.matches("status", ["confirmed"])
+
+    first_month = current_month - ANALYTICS_TREND_MONTHS + 1
+    offsets = frame["created_month"].astype(np.intp) - first_month
+    offsets = masked_codes(offsets, (offsets >= 0) & (offsets < ANALYTICS_TREND_MONTHS))
+    trials = group_counts(offsets, ANALYTICS_TREND_MONTHS, quoted)
+    rates = ratios(group_counts(offsets, ANALYTICS_TREND_MONTHS, won), trials)
+    months = [first_month + offset for offset in range(ANALYTICS_TREND_MONTHS)]
+    return {
+        "overall_conversion": rounded(ratios(np.array([won.sum()]), np.array([quoted.sum()]))[0]),
+        "quoted_requests": int(quoted.sum()),
+        "by_destination": conversion_by(requests, "destination", quoted, won),
+        "by_salesperson": conversion_by(requests, "salesperson", quoted, won),
+        "trend_data": [
+            {"month": f"{month // 12}-{month % 12 + 1:02d}", "rate": rounded(rate), "quoted": int(count)}
+            for month, rate, count in zip(months, rates, trials)
+        ],
+    }
+
+def price_points(segments, prices, accepted, size: int) -> dict:
+    """Per segment code: accepted price range and the price band with the highest price x acceptance.
+
+    Prices are banded on a log scale per segment, ANALYTICS_PRICE_BINS bands
+    across two standard deviations either side of the segment's mean log
+    price, so every segment is aggregated in the same few passes without
+    sorting. The accepted range is the 10th-90th percentile of a log-normal
+    fitted to the segment's accepted prices. Rows with segment -1 are skipped.
+    """
+    logs = np.log(np.maximum(prices, 1))
+
+    def log_moments(mask=None):
+        counts = group_counts(segments, size, mask)
+        mean = ratios(group_sums(segments, logs, size, mask), counts)
+        spread = np.sqrt(np.maximum(ratios(group_sums(segments, logs * logs, size, mask), counts) - mean * mean, 1e-12))
+        return counts, mean, spread
+
+    counts, mean, spread = log_moments()
+    z = (logs - mean[segments]) / spread[segments]
+    bands = np.clip(((z + 2) * ANALYTICS_PRICE_BINS / 4).astype(np.intp), 0, ANALYTICS_PRICE_BINS - 1)
+    cells = masked_codes(segments * ANALYTICS_PRICE_BINS + bands, segments >= 0)
+    size_cells = size * ANALYTICS_PRICE_BINS
+    offers = group_counts(cells, size_cells)
+    acceptance = ratios(group_sums(cells, accepted, size_cells), offers)
+    centres = ratios(group_sums(cells, prices, size_cells), offers)
+    expected = np.nan_to_num(centres * acceptance, nan=-1).reshape(size, ANALYTICS_PRICE_BINS)
+    best = np.arange(size) * ANALYTICS_PRICE_BINS + expected.argmax(axis=1)
+
+    accepted_counts, accepted_mean, accepted_spread = log_moments(accepted)
+    low = np.exp(accepted_mean - 1.2816 * accepted_spread)
+    high = np.exp(accepted_mean + 1.2816 * accepted_spread)
+    return {
+        int(code): {
+            "min": round(float(low[code]), -2),
+            "max": round(float(high[code]), -2),
+            "optimal": round(float(centres[best[code]]), -2),
+            "acceptance_at_optimal": rounded(acceptance[best[code]]),
+        }
+        for code in np.flatnonzero((counts >= ANALYTICS_MIN_SAMPLES) & (accepted_counts > 0))
+    }
+
+def seasonal_profile(frame: dict, accepted) -> dict:
+    """Accepted price per traveller by travel month relative to the overall mean.
+
+    Months are ranked by that multiplier into SEASONS of three months each;
+    a season's multiplier is its mean price per traveller relative to the overall mean.
+    """
+    months = frame["travel_month"].astype(np.intp) - 1
+    per_traveller = frame["price"] / np.maximum(frame["travelers"], 1)
+    sums = group_sums(months, per_traveller, 12, accepted)
+    counts = group_counts(months, 12, accepted)
+    overall = sums.sum() / counts.sum() if counts.sum() else np.nan
+    monthly = ratios(sums, counts) / overall
+    ranked = np.argsort(-np.nan_to_num(monthly, nan=-np.inf), kind="stable")
+    seasons = {season: sorted(ranked[i * 3:(i + 1) * 3].tolist()) for i, season in enumerate(SEASONS)}
     return {
-        "overall_conversion": 0.742,
-        "by_destination": {
-            "Goa": 0.823,
-            "Manali": 0.687,
-            "Kerala": 0.756,
-            "Rajasthan": 0.634
+        "monthly": monthly,
+        "seasons": seasons,
+        "multipliers": {
+            season: ratios(sums[months].sum(), counts[months].sum()) / overall for season, months in seasons.items()
         },
-        "by_salesperson": {
-            "Sarah Sales": 0.834,
-            "John Doe": 0.723,
-            "Mike Smith": 0.692
+    }
+
+def pricing_summary(snapshot: Snapshot) -> dict:
+    """Margins, acceptance and price points of decided quotations, plus seasonal multipliers.
+
+    Computed once per snapshot version; the result is shared.
+    """
+    return snapshot.derived("pricing_summary", lambda: summarise_pricing(snapshot))
+
+def summarise_pricing(snapshot: Snapshot) -> dict:
+    quotations = snapshot["quotations"]
+    frame = quotations.frame()
+    accepted = quotations.matches("status", ["accepted"])
+    decided = quotations.matches("status", ["accepted", "rejected"])
+
+    travel_types = quotations.labels("travel_type")
+    segments = masked_codes(frame["travel_type"], decided)
+    points = price_points(segments, frame["price"], accepted, len(travel_types))
+
+    seasonal = seasonal_profile(frame, accepted)
+    bookings = snapshot["bookings"]
+    booked = ~bookings.matches("status", ["cancelled"])
+    return {
+        # Quotation margins are percentages of the price
+        "average_margin": rounded(frame["margin"][accepted].mean() / 100 if accepted.any() else np.nan),
+        "price_acceptance_rate": rounded(accepted.sum() / decided.sum() if decided.any() else np.nan),
+        "decided_quotations": int(decided.sum()),
+        "average_booking_value": rounded(bookings.frame()["total_amount"][booked].mean() if booked.any() else np.nan, 2),
+        "optimal_price_points": {travel_types[code]: point for code, point in points.items()},
+        "seasonal_multipliers": {season: rounded(value) for season, value in seasonal["multipliers"].items()},
+        "seasons": {season: [MONTH_NAMES[month] for month in months] for season, months in seasonal["seasons"].items()},
+        "monthly_multipliers": {MONTH_NAMES[month]: rounded(seasonal["monthly"][month]) for month in range(12)},
+    }
+
+# Price elasticity: per-segment acceptance curves fitted by a background job
+pricing_models = PricingModels(db, check_seconds=ANALYTICS_REFRESH_SECONDS)
+RATIO_QUANTILES = (0.05, 0.5, 0.95)
+
+def elasticity_segments(frame: dict, sizes: dict, seasons: dict, valid) -> list:
+    """Segment levels for fit_hierarchy: overall > travel type > x season > x destination"""
+    month_seasons = np.full(13, -1, np.intp)  # travel_month 0 (unknown) has no season
+    for code, months in enumerate(seasons.values()):
+        month_seasons[np.asarray(months, np.intp) + 1] = code
+    travel_type, destination = frame["travel_type"], frame["destination"]
+    season = month_seasons[frame["travel_month"]]
+    types, n_seasons, destinations = sizes["travel_type"], len(seasons), sizes["destination"]
+    typed = valid & (travel_type >= 0)
+    seasonal = typed & (season >= 0)
+    type_season = travel_type * n_seasons + season
+    return [
+        (masked_codes(np.zeros(len(valid), np.intp), valid), 1, None),
+        (masked_codes(travel_type, typed), types, np.zeros(types, np.intp)),
+        (masked_codes(type_season, seasonal), types * n_seasons, np.arange(types * n_seasons) // n_seasons),
+        (
+            masked_codes(destination * types * n_seasons + type_season, seasonal & (destination >= 0)),
+            destinations * types * n_seasons,
+            np.arange(destinations * types * n_seasons) % (types * n_seasons),
+        ),
+    ]
+
+def fit_pricing_model(snapshot: Snapshot, penalty: float = PRICING_MODEL_PENALTY) -> Optional[dict]:
+    """Fit acceptance against log(price / budget) per segment from decided quotations.
+
+    Seasons are the travel-month groups of seasonal_profile(). Returns the
+    model document, or None when no decided quotation has a budget to compare with.
+    """
+    quotations = snapshot["quotations"]
+    frame = quotations.frame()
+    accepted = quotations.matches("status", ["accepted"])
+    valid = quotations.matches("status", ["accepted", "rejected"]) & (frame["price"] > 0) & (frame["budget"] > 0)
+    if not valid.any():
+        return None
+    ratio = np.where(valid, frame["price"], 1) / np.where(valid, frame["budget"], 1)
+    x = np.log(ratio)
+    y = accepted.astype(np.float64)
+    seasonal = seasonal_profile(frame, accepted)
+    sizes = {name: len(quotations.dictionaries[name]) for name in ("travel_type", "destination")}
+    levels = elasticity_segments(frame, sizes, seasonal["seasons"], valid)
+    fits = fit_hierarchy(x, y, levels, penalty)
+
+    (overall_intercept, overall_slope, overall_samples, overall_error), *segment_fits = fits
+    # Score each row with its most specific segment, as ElasticityModel.coefficients() looks them up
+    intercepts, slopes = np.full(len(x), overall_intercept[0]), np.full(len(x), overall_slope[0])
+    for (codes, _, _), (level_intercepts, level_slopes, _, _) in zip(levels[1:], segment_fits):
+        rows = codes >= 0
+        intercepts[rows], slopes[rows] = level_intercepts[codes[rows]], level_slopes[codes[rows]]
+    predicted = acceptance(intercepts[valid], slopes[valid], ratio[valid])
+    rate = y[valid].mean()
+
+    travel_types, destinations = quotations.labels("travel_type"), quotations.labels("destination")
+    season_names = list(seasonal["seasons"])
+    n_seasons = len(season_names)
+    keys = [
+        lambda code: (None, travel_types[code], None),
+        lambda code: (None, travel_types[code // n_seasons], season_names[code % n_seasons]),
+        lambda code: (
+            destinations[code // (len(travel_types) * n_seasons)],
+            travel_types[code // n_seasons % len(travel_types)],
+            season_names[code % n_seasons],
+        ),
+    ]
+    # Each segment's recommendations stay within the price / budget ratios it was quoted at
+    (overall_low, overall_median, overall_high), *level_ratios = (
+        np.exp(segment_quantiles(x, codes, size, RATIO_QUANTILES)) for codes, size, _ in levels
+    )
+    segments = []
+    for key, (intercepts, slopes, samples, errors), (lows, medians, highs) in zip(keys, segment_fits, level_ratios):
+        for code in np.flatnonzero(samples):
+            destination, travel_type, season = key(code)
+            segments.append({
+                "destination": destination,
+                "travel_type": travel_type,
+                "season": season,
+                "intercept": float(intercepts[code]),
+                "slope": float(slopes[code]),
+                "slope_error": finite_or_none(errors[code]),
+                "samples": int(samples[code]),
+                "ratio_range": [float(lows[code]), float(highs[code])],
+                "median_ratio": float(medians[code]),
+            })
+    return {
+        "feature": ELASTICITY_FEATURE,
+        "penalty": penalty,
+        "overall": {
+            "intercept": float(overall_intercept[0]),
+            "slope": float(overall_slope[0]),
+            "slope_error": finite_or_none(overall_error[0]),
+            "samples": int(overall_samples[0]),
+            "ratio_range": [float(overall_low[0]), float(overall_high[0])],
+            "median_ratio": float(overall_median[0]),
         },
-        "trend_data": [
-            {"month": "Jan", "rate": 0.72},
-            {"month": "Feb", "rate": 0.68},
-            {"month": "Mar", "rate": 0.74},
-            {"month": "Apr", "rate": 0.78}
-        ]
+        "segments": segments,
+        "seasons": {season: [month + 1 for month in months] for season, months in seasonal["seasons"].items()},
+        "season_multipliers": {season: rounded(value) for season, value in seasonal["multipliers"].items()},
+        "ratio_range": [float(overall_low[0]), float(overall_high[0])],
+        "acceptance_rate": float(rate),
+        # In-sample fit against always predicting the overall acceptance rate
+        "log_loss": log_loss(y[valid], predicted),
+        "baseline_log_loss": log_loss(y[valid], np.full(int(valid.sum()), rate)),
+    }
+
+async def quoted_cost(request_id: str) -> Optional[float]:
+    """Cost of the selected option of the request's most recently updated quotation"""
+    quotation = await db.quotations.find_one(
+        {"request_id": request_id}, {"_id": 0, "options": 1, "selected_option": 1, "margin": 1, "schema_version": 1},
+        sort=[("updated_at", DESCENDING)]
+    )
+    if not quotation or not quotation.get("options"):
+        return None
+    quotation, = await migrator.upgrade_documents("quotations", [quotation])
+    options = quotation["options"]
+    option = options[min(max(quotation.get("selected_option", 0), 0), len(options) - 1)]
+    return option.get("cost") or None
+
+def typical_cost_ratio(snapshot: Snapshot, travel_type: Optional[str]) -> float:
+    """Median cost / budget of the travel type's quotations (all types when it has none), NaN without data"""
+    quotations = snapshot["quotations"]
+    frame = quotations.frame()
+    priced = (frame["price"] > 0) & (frame["budget"] > 0)
+    typed = priced & quotations.matches("travel_type", [travel_type])
+    rows = typed if typed.any() else priced
+    if not rows.any():
+        return np.nan
+    # Quotation margins are percentages of the price
+    costs = frame["price"][rows] * (1 - frame["margin"][rows] / 100)
+    return float(np.median(costs / frame["budget"][rows]))
+
+def elasticity_recommendation(model, request: dict) -> RateRecommendation:
+    """The revenue-maximising price within the segment's observed price / budget range"""
+    budget = request.get("budget_max") or 100000
+    destination = first_destination(request.get("destinations"))
+    month = travel_month(request.get("departure_date"))
+    intercept, slope, samples, segment, (low, median, high), sensitive = model.lookup(
+        destination, request.get("travel_type"), month, price_sensitive=True
+    )
+    described = " x ".join(str(value) for value in segment.values() if value) or "all segments"
+    if sensitive:
+        ratio = revenue_optimal_ratio(intercept, slope, low, high)
+        # More decided quotations in the segment, more trust in its curve
+        confidence = samples / (samples + ANALYTICS_MIN_SAMPLES)
+        basis = f"{described}: "
+    else:
+        # Not even the overall curve clearly falls with price: keep the usual price rather than the range's ceiling
+        ratio, confidence = median, 0.0
+        basis = f"{described}: no significant price sensitivity, so the median quoted ratio is kept; "
+    conversion = float(acceptance(intercept, slope, ratio))
+    season = model.season(month)
+    return RateRecommendation(
+        request_id=request["id"],
+        recommended_price=round(budget * ratio, 2),
+        confidence=round(confidence, 2),
+        reasoning=(
+            f"{basis}{conversion:.0%} expected acceptance at {ratio:.2f}x budget "
+            f"(elasticity {slope * (1 - conversion):.2f}, {samples} decided quotations, model v{model.version})"
+        ),
+        seasonal_factor=model.document["season_multipliers"].get(season) or 1.0,
+        estimated_conversion=round(conversion, 3),
+        model_version=model.version,
+    )
+
+@api_router.get("/analytics/conversion-rates")
+async def get_conversion_analytics(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
+    """Get conversion rate analytics"""
+    
+    if current_user.role not in ["sales_manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    etag = await list_etag(request, current_user, ANALYTICS_SOURCES)
+    if is_not_modified(request, response, etag):
+        return not_modified_response(etag)
+    
+    return await conversion_analytics_payload(current_user=current_user, etag=etag)
+
+# The ETag is part of the cache key, so a body is never served under a newer
+# ETag than the data it was built from; a miss therefore means the data moved
+# on, and the snapshot is brought up to date regardless of its refresh interval.
+@cached(response_cache, ttl=RESPONSE_CACHE_TTL)
+async def conversion_analytics_payload(current_user: User, etag: str):
+    await analytics_snapshot.refresh(force=True)
+    summary = conversion_summary(analytics_snapshot, datetime.now(timezone.utc))
+    names = {
+        user["id"]: user["name"]
+        async for user in db.users.find({"id": {"$in": list(summary["by_salesperson"])}}, {"id": 1, "name": 1})
     }
+    # The summary is shared by the snapshot, so rename into a copy
+    return {**summary, "by_salesperson": {
+        names.get(salesperson_id, salesperson_id): rate for salesperson_id, rate in summary["by_salesperson"].items()
+    }}
 
 @api_router.get("/analytics/pricing-optimization")
-async def get_pricing_analytics(current_user: User = Depends(get_current_user)):
+async def get_pricing_analytics(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
     """Get pricing optimization analytics"""
     
+    etag = await list_etag(request, current_user, ANALYTICS_SOURCES)
+    if is_not_modified(request, response, etag):
+        return not_modified_response(etag)
+    
+    return await pricing_analytics_payload(current_user=current_user, etag=etag)
+
+@cached(response_cache, ttl=RESPONSE_CACHE_TTL)
+async def pricing_analytics_payload(current_user: User, etag: str):
+    await analytics_snapshot.refresh(force=True)
+    return pricing_summary(analytics_snapshot)
+
+@api_router.get("/admin/cache")
+async def get_cache_stats(current_user: User = Depends(get_current_user)):
+    """Get response cache statistics"""
+    
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
     return {
-        "average_margin": 0.147,
-        "price_acceptance_rate": 0.721,
-        "optimal_price_points": {
-            "budget_leisure": {"min": 45000, "max": 85000, "optimal": 62000},
-            "premium_leisure": {"min": 85000, "max": 150000, "optimal": 118000},
-            "business_travel": {"min": 75000, "max": 200000, "optimal": 135000}
-        },
-        "seasonal_multipliers": {
-            "peak": 1.4,
-            "high": 1.2,
-            "normal": 1.0,
-            "low": 0.8
-        }
+        "entries": response_cache.size,
+        "shared_tier": SHARED_RESPONSE_CACHE,
+        **response_cache.stats
+    }
+
+@api_router.get("/admin/analytics")
+async def get_analytics_snapshot_stats(current_user: User = Depends(get_current_user)):
+    """Get the analytics snapshot's size and freshness"""
+
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return analytics_snapshot.stats()
+
+@api_router.delete("/admin/cache")
+async def clear_response_cache(current_user: User = Depends(get_current_user)):
+    """Clear all response cache tiers"""
+    
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    await response_cache.clear()
+    return {"message": "Response cache cleared"}
+
+# Background job handlers
+async def create_notifications(user_ids, notification_type, message, data):
+    now = datetime.now(timezone.utc)
+    notifications = [{
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "type": notification_type,
+        "message": message,
+        "data": data,
+        "read": False,
+        "created_at": now
+    } for user_id in user_ids]
+    if notifications:
+        await db.notifications.insert_many(notifications)
+
+@job_queue.handler("notify_managers", concurrency=4)
+async def notify_managers(payload):
+    managers = await db.users.find(
+        {"role": {"$in": ["sales_manager", "admin"]}}, {"id": 1}
+    ).to_list(1000)
+    await create_notifications(
+        [manager["id"] for manager in managers],
+        "approval_requested",
+        f"{payload['requested_by_name']} requested a {payload['discount_percentage']}% discount on "
+        f"'{payload['quotation_title']}'",
+        payload
+    )
+
+@job_queue.handler("notify_salesperson", concurrency=4)
+async def notify_salesperson(payload):
+    message = f"{payload['decided_by_name']} {payload['decision']} your discount request"
+    if payload.get("comment"):
+        message += f": {payload['comment']}"
+    await create_notifications([payload["salesperson_id"]], f"approval_{payload['decision']}", message, payload)
+
+@job_queue.handler("reconcile_booking_payments", concurrency=2)
+async def reconcile_booking_payments(payload):
+    """Recompute a booking's paid amount and payment status from its transactions."""
+    booking = await db.bookings.find_one({"id": payload["booking_id"]})
+    if not booking:
+        return
+
+    totals = await db.payment_transactions.aggregate([
+        {"$match": {"booking_id": booking["id"], "status": "completed"}},
+        {"$group": {
+            "_id": None,
+            "amount_paid": {"$sum": "$amount"},
+            "refunds": {"$sum": {"$cond": [{"$lt": ["$amount", 0]}, 1, 0]}}
+        }}
+    ]).to_list(1)
+    amount_paid = max(0, totals[0]["amount_paid"]) if totals else 0
+    refunded = bool(totals) and totals[0]["refunds"] > 0
+
+    if amount_paid >= booking["total_amount"]:
+        payment_status = "paid"
+    elif amount_paid > 0:
+        payment_status = "partial"
+    else:
+        payment_status = "refunded" if refunded else "pending"
+
+    # Conflicts raise and the job is retried with fresh ledger totals
+    await compare_and_set(
+        db.bookings, {"id": booking["id"]},
+        {"$set": {"amount_paid": amount_paid, "payment_status": payment_status}},
+        version=booking.get("version", 1)
+    )
+    await record_change("bookings")
+
+@job_queue.handler("rebuild_revenue_buckets", concurrency=1, max_attempts=2)
+async def rebuild_revenue_job(payload):
+    count = await rebuild_revenue_buckets(db, chunks=payload.get("chunks", 8))
+    if count is not None:
+        logger.info(f"Rebuilt {count} revenue buckets")
+
+@job_queue.handler("rebuild_salesperson_metrics", concurrency=1, max_attempts=2)
+async def rebuild_performance_job(payload):
+    count = await rebuild_performance_metrics(db)
+    if count is not None:
+        logger.info(f"Rebuilt metrics for {count} salespeople")
+
+@job_queue.handler("archive_cold_data", concurrency=1, max_attempts=3)
+async def archive_cold_data(payload):
+    """Move finished records to the archive tier and expire stale drafts."""
+    archived = await archiver.run()
+    if any(archived.values()):
+        collections = [*archived, "payment_transactions"]
+        await record_change(*collections, *map(archive_collection, collections))
+    expired = await expire_drafts()
+    logger.info(f"Archived {archived}, expired {expired} draft quotations")
+    if payload.get("periodic"):
+        await job_queue.schedule("archive_cold_data", payload, delay_seconds=ARCHIVE_INTERVAL_HOURS * 3600)
+
+@job_queue.handler("fit_pricing_model", concurrency=1, max_attempts=3)
+async def fit_pricing_model_job(payload):
+    """Refit the price elasticity model from quotation outcomes and store it as a new version."""
+    await analytics_snapshot.refresh()
+    started = time.perf_counter()
+    document = fit_pricing_model(analytics_snapshot)
+    if document is None:
+        logger.info("No decided quotations with a budget yet; pricing model not fitted")
+    else:
+        document["fit_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        await pricing_models.save(document)
+    if payload.get("periodic"):
+        await job_queue.schedule("fit_pricing_model", payload, delay_seconds=PRICING_MODEL_REFIT_HOURS * 3600)
+
+@api_router.get("/notifications")
+async def get_notifications(unread_only: bool = False, current_user: User = Depends(get_current_user)):
+    """Get the current user's most recent notifications"""
+
+    query = {"user_id": current_user.id}
+    if unread_only:
+        query["read"] = False
+    return await db.notifications.find(query, {"_id": 0}).sort("created_at", DESCENDING).to_list(50)
+
+@api_router.post("/notifications/{notification_id}/read")
+async def mark_notification_read(notification_id: str, current_user: User = Depends(get_current_user)):
+    """Mark one of the current user's notifications as read"""
+
+    result = await db.notifications.update_one(
+        {"id": notification_id, "user_id": current_user.id},
+        {"$set": {"read": True}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    return {"message": "Notification marked as read"}
+
+@api_router.get("/admin/jobs")
+async def get_job_stats(current_user: User = Depends(get_current_user)):
+    """Get background job counts by type and status"""
+
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return {"worker_mode": JOB_WORKER_MODE, "jobs": await job_queue.stats()}
+
+@api_router.get("/admin/migrations")
+async def get_migration_progress(current_user: User = Depends(get_current_user)):
+    """Get schema migration progress per collection"""
+
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return {"mode": MIGRATION_MODE, **await migrator.progress()}
+
+@api_router.get("/admin/archive")
+async def get_archive_stats(current_user: User = Depends(get_current_user)):
+    """Get hot and archived document counts per tiered collection"""
+
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return {
+        "archive_after_days": ARCHIVE_AFTER_DAYS,
+        "draft_ttl_days": DRAFT_TTL_DAYS,
+        "collections": await archiver.stats(),
+    }
+
+@api_router.post("/admin/archive")
+async def run_archive(current_user: User = Depends(get_current_user)):
+    """Queue an archiving run now, besides the scheduled ones"""
+
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    job_id = await job_queue.enqueue("archive_cold_data")
+    return {"message": "Archiving queued", "job_id": job_id}
+
+@api_router.get("/admin/pricing-model")
+async def get_pricing_model(current_user: User = Depends(get_current_user)):
+    """Get the current price elasticity model and the fit history"""
+
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    model = await pricing_models.current()
+    return {
+        "refit_hours": PRICING_MODEL_REFIT_HOURS,
+        "current": model.document if model else None,
+        "history": await pricing_models.history(),
     }
 
+@api_router.post("/admin/pricing-model")
+async def refit_pricing_model(current_user: User = Depends(get_current_user)):
+    """Queue a pricing model fit now, besides the scheduled ones"""
+
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    job_id = await job_queue.enqueue("fit_pricing_model")
+    return {"message": "Pricing model fit queued", "job_id": job_id}
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Token buckets per route: login runs bcrypt, the others are CPU- or IO-heavy
+RATE_LIMIT_POLICIES = [
+    RatePolicy.per_minute("/api/auth/login", int(os.environ.get("LOGIN_RATE_PER_MINUTE", 10)), methods=["POST"]),
+    RatePolicy.per_minute("/api/auth/refresh", 30, methods=["POST"]),
+    RatePolicy.per_minute("/api/rate-optimization/simulate", 30, burst=10, per="user", methods=["POST"]),
+    RatePolicy.per_minute("/api/rate-optimization/recommendations/{request_id}", 60, burst=20, per="user"),
+    RatePolicy.per_minute("/api/rate-optimization/optimal-price/{request_id}", 60, burst=20, per="user"),
+    RatePolicy.per_minute("/api/quotations/documents/batch", 6, burst=2, per="user"),
+    RatePolicy.per_minute("/api/quotations/{quotation_id}/document", 60, burst=20, per="user"),
+    RatePolicy.per_minute("/api/requests/bulk", 10, per="user", methods=["POST"]),
+    RatePolicy.per_minute("/api/requests/bulk/upload", 10, per="user", methods=["POST"]),
+    RatePolicy.per_minute("/api/search", 120, burst=30, per="user"),
+]
+
+app.add_middleware(
+    RateLimitMiddleware,
+    policies=RATE_LIMIT_POLICIES,
+    store=MongoBucketStore(db) if SHARED_RATE_LIMITS else None,
+    trusted_proxies=int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", 0)),
+    enabled=os.environ.get("RATE_LIMIT_ENABLED", "true").lower() != "false",
+    verify_token=token_subject,
+)
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get("COMPRESSION_MIN_SIZE", 1024)),
+    gzip_level=int(os.environ.get("GZIP_LEVEL", 6)),
+    brotli_quality=int(os.environ.get("BROTLI_QUALITY", 4)),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -836,11 +3728,195 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Warm-up: the worker starts serving immediately and reports readiness via /readyz
+WARMUP_STEPS = []
+
+warmup_state = {
+    "status": "starting",  # starting, warming, ready, failed
+    "ready": False,
+    "current_step": None,
+    "steps": {},
+    "time_to_ready_ms": None,
+    "time_to_first_request_ms": None,
+}
+
+def warmup_step(name: str, required: bool = True):
+    """Register a coroutine to run during background warm-up.
+
+    Required steps run first and readiness waits only for them; optional
+    steps (cache priming, rollup rebuilds) run after the worker is marked ready.
+    """
+    def decorator(func):
+        WARMUP_STEPS.append((name, func, required))
+        warmup_state["steps"][name] = {"status": "pending", "required": required, "duration_ms": None}
+        return func
+    return decorator
+
+def elapsed_ms() -> float:
+    return round((time.monotonic() - PROCESS_STARTED_AT) * 1000, 1)
+
+async def ensure_collection_indexes(collection: str, indexes: List[IndexModel]):
+    try:
+        await db[collection].create_indexes(indexes)
+    except OperationFailure as e:
+        # 85/86: an index with the same name exists with a different definition
+        if e.code not in (85, 86):
+            raise
+        for index in indexes:
+            try:
+                await db[collection].create_indexes([index])
+            except OperationFailure as index_error:
+                if index_error.code not in (85, 86):
+                    raise
+                logger.info(f"Rebuilding changed index {collection}.{index.document['name']}")
+                await db[collection].drop_index(index.document["name"])
+                await db[collection].create_indexes([index])
+
+@warmup_step("indexes")
+async def ensure_indexes():
+    await asyncio.gather(*(
+        ensure_collection_indexes(collection, indexes) for collection, indexes in INDEXES.items()
+    ))
+
+@warmup_step("seed")
+async def seed_mock_data():
+    await init_mock_data()
+
+@warmup_step("document_versions")
+async def backfill_document_versions():
+    # Documents written before versioning start at version 1
+    results = await asyncio.gather(*(
+        db[collection].update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+        for collection in ["travel_requests", "quotations", "bookings", "approval_requests"]
+    ))
+    backfilled = sum(result.modified_count for result in results)
+    if backfilled:
+        logger.info(f"Added versions to {backfilled} documents")
+
+@warmup_step("travel_dates")
+async def upgrade_string_travel_dates():
+    # Range queries (calendar, upcoming trips) cannot match legacy string dates,
+    # so those documents are upgraded before serving; the type query stays on
+    # the date indexes, so this is a no-op lookup once none are left
+    requests_migrated, bookings_migrated = await asyncio.gather(
+        migrator.upgrade_matching("travel_requests", {"departure_date": {"$type": "string"}}),
+        migrator.upgrade_matching("bookings", {"travel_date": {"$type": "string"}})
+    )
+    if requests_migrated or bookings_migrated:
+        logger.info(f"Converted travel dates on {requests_migrated} requests and {bookings_migrated} bookings")
+
+@warmup_step("rollups", required=False)
+async def build_missing_rollups():
+    # Existing data without rollups (first deploy, or freshly seeded mock data)
+    if await db.bookings.estimated_document_count() and not await db.revenue_buckets.estimated_document_count():
+        await rebuild_revenue_buckets(db)
+    if await db.travel_requests.estimated_document_count() and not await db.salesperson_metrics.estimated_document_count():
+        await rebuild_performance_metrics(db)
+
+@warmup_step("assignment")
+async def load_assignment_engine():
+    await assignment_engine.load(db)
+
+@warmup_step("connection_pool", required=False)
+async def prime_connection_pool():
+    await db.command("ping")
+
+@warmup_step("archive_schedule", required=False)
+async def schedule_archiving():
+    # One periodic chain however many workers start; the first run waits an interval
+    await job_queue.schedule(
+        "archive_cold_data", {"periodic": True}, delay_seconds=ARCHIVE_INTERVAL_HOURS * 3600
+    )
+
+@warmup_step("pricing_model_schedule", required=False)
+async def schedule_pricing_model():
+    # Fit right away when there is no model yet, then on a periodic chain
+    if await pricing_models.current() is None:
+        await job_queue.schedule("fit_pricing_model")
+    await job_queue.schedule(
+        "fit_pricing_model", {"periodic": True}, delay_seconds=PRICING_MODEL_REFIT_HOURS * 3600
+    )
+
+@warmup_step("analytics_snapshot", required=False)
+async def load_analytics_snapshot():
+    # Up to ANALYTICS_MAX_ROWS rows per table: last, so the cheap scheduling steps
+    # are not held up; requests before it finishes refresh the snapshot themselves
+    await analytics_snapshot.refresh()
+
+async def run_warmup_step(name: str, func) -> bool:
+    step = warmup_state["steps"][name]
+    warmup_state["current_step"] = name
+    step["status"] = "running"
+    started = time.monotonic()
+    try:
+        await func()
+    except Exception as e:
+        step["status"] = "failed"
+        step["error"] = str(e)
+        logger.exception(f"Warm-up step '{name}' failed")
+        return False
+    finally:
+        step["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+    step["status"] = "done"
+    return True
+
+async def run_warmup():
+    """Run the required steps, mark the worker ready, then run the optional ones.
+
+    Each group runs in registration order; optional steps may rely on every
+    required one having finished, whatever order they were registered in.
+    """
+    warmup_state["status"] = "warming"
+
+    for name, func, required in WARMUP_STEPS:
+        if required and not await run_warmup_step(name, func):
+            warmup_state["status"] = "failed"
+            warmup_state["current_step"] = None
+            return
+    warmup_state["ready"] = True
+    warmup_state["time_to_ready_ms"] = elapsed_ms()
+    logger.info(f"Worker ready after {warmup_state['time_to_ready_ms']} ms")
+
+    for name, func, required in WARMUP_STEPS:
+        if not required:
+            await run_warmup_step(name, func)
+
+    warmup_state["status"] = "ready"
+    warmup_state["current_step"] = None
+    if MIGRATION_MODE != "external":
+        # After the seed step, so freshly seeded legacy documents are migrated too
+        migrator.start()
+
+@app.middleware("http")
+async def record_first_request(request: Request, call_next):
+    response = await call_next(request)
+    if warmup_state["time_to_first_request_ms"] is None and request.url.path not in ("/healthz", "/readyz"):
+        warmup_state["time_to_first_request_ms"] = elapsed_ms()
+        logger.info(f"First request served after {warmup_state['time_to_first_request_ms']} ms")
+    return response
+
+@app.get("/healthz")
+async def liveness():
+    return {"status": "alive", "uptime_ms": elapsed_ms()}
+
+@app.get("/readyz")
+async def readiness():
+    return JSONResponse(
+        status_code=200 if warmup_state["ready"] else 503,
+        content=warmup_state,
+    )
+
 @app.on_event("startup")
 async def startup_event():
-    await init_mock_data()
-    logger.info("Mock data initialized")
+    app.state.warmup_task = asyncio.create_task(run_warmup())
+    if JOB_WORKER_MODE != "external":
+        job_queue.start()
+    logger.info(f"Worker accepting connections after {elapsed_ms()} ms, warm-up running in background")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    app.state.warmup_task.cancel()
+    await job_queue.stop()
+    await migrator.stop()
+    quotation_renderer.shutdown()
+    db.close()
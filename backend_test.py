@@ -1,5 +1,6 @@
 import requests
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 class TripFlowAPITester:
@@ -500,6 +501,197 @@ class TripFlowAPITester:
         
         return success
 
+    def test_concurrent_quotation_accept(self, attempts=5):
+        """Accept the same quotation concurrently; exactly one booking must be created"""
+        if not all(role in self.tokens for role in ["Customer", "Salesperson", "Sales Manager"]):
+            print("❌ Customer, Salesperson and Sales Manager tokens are required")
+            return False
+
+        # Set up a fresh request with an approved quotation
+        success, travel_request = self.run_test(
+            "Create Request for Concurrent Accept",
+            "POST",
+            "requests",
+            200,
+            data={
+                "title": "Concurrent Accept Test - Jaipur",
+                "travel_type": "leisure",
+                "travelers_count": 2,
+                "adults": 2,
+                "children": 0,
+                "infants": 0,
+                "departure_date": "2025-02-10",
+                "return_date": "2025-02-14",
+                "is_flexible_dates": False,
+                "budget_min": 50000,
+                "budget_max": 80000,
+                "budget_per_person": False,
+                "destinations": ["Jaipur"],
+                "transport_modes": ["Flight"],
+                "accommodation_star": 5,
+                "meal_preference": "Vegetarian",
+                "status": "pending"
+            },
+            token=self.tokens["Customer"]
+        )
+        if not success:
+            return False
+
+        success, quotation = self.run_test(
+            "Create Quotation for Concurrent Accept",
+            "POST",
+            "quotations",
+            200,
+            data={
+                "request_id": travel_request["id"],
+                "title": "Jaipur Heritage Package",
+                "options": [{
+                    "name": "Option A - Heritage",
+                    "markup_percentage": 20,
+                    "line_items": [
+                        {"component": "hotel", "name": "Rambagh Palace", "quantity": 4, "unit_cost": 10000},
+                        {"component": "transport", "name": "Return flights", "quantity": 2, "unit_cost": 6000}
+                    ]
+                }]
+            },
+            token=self.tokens["Salesperson"]
+        )
+        if not success:
+            return False
+
+        success, approval = self.run_test(
+            "Request Approval for Concurrent Accept",
+            "POST",
+            f"quotations/{quotation['id']}/approval",
+            200,
+            data={
+                "quotation_id": quotation["id"],
+                "discount_percentage": 0,
+                "reason": "Concurrent accept test",
+                "requested_by": self.users["Salesperson"].get("id", "")
+            },
+            token=self.tokens["Salesperson"]
+        )
+        if not success:
+            return False
+
+        success, _ = self.run_test(
+            "Approve Quotation for Concurrent Accept",
+            "POST",
+            f"approvals/{approval['approval_id']}/decision",
+            200,
+            data={"decision": "approved"},
+            token=self.tokens["Sales Manager"]
+        )
+        if not success:
+            return False
+
+        # Fire the accepts at the same time
+        self.tests_run += 1
+        print(f"\n🔍 Testing Concurrent Quotation Accept ({attempts} requests)...")
+        url = f"{self.api_url}/quotations/{quotation['id']}/accept"
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.tokens["Customer"]}'
+        }
+        with ThreadPoolExecutor(max_workers=attempts) as pool:
+            responses = list(pool.map(lambda _: requests.post(url, json={}, headers=headers, timeout=10), range(attempts)))
+
+        status_codes = sorted(response.status_code for response in responses)
+        bookings = requests.get(f"{self.api_url}/bookings", headers=headers, timeout=10).json()
+        matching = [booking for booking in bookings if booking.get("quotation_id") == quotation["id"]]
+
+        expected_total = round(quotation["options"][0]["price"], 2)
+        if (
+            status_codes == [200] + [409] * (attempts - 1)
+            and len(matching) == 1
+            and round(matching[0]["total_amount"], 2) == expected_total
+        ):
+            self.tests_passed += 1
+            print(f"✅ Passed - One booking of {expected_total} created, status codes: {status_codes}")
+            return True
+
+        print(f"❌ Failed - Status codes: {status_codes}, bookings for quotation: {len(matching)}")
+        return False
+
+    def test_search_filters(self):
+        """Search with the type and status filters; they must narrow the results, not be ignored"""
+        if "Customer" not in self.tokens:
+            print("❌ Customer token is required")
+            return False
+
+        marker = f"searchmarker{datetime.now().strftime('%H%M%S%f')}"
+        success, travel_request = self.run_test(
+            "Create Request for Search",
+            "POST",
+            "requests",
+            200,
+            data={
+                "title": f"Search Test {marker}",
+                "travel_type": "leisure",
+                "travelers_count": 2,
+                "adults": 2,
+                "children": 0,
+                "infants": 0,
+                "departure_date": "2025-03-10",
+                "return_date": "2025-03-14",
+                "is_flexible_dates": False,
+                "budget_min": 40000,
+                "budget_max": 60000,
+                "budget_per_person": False,
+                "destinations": ["Kerala"],
+                "transport_modes": ["Flight"],
+                "status": "pending"
+            },
+            token=self.tokens["Customer"]
+        )
+        if not success:
+            return False
+
+        def found(response):
+            return [request["id"] for request in response.get("requests", {}).get("results", [])]
+
+        results = []
+        success, response = self.run_test(
+            "Search Requests by Status",
+            "GET",
+            f"search?q={marker}&type=requests&status=pending",
+            200,
+            token=self.tokens["Customer"]
+        )
+        results.append(success and found(response) == [travel_request["id"]] and "quotations" not in response)
+
+        success, response = self.run_test(
+            "Search Requests by Other Status",
+            "GET",
+            f"search?q={marker}&type=requests&status=cancelled",
+            200,
+            token=self.tokens["Customer"]
+        )
+        results.append(success and found(response) == [])
+
+        success, response = self.run_test(
+            "Search Quotations Only",
+            "GET",
+            f"search?q={marker}&type=quotations",
+            200,
+            token=self.tokens["Customer"]
+        )
+        results.append(success and "requests" not in response and "quotations" in response)
+
+        success, _ = self.run_test(
+            "Search with Invalid Type",
+            "GET",
+            f"search?q={marker}&type=bookings",
+            400,
+            token=self.tokens["Customer"]
+        )
+        results.append(success)
+
+        if not all(results):
+            print(f"❌ Search filters not applied as expected: {results}")
+        return all(results)
+
 def main():
     print("🚀 Starting TripFlow B2B API Testing...")
     print("=" * 60)
@@ -576,6 +768,16 @@ def main():
         if role_name in tester.tokens:
             tester.test_payment_processing(role_name)
     
+    # Test concurrent quotation acceptance
+    print("\n📋 QUOTATION ACCEPTANCE TESTING")
+    print("-" * 40)
+    tester.test_concurrent_quotation_accept()
+    
+    # Test search filters
+    print("\n📋 SEARCH TESTING")
+    print("-" * 40)
+    tester.test_search_filters()
+    
     # Test analytics endpoints
     print("\n📋 ANALYTICS TESTING")
     print("-" * 40)
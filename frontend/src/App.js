@@ -38,11 +38,47 @@ import {
   User
 } from 'lucide-react';
 import { toast, Toaster } from 'sonner';
+import { formatTravelDate } from './lib/utils';
 
 // API Configuration
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Access tokens are short-lived; refresh once on 401 and replay the request
+axios.interceptors.response.use(
+  response => response,
+  async error => {
+    const original = error.config;
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (
+      error.response?.status !== 401 ||
+      !refreshToken ||
+      !original ||
+      original._retried ||
+      original.url?.includes('/auth/login') ||
+      original.url?.includes('/auth/refresh')
+    ) {
+      return Promise.reject(error);
+    }
+
+    original._retried = true;
+    try {
+      const response = await axios.post(`${API}/auth/refresh`, { refresh_token: refreshToken });
+      const { access_token, refresh_token } = response.data;
+      localStorage.setItem('token', access_token);
+      localStorage.setItem('refresh_token', refresh_token);
+      axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
+      original.headers['Authorization'] = `Bearer ${access_token}`;
+      return axios(original);
+    } catch (refreshError) {
+      localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
+      delete axios.defaults.headers.common['Authorization'];
+      return Promise.reject(error);
+    }
+  }
+);
+
 // Create Auth Context
 const AuthContext = createContext();
 
@@ -67,6 +103,7 @@ const AuthProvider = ({ children }) => {
       setUser(response.data);
     } catch (error) {
       localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
       delete axios.defaults.headers.common['Authorization'];
     } finally {
       setLoading(false);
@@ -76,9 +113,10 @@ const AuthProvider = ({ children }) => {
   const login = async (email, password) => {
     try {
       const response = await axios.post(`${API}/auth/login`, { email, password });
-      const { access_token, user: userData } = response.data;
+      const { access_token, refresh_token, user: userData } = response.data;
       
       localStorage.setItem('token', access_token);
+      localStorage.setItem('refresh_token', refresh_token);
       axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
       setUser(userData);
       
@@ -95,6 +133,7 @@ const AuthProvider = ({ children }) => {
 
   const logout = () => {
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     delete axios.defaults.headers.common['Authorization'];
     setUser(null);
     toast.success('Logged out successfully');
@@ -1016,7 +1055,7 @@ const OperationsDashboard = () => {
                     }`}></div>
                     <div>
                       <p className="font-medium">{booking.customer_name}</p>
-                      <p className="text-sm text-gray-600">{booking.travel_date}</p>
+                      <p className="text-sm text-gray-600">{formatTravelDate(booking.travel_date)}</p>
                     </div>
                   </div>
                   <Badge variant={booking.booking_status === 'confirmed' ? 'default' : 'secondary'}>
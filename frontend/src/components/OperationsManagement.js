@@ -32,6 +32,7 @@ import {
   ExternalLink
 } from 'lucide-react';
 import { toast } from 'sonner';
+import { formatTravelDate } from '../lib/utils';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -149,7 +150,7 @@ const OperationsManagement = () => {
                     <Calendar className="w-4 h-4 text-blue-500" />
                     <span className="font-medium">Travel Date</span>
                   </div>
-                  <p className="text-lg font-semibold mt-1">{booking.travel_date}</p>
+                  <p className="text-lg font-semibold mt-1">{formatTravelDate(booking.travel_date)}</p>
                 </CardContent>
               </Card>
 
@@ -418,7 +419,7 @@ const OperationsManagement = () => {
                         <div className="flex items-center space-x-4 mt-1">
                           <div className="flex items-center space-x-1">
                             <Calendar className="w-4 h-4 text-gray-400" />
-                            <span className="text-sm text-gray-600">{booking.travel_date}</span>
+                            <span className="text-sm text-gray-600">{formatTravelDate(booking.travel_date)}</span>
                           </div>
                           <div className="flex items-center space-x-1">
                             <DollarSign className="w-4 h-4 text-gray-400" />
@@ -20,6 +20,7 @@ import {
 import { toast } from 'sonner';
 import axios from 'axios';
 import { format } from 'date-fns';
+import { formatTravelDate } from '../lib/utils';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -217,7 +218,7 @@ const RequestsList = ({ userRole, onCreateNew, onViewRequest }) => {
                       
                       <div className="flex items-center space-x-2">
                         <Calendar className="w-4 h-4" />
-                        <span>{format(new Date(request.departure_date), 'MMM dd, yyyy')}</span>
+                        <span>{formatTravelDate(request.departure_date)}</span>
                       </div>
                       
                       <div className="flex items-center space-x-2">
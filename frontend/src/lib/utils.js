@@ -1,6 +1,14 @@
 import { clsx } from "clsx";
 import { twMerge } from "tailwind-merge"
+import { format } from "date-fns";
 
 export function cn(...inputs) {
   return twMerge(clsx(inputs));
 }
+
+// Travel dates are stored as UTC midnight; format that calendar day rather
+// than the local time, which is the day before west of UTC
+export function formatTravelDate(value) {
+  const date = new Date(value);
+  return format(new Date(date.getUTCFullYear(), date.getUTCMonth(), date.getUTCDate()), "MMM dd, yyyy");
+}
@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def mongo():
+    """An empty in-memory database."""
+    return AsyncMongoMockClient()["test"]
+
+
+@pytest.fixture
+def server_db(mongo, monkeypatch):
+    """The server module with its database swapped for `mongo`."""
+    import server
+    monkeypatch.setattr(server.db, "_client", mongo.client)
+    monkeypatch.setattr(server.db, "_db", mongo)
+    return mongo
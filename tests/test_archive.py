@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from archive import ArchivePolicy, Archiver, archive_collection, find_with_history
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc)
+OLD = NOW - timedelta(days=400)
+
+BOOKINGS = ArchivePolicy(
+    "bookings", ["completed", "cancelled"], 365, field="booking_status",
+    dependents=[("payment_transactions", "booking_id")],
+)
+QUOTATIONS = ArchivePolicy("quotations", ["accepted"], 365, referrers=[("bookings", "quotation_id")])
+
+
+async def insert_booking(db, booking_id, status="completed", updated_at=OLD):
+    await db.quotations.insert_one({"id": f"q-{booking_id}", "status": "accepted", "updated_at": OLD, "version": 1})
+    await db.bookings.insert_one({
+        "id": booking_id, "quotation_id": f"q-{booking_id}", "booking_status": status,
+        "updated_at": updated_at, "version": 1,
+    })
+    await db.payment_transactions.insert_one({"id": f"t-{booking_id}", "booking_id": booking_id})
+
+
+async def ids(collection):
+    return sorted(await collection.distinct("id"))
+
+
+async def test_finished_bookings_move_with_their_transactions(mongo):
+    await insert_booking(mongo, "old")
+    await insert_booking(mongo, "recent", updated_at=NOW - timedelta(days=30))
+    await insert_booking(mongo, "open", status="confirmed")
+    assert await Archiver(mongo, [BOOKINGS], batch_size=1).archive(BOOKINGS, NOW) == (1, 0, 0)
+    assert await ids(mongo.bookings) == ["open", "recent"]
+    assert await ids(mongo[archive_collection("bookings")]) == ["old"]
+    assert await ids(mongo[archive_collection("payment_transactions")]) == ["t-old"]
+    assert await ids(mongo.payment_transactions) == ["t-open", "t-recent"]
+
+
+async def test_a_write_between_copy_and_delete_keeps_the_document_hot(mongo):
+    await insert_booking(mongo, "b1")
+    await insert_booking(mongo, "b2")
+    kept = []
+
+    async def concurrent_write(collection, ids):
+        # An operator edits b1 after the archiver copied it
+        await mongo.bookings.update_one({"id": "b1"}, {"$set": {"operation_notes": "late edit"}, "$inc": {"version": 1}})
+
+    async def after_keep(collection, ids):
+        kept.extend(ids)
+
+    archiver = Archiver(mongo, [BOOKINGS], before_delete=concurrent_write, after_keep=after_keep)
+    assert await archiver.archive(BOOKINGS, NOW) == (1, 1, 0)
+    assert kept == ["b1"]
+    assert (await mongo.bookings.find_one({"id": "b1"}))["operation_notes"] == "late edit"
+    # The stale copies are gone, and the transactions stayed with their booking
+    assert await ids(mongo[archive_collection("bookings")]) == ["b2"]
+    assert await ids(mongo[archive_collection("payment_transactions")]) == ["t-b2"]
+    assert await ids(mongo.payment_transactions) == ["t-b1"]
+
+    # A later run moves it with the edit
+    assert await Archiver(mongo, [BOOKINGS]).archive(BOOKINGS, NOW) == (1, 0, 0)
+    archived = await mongo[archive_collection("bookings")].find_one({"id": "b1"})
+    assert archived["operation_notes"] == "late edit"
+
+
+async def test_referenced_quotations_stay_hot_until_their_booking_moves(mongo):
+    await insert_booking(mongo, "old")
+    await insert_booking(mongo, "open", status="confirmed")
+    archiver = Archiver(mongo, [QUOTATIONS])
+    assert await archiver.archive(QUOTATIONS, NOW) == (0, 0, 2)
+    # Referring collections go first, so the parents follow in the same run
+    assert await Archiver(mongo, [BOOKINGS, QUOTATIONS]).run(NOW) == {"bookings": 1, "quotations": 1}
+    assert await ids(mongo.quotations) == ["q-open"]
+
+
+async def test_history_reads_prefer_the_hot_copy(mongo):
+    await mongo.bookings.insert_one({"id": "b1", "booking_status": "completed", "version": 2})
+    await mongo[archive_collection("bookings")].insert_many([
+        {"id": "b1", "booking_status": "completed", "version": 1},
+        {"id": "b0", "booking_status": "completed", "version": 1},
+    ])
+    assert [document["id"] for document in await find_with_history(mongo, "bookings", {})] == ["b1"]
+    history = await find_with_history(mongo, "bookings", {}, include_archived=True)
+    assert [(document["id"], document["version"]) for document in history] == [("b1", 2), ("b0", 1)]
+
+
+async def test_archived_records_leave_tombstones_unless_kept_hot(server_db, monkeypatch):
+    import server
+    await insert_booking(server_db, "b1")
+    await insert_booking(server_db, "b2")
+    before_delete = server.archiver.before_delete
+
+    async def concurrent_write(collection, ids):
+        await before_delete(collection, ids)
+        await server_db.bookings.update_one({"id": "b1"}, {"$inc": {"version": 1}})
+
+    monkeypatch.setattr(server.archiver, "before_delete", concurrent_write)
+    policy = next(policy for policy in server.archiver.policies if policy.collection == "bookings")
+    assert await server.archiver.archive(policy, NOW) == (1, 1, 0)
+    tombstones = await server_db.tombstones.find({"collection": "bookings"}).to_list(None)
+    assert [(tombstone["id"], tombstone["archived"]) for tombstone in tombstones] == [("b2", True)]
@@ -0,0 +1,92 @@
+import csv
+import io
+
+import pytest
+from fastapi import HTTPException
+from starlette.datastructures import UploadFile
+
+pytestmark = pytest.mark.anyio
+
+HEADER = ["title", "travel_type", "travelers_count", "adults", "children", "infants",
+          "departure_date", "return_date", "destinations", "transport_modes"]
+ROW = ["Trip", "leisure", 2, 2, 0, 0, "2027-05-01", "2027-05-10", "Paris;Rome", "Flight"]
+
+
+def customer():
+    import server
+    return server.User(id="c", email="customer@example.com", name="Customer", role="customer")
+
+
+def csv_bytes(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADER)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def upload(data, filename="requests.csv"):
+    import server
+    return await server.upload_travel_requests(UploadFile(io.BytesIO(data), filename=filename), customer())
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    import server
+    monkeypatch.setattr(server, "BULK_INSERT_BATCH_SIZE", 10)
+
+
+async def test_decode_error_reports_the_rows_already_inserted(server_db, small_batches):
+    # Row 26 holds a byte that is not UTF-8, two and a half batches in
+    data = csv_bytes([ROW] * 25) + b"Caf\xe9,leisure,2,2,0,0,2027-05-01,2027-05-10,Paris,Flight\n" + csv_bytes([ROW] * 5)
+    result = await upload(data)
+    assert (result.received, result.inserted, result.failed) == (25, 25, 0)
+    assert "utf-8" in result.read_error
+    assert await server_db.travel_requests.count_documents({}) == 25
+
+
+async def test_unreadable_upload_is_a_bad_request(server_db):
+    with pytest.raises(HTTPException) as failure:
+        await upload(b"not a zip file", filename="requests.xlsx")
+    assert failure.value.status_code == 400
+    assert await server_db.travel_requests.count_documents({}) == 0
+
+
+def test_spreadsheet_cells_are_coerced_to_request_fields():
+    import server
+    row = server.normalize_request_row({
+        " Travel Type ": "leisure", "destinations": "Paris; Rome|Nice", "is_flexible_dates": "Yes",
+        "adults": "2", "children": 1, "infants": 0, "special_requirements": "  ", None: "stray",
+    })
+    assert row == {"travel_type": "leisure", "destinations": ["Paris", "Rome", "Nice"], "is_flexible_dates": True,
+                   "adults": "2", "children": 1, "infants": 0, "travelers_count": 3}
+
+
+async def test_json_rows_are_inserted_across_batches_with_errors_by_row(server_db, small_batches):
+    import server
+    rows = [dict(zip(HEADER, ROW)) for _ in range(25)]
+    rows[3]["departure_date"] = "not a date"
+    del rows[17]["title"]
+    result = await server.bulk_insert_requests(rows, customer())
+    assert (result.received, result.inserted, result.failed) == (25, 23, 2)
+    assert [error["row"] for error in result.errors] == [4, 18]
+    assert await server_db.travel_requests.count_documents({"customer_id": "c"}) == 23
+    assert (await server_db.collection_changes.find_one({"_id": "travel_requests"}))["version"] == 3
+
+
+async def test_write_errors_are_reported_against_their_rows(server_db, small_batches):
+    import server
+    await server_db.travel_requests.create_index("id", unique=True)
+    await server_db.travel_requests.insert_one({"id": "taken"})
+    rows = [dict(zip(HEADER, ROW)) for _ in range(5)]
+    rows[2]["id"] = "taken"
+    result = await server.bulk_insert_requests(rows, customer())
+    assert (result.received, result.inserted, result.failed) == (5, 4, 1)
+    assert result.errors[0]["row"] == 3
+
+
+async def test_reported_errors_are_capped(server_db, small_batches, monkeypatch):
+    import server
+    monkeypatch.setattr(server, "BULK_MAX_REPORTED_ERRORS", 3)
+    result = await server.bulk_insert_requests([{"title": "Incomplete"}] * 12, customer())
+    assert (result.failed, len(result.errors), result.errors_truncated) == (12, 3, True)
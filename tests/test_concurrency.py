@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from concurrency import StateMachine, WriteConflict, compare_and_set, read_modify_write, versioned
+
+pytestmark = pytest.mark.anyio
+
+DOORS = StateMachine("door", {"open": ["closed"], "closed": ["open", "locked"], "locked": ["closed"]})
+
+
+def request_with(**headers):
+    return Request({"type": "http", "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]})
+
+
+def test_guard_lists_the_source_states():
+    assert DOORS.guard("locked") == {"status": {"$in": ["closed"]}}
+    assert sorted(DOORS.sources("closed")) == ["locked", "open"]
+    with pytest.raises(ValueError):
+        DOORS.guard("ajar")
+
+
+def test_versioned_bumps_version_and_keeps_other_operators():
+    update = versioned({"$set": {"name": "x"}, "$inc": {"count": 1}})
+    assert update["$inc"] == {"count": 1, "version": 1}
+    assert update["$set"]["name"] == "x" and "updated_at" in update["$set"]
+
+
+async def test_compare_and_set_applies_transition_and_bumps_version(mongo):
+    await mongo.doors.insert_one({"id": "d", "status": "open", "version": 1})
+    door = await compare_and_set(mongo.doors, {"id": "d"}, {}, version=1, machine=DOORS, target="closed")
+    assert (door["status"], door["version"]) == ("closed", 2)
+
+
+@pytest.mark.parametrize("key, version, target, reason", [
+    ({"id": "nope"}, None, "closed", "missing"),
+    ({"id": "d"}, 7, "closed", "version"),
+    ({"id": "d"}, 1, "locked", "transition"),
+])
+async def test_compare_and_set_reports_why_it_failed(mongo, key, version, target, reason):
+    await mongo.doors.insert_one({"id": "d", "status": "open", "version": 1})
+    with pytest.raises(WriteConflict) as failure:
+        await compare_and_set(mongo.doors, key, {}, version=version, machine=DOORS, target=target)
+    assert failure.value.reason == reason
+    if reason != "missing":
+        assert failure.value.current_state == "open"
+    assert (await mongo.doors.find_one({"id": "d"}))["version"] == 1
+
+
+async def test_read_modify_write_rebuilds_from_the_current_document(mongo):
+    await mongo.counters.insert_one({"id": "c", "value": 1, "version": 1})
+    stale = await mongo.counters.find_one({"id": "c"})
+    await mongo.counters.update_one({"id": "c"}, versioned({"$set": {"value": 5}}))
+
+    seen = []
+    def double(document):
+        seen.append(document["value"])
+        return {"$set": {"value": document["value"] * 2}}
+
+    counter = await read_modify_write(mongo.counters, {"id": "c"}, stale, double)
+    assert seen == [1, 5]
+    assert (counter["value"], counter["version"]) == (10, 3)
+
+
+async def test_read_modify_write_gives_up_after_its_attempts(mongo):
+    await mongo.counters.insert_one({"id": "c", "value": 1, "version": 2})
+    with pytest.raises(WriteConflict) as failure:
+        await read_modify_write(mongo.counters, {"id": "c"}, {"version": 1}, lambda _: {}, attempts=1)
+    assert failure.value.reason == "version"
+
+
+async def test_read_modify_write_does_not_retry_illegal_transitions(mongo):
+    await mongo.doors.insert_one({"id": "d", "status": "open", "version": 1})
+    calls = []
+    with pytest.raises(WriteConflict) as failure:
+        await read_modify_write(mongo.doors, {"id": "d"}, {"version": 1}, lambda doc: calls.append(doc) or {},
+                                machine=DOORS, target="locked")
+    assert failure.value.reason == "transition" and len(calls) == 1
+
+
+@pytest.mark.parametrize("reason, precondition, status", [
+    ("missing", False, 404),
+    ("version", False, 409),
+    ("version", True, 412),
+    ("transition", True, 409),
+])
+def test_conflict_error_status(reason, precondition, status):
+    import server
+    conflict = WriteConflict(reason, {"status": "accepted"}, server.QUOTATION_STATES, "pending_approval")
+    assert server.conflict_error(conflict, "Quotation", precondition=precondition).status_code == status
+
+
+@pytest.mark.parametrize("header, version", [
+    (None, None),
+    ("*", None),
+    ('"3"', 3),
+    ('W/"12"', 12),
+    (" 4 ", 4),
+])
+def test_if_match_version(header, version):
+    import server
+    request = request_with(if_match=header) if header is not None else request_with()
+    assert server.if_match_version(request) == version
+
+
+def test_if_match_version_rejects_other_etags():
+    import server
+    with pytest.raises(HTTPException) as failure:
+        server.if_match_version(request_with(if_match='"abc123"'))
+    assert failure.value.status_code == 400
+
+
+async def pending_approval(db):
+    import server
+    await db.quotations.insert_one({"id": "q", "title": "Q", "status": "pending_approval", "version": 2})
+    await db.approval_requests.insert_one({
+        "id": "a", "quotation_id": "q", "requested_by": "sales", "status": "pending", "version": 1
+    })
+    return server.User(id="manager", email="manager@example.com", name="Manager", role="sales_manager")
+
+
+async def test_second_decision_is_a_conflict(server_db):
+    import server
+    manager = await pending_approval(server_db)
+    await server.make_approval_decision("a", {"decision": "approved"}, manager)
+    with pytest.raises(HTTPException) as failure:
+        await server.make_approval_decision("a", {"decision": "rejected"}, manager)
+    assert failure.value.status_code == 409
+    assert (await server_db.approval_requests.find_one({"id": "a"}))["status"] == "approved"
+    assert (await server_db.quotations.find_one({"id": "q"}))["status"] == "approved"
+
+
+async def test_concurrent_decisions_apply_once(server_db):
+    import server
+    manager = await pending_approval(server_db)
+    results = await asyncio.gather(
+        server.make_approval_decision("a", {"decision": "approved"}, manager),
+        server.make_approval_decision("a", {"decision": "rejected"}, manager),
+        return_exceptions=True,
+    )
+    failures = [result for result in results if isinstance(result, HTTPException)]
+    assert len(failures) == 1 and failures[0].status_code == 409
+    assert await server_db.jobs.count_documents({"type": "notify_salesperson"}) == 1
+
+
+async def test_decision_on_unknown_approval_is_not_found(server_db):
+    import server
+    manager = await pending_approval(server_db)
+    with pytest.raises(HTTPException) as failure:
+        await server.make_approval_decision("missing", {"decision": "approved"}, manager)
+    assert failure.value.status_code == 404
@@ -0,0 +1,136 @@
+import math
+
+import numpy as np
+import pytest
+
+from elasticity import MAX_SLOPE, acceptance, fit_hierarchy, price_search, revenue_optimal_ratio, segment_fit
+
+
+def simulate(coefficients, rows, seed=7, centre=0.2, spread=0.3):
+    """Outcomes drawn from known per-segment (intercept, slope) curves."""
+    rng = np.random.default_rng(seed)
+    codes = np.repeat(np.arange(len(coefficients)), rows)
+    x = rng.normal(centre, spread, len(codes))
+    intercepts, slopes = np.array(coefficients).T
+    y = (rng.random(len(codes)) < acceptance(intercepts[codes], slopes[codes], np.exp(x))).astype(float)
+    return x, y, codes
+
+
+def test_segment_fit_recovers_known_coefficients():
+    truth = [(0.5, -2.0), (-0.3, -4.0), (1.0, -1.0)]
+    x, y, codes = simulate(truth, 20000)
+    intercept, slope, samples, slope_error = segment_fit(x, y, codes, 3, np.zeros(3), np.zeros(3), 1e-6)
+    assert samples.tolist() == [20000] * 3
+    for code, (true_intercept, true_slope) in enumerate(truth):
+        assert abs(slope[code] - true_slope) < 4 * slope_error[code]
+        assert intercept[code] == pytest.approx(true_intercept, abs=0.15)
+    assert np.all(slope_error < 0.2)
+
+
+def test_segment_fit_skips_uncoded_rows():
+    x, y, codes = simulate([(0.5, -2.0)], 5000)
+    noise_x, noise_y = np.full(1000, 3.0), np.ones(1000)
+    clean = segment_fit(x, y, codes, 1, np.zeros(1), np.zeros(1), 1e-6)
+    mixed = segment_fit(
+        np.concatenate([x, noise_x]), np.concatenate([y, noise_y]),
+        np.concatenate([codes, np.full(1000, -1)]), 1, np.zeros(1), np.zeros(1), 1e-6,
+    )
+    for expected, actual in zip(clean, mixed):
+        np.testing.assert_allclose(actual, expected)
+
+
+def test_segment_fit_refits_capped_slopes_with_the_slope_held():
+    x, y, codes = simulate([(0.2, 3.0), (0.5, -2.0)], 10000)
+    intercept, slope, _, slope_error = segment_fit(x, y, codes, 2, np.zeros(2), np.zeros(2), 1e-6)
+    assert slope[0] == MAX_SLOPE and np.isinf(slope_error[0])
+    # With the slope held at 0 the maximum-likelihood intercept is the logit of the acceptance rate
+    rate = y[codes == 0].mean()
+    assert intercept[0] == pytest.approx(math.log(rate / (1 - rate)), abs=1e-4)
+    # The other segment is fitted freely as before
+    assert slope[1] == pytest.approx(-2.0, abs=0.3) and np.isfinite(slope_error[1])
+
+
+def test_fit_hierarchy_recovers_unstandardised_coefficients():
+    # Narrow, off-centre prices: the fit works on standardised x and must convert back
+    x, y, codes = simulate([(0.5, -3.0), (1.5, -6.0)], 20000, centre=0.3, spread=0.1)
+    levels = [(np.zeros(len(codes), np.intp), 1, None), (codes, 2, np.zeros(2, np.intp))]
+    overall, segments = fit_hierarchy(x, y, levels, penalty=1.0)
+    assert overall[2].tolist() == [40000]
+    intercept, slope, samples, slope_error = segments
+    assert samples.tolist() == [20000, 20000]
+    assert slope[0] == pytest.approx(-3.0, abs=4 * slope_error[0])
+    assert slope[1] == pytest.approx(-6.0, abs=4 * slope_error[1])
+    assert intercept[1] == pytest.approx(1.5, abs=0.3)
+
+
+def test_fit_hierarchy_shrinks_small_segments_towards_their_parent():
+    x, y, codes = simulate([(0.5, -3.0), (3.0, 2.0)], [20000, 8])
+    levels = [(np.zeros(len(codes), np.intp), 1, None), (codes, 2, np.zeros(2, np.intp))]
+    overall, (intercept, slope, _, _) = fit_hierarchy(x, y, levels, penalty=50.0)
+    assert slope[1] == pytest.approx(overall[1][0], abs=0.2)
+    assert intercept[1] == pytest.approx(overall[0][0], abs=0.2)
+
+
+def brute_force_ratio(intercept, slope, low, high):
+    ratios = np.linspace(low, high, 200001)
+    return ratios[np.argmax(ratios * acceptance(intercept, slope, ratios))]
+
+
+@pytest.mark.parametrize("intercept, slope", [(2.0, -3.0), (0.5, -1.5), (4.0, -6.0), (-1.0, -2.5)])
+def test_revenue_optimal_ratio_matches_a_grid_search(intercept, slope):
+    low, high = 0.2, 3.0
+    assert revenue_optimal_ratio(intercept, slope, low, high) == pytest.approx(
+        brute_force_ratio(intercept, slope, low, high), abs=(high - low) / 100000
+    )
+
+
+@pytest.mark.parametrize("slope", [-1.0, -0.5, 0.0])
+def test_revenue_optimal_ratio_is_the_upper_bound_when_inelastic(slope):
+    assert revenue_optimal_ratio(1.0, slope, 0.5, 2.0) == 2.0
+    assert brute_force_ratio(1.0, slope, 0.5, 2.0) == pytest.approx(2.0)
+
+
+def test_revenue_optimal_ratio_clamps_to_the_range():
+    unclamped = revenue_optimal_ratio(2.0, -3.0, 0.01, 100.0)
+    assert revenue_optimal_ratio(2.0, -3.0, unclamped * 2, unclamped * 3) == unclamped * 2
+    assert revenue_optimal_ratio(2.0, -3.0, unclamped / 3, unclamped / 2) == unclamped / 2
+
+
+@pytest.mark.parametrize("intercept, slope", [(2.0, -3.0), (0.5, -1.5), (4.0, -6.0)])
+def test_price_search_without_cost_finds_the_revenue_optimum(intercept, slope):
+    budget, low, high = 1000.0, 500.0, 2500.0
+    (price, accepted, margin), _ = price_search(intercept, slope, budget, 0.0, low, high)
+    expected = budget * revenue_optimal_ratio(intercept, slope, low / budget, high / budget)
+    assert price == pytest.approx(expected, abs=(high - low) / 200 ** 2 * 2)
+    assert accepted == pytest.approx(float(acceptance(intercept, slope, price / budget)))
+    assert margin == pytest.approx(price * accepted)
+
+
+def test_price_search_refines_between_the_best_price_and_its_neighbours():
+    budget, cost, low, high = 1000.0, 400.0, 500.0, 2500.0
+    dense = np.linspace(low, high, 2_000_001)
+    best = dense[np.argmax((dense - cost) * acceptance(1.0, -3.0, dense / budget))]
+    (coarse_price, _, coarse_margin), grid = price_search(1.0, -3.0, budget, cost, low, high, refine=False)
+    (price, _, margin), refined_grid = price_search(1.0, -3.0, budget, cost, low, high)
+    step = (high - low) / 199
+    assert coarse_price in grid[0] and abs(coarse_price - best) <= step
+    assert abs(price - best) <= 2 * step / 199
+    assert margin >= coarse_margin
+    # The coarse grid is returned either way
+    for coarse, refined in zip(grid, refined_grid):
+        np.testing.assert_array_equal(coarse, refined)
+    assert len(grid[0]) == 200
+
+
+def test_price_search_at_the_bounds():
+    # Acceptance falls so steeply that the lowest price wins...
+    (price, _, _), _ = price_search(0.0, -40.0, 1000.0, 0.0, 1500.0, 2500.0)
+    assert price == 1500.0
+    # ...and with flat acceptance the highest one does
+    (price, accepted, margin), _ = price_search(0.5, 0.0, 1000.0, 100.0, 500.0, 2500.0)
+    assert price == 2500.0 and margin == pytest.approx(2400.0 * accepted)
+
+
+def test_price_search_with_two_points_does_not_refine():
+    (price, _, _), (prices, _, _) = price_search(1.0, -3.0, 1000.0, 0.0, 500.0, 2500.0, points=2)
+    assert prices.tolist() == [500.0, 2500.0] and price in (500.0, 2500.0)
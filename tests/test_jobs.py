@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from jobs import INDEXES, JobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def queue(mongo):
+    await mongo.jobs.create_indexes(INDEXES)
+    queue = JobQueue(mongo, lease_seconds=60)
+    calls = []
+
+    @queue.handler("flaky", max_attempts=2, backoff_seconds=10)
+    async def flaky(payload):
+        calls.append(payload)
+        if payload.get("fail"):
+            raise RuntimeError("boom")
+
+    queue.calls = calls
+    return queue
+
+
+async def run_next(queue, job_type="flaky"):
+    """Claim one job and run it to completion, as the dispatch loop would."""
+    job = await queue._claim(job_type)
+    semaphore = asyncio.Semaphore(1)
+    await semaphore.acquire()
+    await queue._run(job, semaphore)
+    return await queue.db.jobs.find_one({"id": job["id"]})
+
+
+async def test_enqueue_rejects_unknown_job_types(queue):
+    with pytest.raises(ValueError):
+        await queue.enqueue("unknown")
+
+
+async def test_queued_jobs_are_deduplicated_until_claimed(queue):
+    first = await queue.schedule("flaky", {"n": 1})
+    assert await queue.schedule("flaky", {"n": 1}) == first
+    assert await queue.schedule("flaky", {"n": 2}) != first
+    claimed = await queue._claim("flaky")
+    assert "dedupe_key" not in claimed
+    # A running job no longer holds its key, so its next run can be scheduled
+    again = await queue.schedule("flaky", claimed["payload"])
+    assert again != claimed["id"] and await queue.db.jobs.count_documents({}) == 3
+
+
+async def test_jobs_are_not_claimed_before_they_are_due(queue):
+    await queue.enqueue("flaky", delay_seconds=60)
+    assert await queue._claim("flaky") is None
+
+
+async def test_a_leased_job_is_claimed_again_only_after_its_lease_expires(queue):
+    job_id = await queue.enqueue("flaky")
+    first = await queue._claim("flaky")
+    assert (first["id"], first["status"], first["attempts"]) == (job_id, "running", 1)
+    assert await queue._claim("flaky") is None
+    # The worker died: its lease runs out
+    await queue.db.jobs.update_one({"id": job_id}, {"$set": {"locked_until": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+    second = await queue._claim("flaky")
+    assert (second["id"], second["attempts"]) == (job_id, 2)
+
+
+async def test_successful_jobs_are_marked_done(queue):
+    await queue.enqueue("flaky", {"n": 1})
+    job = await run_next(queue)
+    assert job["status"] == "done" and job["locked_until"] is None
+    assert queue.calls == [{"n": 1}]
+
+
+async def test_failures_back_off_then_fail_permanently(queue):
+    await queue.enqueue("flaky", {"fail": True})
+    job = await run_next(queue)
+    assert (job["status"], job["last_error"]) == ("queued", "boom")
+    # First retry waits backoff_seconds, give or take the jitter
+    delay = (job["run_at"].replace(tzinfo=timezone.utc) - job["updated_at"].replace(tzinfo=timezone.utc)).total_seconds()
+    assert 8 <= delay <= 12
+    assert await queue._claim("flaky") is None
+
+    await queue.db.jobs.update_one({"id": job["id"]}, {"$set": {"run_at": datetime.now(timezone.utc)}})
+    job = await run_next(queue)
+    assert (job["status"], job["attempts"]) == ("failed", 2)
+    assert await queue.stats() == {"flaky": {"failed": 1}}
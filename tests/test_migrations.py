@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from migrations import Migrator
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def migrator(mongo):
+    await mongo.bookings.insert_many([
+        {"id": f"b{i}", "total": 100 * i, "version": 1} for i in range(1, 8)
+    ])
+    migrator = Migrator(mongo, batch_size=3, duty_cycle=1.0)
+    migrator.seen = []
+
+    @migrator.register("bookings", 1, "split total into amount and currency")
+    def split_total(document, context):
+        migrator.seen.append(document["id"])
+        return {"amount": document.get("total"), "currency": "INR"}
+
+    return migrator
+
+
+def test_migrations_must_be_registered_in_order(mongo):
+    migrator = Migrator(mongo)
+    with pytest.raises(ValueError):
+        migrator.register("bookings", 2, "skips v1")(lambda document, context: {})
+
+
+async def test_migrate_upgrades_every_document_and_checkpoints(mongo, migrator):
+    finished = await migrator.migrate("bookings")
+    assert (finished["status"], finished["migrated"], finished["conflicts"]) == ("complete", 7, 0)
+    assert await mongo.bookings.count_documents({"schema_version": 1, "currency": "INR"}) == 7
+    checkpoint = await mongo.migrations.find_one({"_id": "bookings"})
+    assert checkpoint["target_version"] == 1 and checkpoint["last_id"] is None
+
+
+async def test_concurrent_writes_are_kept_and_migrated_on_the_next_pass(mongo, migrator):
+    async def api_write_after_read(db, documents):
+        # An API write lands between the batch read and its conditional writes
+        if not migrator.seen:
+            await db.bookings.update_one({"id": "b2"}, {"$set": {"total": 999}, "$inc": {"version": 1}})
+
+    migrator.migrations["bookings"][0].prepare = api_write_after_read
+    finished = await migrator.migrate("bookings")
+    assert (finished["status"], finished["migrated"], finished["conflicts"]) == ("complete", 7, 1)
+    booking = await mongo.bookings.find_one({"id": "b2"})
+    assert (booking["amount"], booking["version"], booking["schema_version"]) == (999, 2, 1)
+
+
+async def test_migration_resumes_after_its_checkpoint(mongo, migrator):
+    third = await mongo.bookings.find_one({"id": "b3"})
+    await mongo.migrations.insert_one({"_id": "bookings", "target_version": 1, "last_id": third["_id"], "status": "running"})
+    await migrator.migrate("bookings")
+    # The rest of the interrupted pass first, then the start of the collection
+    assert migrator.seen == ["b4", "b5", "b6", "b7", "b1", "b2", "b3"]
+
+
+async def test_checkpoints_for_an_older_target_are_ignored(mongo, migrator):
+    third = await mongo.bookings.find_one({"id": "b3"})
+    await mongo.migrations.insert_one({"_id": "bookings", "target_version": 0, "last_id": third["_id"], "migrated": 50})
+    finished = await migrator.migrate("bookings")
+    assert migrator.seen[0] == "b1" and finished["migrated"] == 7
+
+
+async def test_another_workers_lease_is_respected(mongo, migrator):
+    await mongo.migrations.insert_one({
+        "_id": "bookings", "target_version": 1, "owner": "elsewhere:1",
+        "lease_until": datetime.now(timezone.utc) + timedelta(minutes=1),
+    })
+    assert await migrator.migrate("bookings") is None
+    assert await mongo.bookings.count_documents({"schema_version": 1}) == 0
+
+
+async def test_reads_upgrade_lazily_without_writing(mongo, migrator):
+    documents = await mongo.bookings.find({"id": {"$in": ["b1", "b2"]}}).to_list(None)
+    await migrator.upgrade_documents("bookings", documents)
+    assert [document["amount"] for document in documents] == [100, 200]
+    assert migrator.lazy_upgrades == 2
+    assert await mongo.bookings.count_documents({"schema_version": 1}) == 0
+
+
+async def test_upgrade_and_save_does_not_overwrite_a_newer_version(mongo, migrator):
+    stale = await mongo.bookings.find_one({"id": "b1"})
+    await mongo.bookings.update_one({"id": "b1"}, {"$set": {"total": 5}, "$inc": {"version": 1}})
+    await migrator.upgrade_and_save("bookings", stale)
+    assert "schema_version" not in await mongo.bookings.find_one({"id": "b1"})
+
+    current = await mongo.bookings.find_one({"id": "b1"})
+    await migrator.upgrade_and_save("bookings", current)
+    assert (await mongo.bookings.find_one({"id": "b1"}))["amount"] == 5
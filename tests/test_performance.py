@@ -0,0 +1,83 @@
+import pytest
+from starlette.requests import Request
+
+import performance
+
+pytestmark = pytest.mark.anyio
+
+REQUEST = {
+    "title": "Trip", "travel_type": "leisure", "travelers_count": 2, "adults": 2, "children": 0, "infants": 0,
+    "departure_date": "2027-05-01", "return_date": "2027-05-10", "destinations": ["Paris"], "transport_modes": ["Flight"],
+}
+
+
+def user(user_id, role):
+    import server
+    return server.User(id=user_id, email=f"{user_id}@example.com", name=user_id.title(), role=role)
+
+
+@pytest.fixture
+async def engine(server_db, monkeypatch):
+    import server
+    from assignment import AssignmentEngine
+    await server_db.users.insert_many([{"id": name, "name": name.title(), "role": "salesperson"} for name in ("alice", "bob")])
+    engine = AssignmentEngine()
+    await engine.load(server_db)
+    monkeypatch.setattr(server, "assignment_engine", engine)
+    return engine
+
+
+@pytest.fixture
+def standalone(server_db, monkeypatch):
+    """Acceptance takes its no-transaction path, as on a standalone server."""
+    from pymongo.errors import OperationFailure
+    async def start_session():
+        raise OperationFailure("Transaction numbers are only allowed on a replica set", code=20)
+    monkeypatch.setattr(server_db.client, "start_session", start_session)
+
+
+async def quote(request):
+    import server
+    return await server.create_quotation(server.QuotationCreate(
+        request_id=request.id, title="Q", options=[{"name": "A", "line_items": [
+            {"component": "hotel", "name": "Hotel", "quantity": 1, "unit_cost": 1000},
+        ]}],
+    ), user(request.assigned_salesperson, "salesperson"))
+
+
+async def counters(db):
+    return {document.pop("_id"): {name: document.get(name, 0) for name in performance.COUNTERS}
+            async for document in db.salesperson_metrics.find()}
+
+
+async def test_counters_match_a_rebuild_from_requests_and_quotations(server_db, engine, standalone):
+    import server
+    customer = user("c", "customer")
+    requests = [await server.create_travel_request(dict(REQUEST), customer) for _ in range(4)]
+    assert {request.assigned_salesperson for request in requests} == {"alice", "bob"}
+    await server.bulk_insert_requests([dict(REQUEST) for _ in range(3)], customer)
+
+    first = await quote(requests[0])
+    await quote(requests[0])  # only the first quotation counts towards response time
+    await quote(requests[1])
+    await server_db.quotations.update_one({"id": first.id}, {"$set": {"status": "sent"}})
+    await server.accept_quotation(first.id, Request({"type": "http", "headers": []}), None, customer)
+
+    incremental = await counters(server_db)
+    assert await performance.rebuild(server_db) == 2
+    rebuilt = await counters(server_db)
+    assert incremental.keys() == rebuilt.keys() == {"alice", "bob"}
+    for salesperson_id, values in incremental.items():
+        assert values == pytest.approx(rebuilt[salesperson_id], abs=1e-6), salesperson_id
+    assert sum(values["requests_assigned"] for values in rebuilt.values()) == 7
+    assert incremental[requests[0].assigned_salesperson]["requests_won"] == 1
+
+
+def test_summaries_leave_undefined_rates_empty():
+    summary = performance.summarize({"requests_assigned": 4, "requests_won": 1, "requests_quoted": 0})
+    assert (summary["conversion_rate"], summary["win_rate"], summary["avg_response_hours"]) == (25.0, None, None)
+
+
+async def test_unknown_counters_are_rejected(mongo):
+    with pytest.raises(ValueError):
+        await performance.record(mongo, "alice", revenue=1)
@@ -0,0 +1,86 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+
+pytestmark = pytest.mark.anyio
+
+
+def salesperson():
+    import server
+    return server.User(id="sales", email="sales@example.com", name="Sales", role="salesperson")
+
+
+async def insert_quotation(db, status="draft"):
+    import server
+    quotation = server.Quotation(
+        request_id="r", salesperson_id="sales", salesperson_name="Sales", title="Q", status=status,
+        options=[{"name": "A", "markup_percentage": 25, "line_items": [
+            {"component": "hotel", "name": "Hotel", "quantity": 2, "unit_cost": 1000},
+        ]}],
+    ).dict()
+    await db.quotations.insert_one(dict(quotation))
+    return quotation
+
+
+async def edit(quotation, **changes):
+    import server
+    option = quotation["options"][0]
+    return await server.update_quotation_line_item(
+        quotation["id"], option["id"], option["line_items"][0]["id"], server.LineItemUpdate(**changes),
+        Request({"type": "http", "headers": []}), Response(), salesperson(),
+    )
+
+
+async def test_draft_line_items_reprice_the_quotation(server_db):
+    quotation = await insert_quotation(server_db)
+    updated = await edit(quotation, quantity=3)
+    assert updated.options[0].cost == 3000
+    assert updated.total_price == updated.options[0].price > quotation["total_price"]
+
+
+@pytest.mark.parametrize("status", ["sent", "pending_approval", "approved", "accepted"])
+async def test_issued_quotations_cannot_be_repriced(server_db, status):
+    quotation = await insert_quotation(server_db, status)
+    with pytest.raises(HTTPException) as failure:
+        await edit(quotation, quantity=3)
+    assert failure.value.status_code == 409
+    assert (await server_db.quotations.find_one({"id": quotation["id"]}))["total_price"] == quotation["total_price"]
+
+
+async def test_status_change_between_read_and_write_is_a_conflict(server_db, monkeypatch):
+    import server
+    quotation = await insert_quotation(server_db)
+    upgrade = server.migrator.upgrade_and_save
+
+    async def accepted_meanwhile(collection, document):
+        # Another request accepts the quotation after the edit read it
+        await server_db.quotations.update_one({"id": quotation["id"]}, {"$set": {"status": "accepted"}})
+        return await upgrade(collection, document)
+
+    monkeypatch.setattr(server.migrator, "upgrade_and_save", accepted_meanwhile)
+    with pytest.raises(HTTPException) as failure:
+        await edit(quotation, quantity=3)
+    assert failure.value.status_code == 409 and "'accepted'" in failure.value.detail
+    assert (await server_db.quotations.find_one({"id": quotation["id"]}))["total_price"] == quotation["total_price"]
+
+
+async def test_null_line_item_fields_are_rejected():
+    import server
+    from pydantic import ValidationError
+    with pytest.raises(ValidationError):
+        server.LineItemUpdate(name=None)
+
+
+@pytest.mark.parametrize("departure_date, seasonal", [("15/12/2026", True), ("next spring", False), (None, False)])
+async def test_rule_of_thumb_rates_tolerate_legacy_travel_dates(server_db, monkeypatch, departure_date, seasonal):
+    import server
+    async def no_model():
+        return None
+    monkeypatch.setattr(server.pricing_models, "current", no_model)
+    request = {"id": "r", "budget_max": 100000, "travel_type": "leisure"}
+    if departure_date is not None:
+        request["departure_date"] = departure_date
+    await server_db.travel_requests.insert_one(request)
+    recommendation = await server.get_rate_recommendations("r", salesperson())
+    assert (recommendation.seasonal_factor == 1.2) is seasonal
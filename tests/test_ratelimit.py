@@ -0,0 +1,101 @@
+import base64
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from ratelimit import MemoryBucketStore, RateLimitMiddleware, RatePolicy
+
+pytestmark = pytest.mark.anyio
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def call(app, path="/api/export", token=None, ip="10.0.0.1"):
+    """Status and headers of one GET through `app`."""
+    headers = [(b"authorization", b"Bearer " + token.encode())] if token else []
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await app({"type": "http", "method": "GET", "path": path, "headers": headers, "client": (ip, 1234)}, None, send)
+    start = messages[0]
+    return start["status"], dict(start["headers"])
+
+
+def unsigned_token(subject):
+    def part(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+    return f"{part({'alg': 'HS256', 'kid': 'default'})}.{part({'sub': subject, 'type': 'access'})}.c2ln"
+
+
+@pytest.fixture
+def limited():
+    import server
+    policy = RatePolicy.per_minute("/api/export", 2, per="user")
+    return RateLimitMiddleware(endpoint, [policy], store=MemoryBucketStore(), verify_token=server.token_subject)
+
+
+async def test_forged_tokens_cannot_drain_another_users_bucket(limited):
+    import server
+    victim = server.create_access_token({"sub": "victim@example.com"})
+    for _ in range(5):
+        await call(limited, token=unsigned_token("victim@example.com"), ip="10.6.6.6")
+    assert (await call(limited, token=victim, ip="10.0.0.2"))[0] == 200
+    # The forger only exhausted the bucket of their own address
+    assert (await call(limited, token=unsigned_token("victim@example.com"), ip="10.6.6.6"))[0] == 429
+
+
+async def test_verified_users_share_a_bucket_across_addresses(limited):
+    import server
+    token = server.create_access_token({"sub": "user@example.com"})
+    statuses = [(await call(limited, token=token, ip=f"10.0.0.{i}"))[0] for i in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+async def test_per_user_policies_use_the_ip_without_a_verifier():
+    app = RateLimitMiddleware(endpoint, [RatePolicy.per_minute("/api/export", 1, per="user")])
+    assert (await call(app, token=unsigned_token("a"), ip="10.0.0.1"))[0] == 200
+    assert (await call(app, token=unsigned_token("b"), ip="10.0.0.1"))[0] == 429
+
+
+async def test_buckets_refill_at_the_policy_rate_up_to_the_burst():
+    store = MemoryBucketStore()
+    # 0.5 tokens a second, burst of 2
+    assert [(await store.take("k", 0.5, 2, 0.0))[0] for _ in range(3)] == [True, True, False]
+    assert await store.take("k", 0.5, 2, 1.0) == (False, pytest.approx(1.0))
+    assert (await store.take("k", 0.5, 2, 2.0))[0] is True
+    # A long idle spell refills no further than the burst
+    assert [(await store.take("k", 0.5, 2, 1000.0))[0] for _ in range(3)] == [True, True, False]
+
+
+async def test_full_stores_keep_throttled_buckets_over_refilled_ones():
+    store = MemoryBucketStore(maxsize=10)
+    await store.take("throttled", 0.01, 1, 0.0)
+    for i in range(9):
+        await store.take(f"idle{i}", 100.0, 1, 0.0)
+    await store.take("new", 1.0, 1, 1.0)
+    assert (await store.take("throttled", 0.01, 1, 1.0))[0] is False
+    assert not any(key.startswith("idle") for key in store._buckets)
+
+
+async def test_rejections_carry_a_whole_second_retry_after(monkeypatch):
+    import ratelimit
+    clock = iter([0.0, 0.0, 0.5, 20.0])
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(monotonic=lambda: next(clock)))
+    app = RateLimitMiddleware(endpoint, [RatePolicy.per_minute("/api/quotations/{id}/document", 4, burst=2)])
+    statuses = [await call(app, path="/api/quotations/q1/document") for _ in range(4)]
+    assert [status for status, _ in statuses] == [200, 200, 429, 200]
+    # Half a second in, the next token is 14.5s away: rounded up, never down
+    assert statuses[2][1][b"retry-after"] == b"15"
+    assert app.rejected == 1
+
+
+async def test_unlimited_paths_and_methods_pass_through():
+    app = RateLimitMiddleware(endpoint, [RatePolicy.per_minute("/api/export", 1, methods=["POST"])])
+    assert [(await call(app))[0] for _ in range(3)] == [200, 200, 200]
+    assert [(await call(app, path="/api/other"))[0] for _ in range(3)] == [200, 200, 200]
@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from rendering import QuotationRenderer
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def renderer():
+    renderer = QuotationRenderer()
+    renderer._pool = ThreadPoolExecutor(max_workers=1)
+    yield renderer
+    renderer.shutdown()
+
+
+def documents(customer, request_version):
+    quotation = {"id": "q", "title": "Quote", "status": "sent", "version": 3, "options": []}
+    request = {"id": "r", "customer_name": customer, "destinations": ["Paris"], "version": request_version}
+    return quotation, request
+
+
+async def test_request_edits_are_not_served_from_the_cache(renderer):
+    before = await renderer.render(*documents("Alice", 1), fmt="html")
+    assert before == await renderer.render(*documents("Alice", 1), fmt="html")
+    after = await renderer.render(*documents("Bob", 2), fmt="html")
+    assert b"Bob" in after and b"Alice" not in after
+
+
+async def test_invalidate_drops_every_request_version(renderer):
+    for version in (1, 2):
+        await renderer.render(*documents("Alice", version), fmt="html")
+    renderer.invalidate("q")
+    assert not renderer._cache
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+
+import revenue
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2026, 1, 30, 22, tzinfo=timezone.utc)
+
+
+def operations():
+    import server
+    return server.User(id="ops", email="ops@example.com", name="Ops", role="operations")
+
+
+async def book(db, booking_id, salesperson_id, amount, created_at, legacy=False):
+    """Insert a booking and its increment, as accepting a quotation does."""
+    import server
+    await db.quotations.insert_one({"id": f"q-{booking_id}", "salesperson_id": salesperson_id})
+    booking = server.Booking(
+        id=booking_id, quotation_id=f"q-{booking_id}", customer_id="c", customer_name="C",
+        salesperson_id=None if legacy else salesperson_id, total_amount=amount,
+        travel_date=datetime(2026, 6, 1), created_at=created_at,
+    )
+    await db.bookings.insert_one(booking.dict())
+    await revenue.record(db, created_at, salesperson_id, booked=amount)
+
+
+def totals(buckets):
+    """Non-zero metrics per bucket: a bucket whose increments cancel out equals no bucket."""
+    result = {}
+    for bucket in buckets:
+        metrics = {metric: bucket.get(metric, 0) for metric in revenue.METRICS if bucket.get(metric)}
+        if metrics:
+            result[bucket["_id"]] = metrics
+    return result
+
+
+async def test_increments_match_a_rebuild_from_the_ledger(server_db, monkeypatch):
+    import server
+    await book(server_db, "b1", "alice", 1000.0, START)
+    await book(server_db, "b2", "bob", 2500.0, START + timedelta(days=2), legacy=True)
+    await book(server_db, "b3", "alice", 400.0, START + timedelta(days=3))
+
+    await server.capture_payment({"booking_id": "b1", "amount": 600.0}, operations())
+    await server.capture_payment({"booking_id": "b2", "amount": 2500.0}, operations())
+    await server.process_refund({"booking_id": "b2", "amount": 300.0}, operations())
+    await server.update_booking(
+        "b3", server.BookingUpdate(booking_status="cancelled"),
+        Request({"type": "http", "headers": []}), Response(), operations(),
+    )
+
+    incremental = totals(await server_db.revenue_buckets.find().to_list(None))
+    assert await revenue.rebuild(server_db, chunks=3) == len(await server_db.revenue_buckets.find().to_list(None))
+    rebuilt = totals(await server_db.revenue_buckets.find().to_list(None))
+    assert incremental.keys() == rebuilt.keys()
+    for key, metrics in incremental.items():
+        assert metrics == pytest.approx(rebuilt[key]), key
+    # The legacy booking was credited through its quotation on both paths
+    assert any(key.endswith(":bob") for key in rebuilt)
+
+
+async def test_series_carries_the_outstanding_balance_across_periods(mongo):
+    await revenue.record(mongo, datetime(2026, 1, 10, tzinfo=timezone.utc), "a", booked=1000.0)
+    await revenue.record(mongo, datetime(2026, 2, 3, tzinfo=timezone.utc), "a", captured=400.0, payments=1)
+    await revenue.record(mongo, datetime(2026, 3, 5, tzinfo=timezone.utc), "b", booked=200.0, refunded=50.0, refunds=1)
+    series = await revenue.revenue_series(
+        mongo, datetime(2026, 2, 1, tzinfo=timezone.utc), datetime(2026, 4, 1, tzinfo=timezone.utc)
+    )
+    assert series["opening_outstanding"] == 1000.0
+    assert [bucket["outstanding"] for bucket in series["buckets"]] == [600.0, 850.0]
+    assert series["totals"]["net_revenue"] == 350.0
+    only_a = await revenue.revenue_series(
+        mongo, datetime(2026, 2, 1, tzinfo=timezone.utc), datetime(2026, 4, 1, tzinfo=timezone.utc),
+        salesperson_ids=["a"],
+    )
+    assert only_a["closing_outstanding"] == 600.0
+
+
+async def test_unknown_metrics_are_rejected(mongo):
+    with pytest.raises(ValueError):
+        await revenue.record(mongo, START, "a", profit=1)
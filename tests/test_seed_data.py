@@ -0,0 +1,30 @@
+import pytest
+from pymongo.errors import BulkWriteError
+
+import seed_data
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_seed_inserts_every_requested_batch(mongo):
+    counts = await seed_data.seed(mongo, 2000, salespeople=5, customers=50, batch_size=100, concurrency=2)
+    assert counts["travel_requests"] == 2000
+    for name, count in counts.items():
+        assert await mongo[name].count_documents({}) == count
+
+
+async def test_seed_rebuilds_rollups_and_bumps_change_counters(mongo):
+    await mongo.revenue_buckets.insert_one({"_id": "stale", "granularity": "day"})
+    await mongo.collection_changes.insert_one({"_id": "bookings", "version": 3})
+    await seed_data.seed(mongo, 300, salespeople=3, customers=20, batch_size=100)
+    assert await mongo.revenue_buckets.find_one({"_id": "stale"}) is None
+    assert await mongo.revenue_buckets.count_documents({}) > 0
+    assert await mongo.salesperson_metrics.count_documents({}) > 0
+    assert (await mongo.collection_changes.find_one({"_id": "bookings"}))["version"] == 4
+
+
+async def test_seed_raises_and_stops_on_a_failed_batch(mongo):
+    await mongo.travel_requests.create_index("title", unique=True)  # every generated batch collides
+    with pytest.raises(BulkWriteError):
+        await seed_data.seed(mongo, 5000, salespeople=3, customers=20, batch_size=100, concurrency=2)
+    assert await mongo.quotations.count_documents({}) < 5000
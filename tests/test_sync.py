@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+pytestmark = pytest.mark.anyio
+
+AN_HOUR_AGO = datetime.now(timezone.utc) - timedelta(hours=1)
+
+
+def customer(user_id):
+    import server
+    return server.User(id=user_id, email=f"{user_id}@example.com", name=user_id.title(), role="customer")
+
+
+async def insert_request(db, request_id, customer_id):
+    import server
+    request = server.TravelRequest(
+        id=request_id, title="Trip", customer_id=customer_id, customer_name=customer_id.title(),
+        travel_type="leisure", travelers_count=2, adults=2, children=0, infants=0,
+        departure_date="2027-05-01", return_date="2027-05-10", destinations=["Paris"], transport_modes=["Flight"],
+        updated_at=AN_HOUR_AGO,
+    )
+    await db.travel_requests.insert_one(request.dict())
+
+
+async def insert_quotation(db, quotation_id, request_id):
+    import server
+    quotation = server.Quotation(
+        id=quotation_id, request_id=request_id, salesperson_id="sales", salesperson_name="Sales", title="Q",
+        options=[], updated_at=AN_HOUR_AGO,
+    )
+    await db.quotations.insert_one(quotation.dict())
+
+
+@pytest.fixture
+async def trips(server_db):
+    for request_id, customer_id in [("r1", "ann"), ("r2", "ann"), ("r3", "ben")]:
+        await insert_request(server_db, request_id, customer_id)
+        await insert_quotation(server_db, f"q{request_id[1]}", request_id)
+    return server_db
+
+
+def ids(page, name):
+    return sorted(document.id for document in page["changes"][name])
+
+
+async def test_full_sync_is_scoped_to_the_customer(trips):
+    import server
+    page = await server.sync_changes(None, customer("ann"))
+    assert page["full"] and not page["has_more"]
+    assert (ids(page, "requests"), ids(page, "quotations")) == (["r1", "r2"], ["q1", "q2"])
+
+
+async def test_delta_reports_edits_and_tombstones_to_their_owner_only(trips):
+    import server
+    from concurrency import versioned
+    ann, ben = [(await server.sync_changes(None, customer(name)))["token"] for name in ("ann", "ben")]
+
+    await trips.travel_requests.update_one({"id": "r1"}, versioned({"$set": {"title": "Renamed"}}))
+    assert await server.delete_with_tombstones("quotations", {"id": "q2"}) == 1
+    assert await trips.quotations.find_one({"id": "q2"}) is None
+
+    delta = await server.sync_changes(ann, customer("ann"))
+    assert not delta["full"]
+    assert [request.title for request in delta["changes"]["requests"]] == ["Renamed"]
+    assert delta["deleted"] == {"requests": [], "quotations": ["q2"], "bookings": []}
+    # Another customer hears of neither
+    other = await server.sync_changes(ben, customer("ben"))
+    assert other["changes"]["requests"] == [] and other["deleted"]["quotations"] == []
+
+
+async def test_tokens_older_than_the_tombstones_resync_in_full(trips):
+    import server
+    expired = server.encode_sync_token(datetime.now(timezone.utc) - timedelta(days=server.SYNC_TOMBSTONE_DAYS + 1))
+    await server.delete_with_tombstones("quotations", {"id": "q2"})
+    page = await server.sync_changes(expired, customer("ann"))
+    assert page["full"] and ids(page, "quotations") == ["q1"]
+    assert page["deleted"]["quotations"] == []
+
+
+async def test_full_sync_pages_through_every_collection_once(trips, monkeypatch):
+    import server
+    monkeypatch.setattr(server, "SYNC_PAGE_SIZE", 2)
+    manager = server.User(id="m", email="m@example.com", name="M", role="sales_manager")
+    seen, token = {"requests": [], "quotations": []}, None
+    while True:
+        page = await server.sync_changes(token, manager)
+        assert page["full"]
+        for name in seen:
+            seen[name] += ids(page, name)
+        token = page["token"]
+        if not page["has_more"]:
+            break
+    assert (sorted(seen["requests"]), sorted(seen["quotations"])) == (["r1", "r2", "r3"], ["q1", "q2", "q3"])
+    # The last page hands over a delta token
+    assert server.decode_sync_token(token)[1] is None
+
+
+@pytest.mark.parametrize("token", ["garbage", "djM6MTIz", "djI6MTIzOjA6bm90LWFuLWlk"])
+def test_malformed_tokens_are_rejected(token):
+    import server
+    with pytest.raises(HTTPException) as failure:
+        server.decode_sync_token(token)
+    assert failure.value.status_code == 400
@@ -0,0 +1,58 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def warmup(monkeypatch):
+    """The server's warm-up machinery with an empty step list and fresh state."""
+    import server
+    monkeypatch.setattr(server, "WARMUP_STEPS", [])
+    monkeypatch.setattr(server, "warmup_state", {**server.warmup_state, "status": "starting", "ready": False, "steps": {}})
+    monkeypatch.setattr(server, "MIGRATION_MODE", "external")
+    return server
+
+
+async def test_optional_steps_run_after_readiness(warmup):
+    events = []
+
+    def step(name, required, fail=False):
+        @warmup.warmup_step(name, required=required)
+        async def run():
+            events.append((name, warmup.warmup_state["ready"]))
+            if fail:
+                raise RuntimeError(name)
+
+    step("indexes", True)
+    step("rollups", False, fail=True)
+    step("snapshot", False)
+    step("assignment", True)
+    await warmup.run_warmup()
+
+    assert events == [("indexes", False), ("assignment", False), ("rollups", True), ("snapshot", True)]
+    assert warmup.warmup_state["status"] == "ready"
+    assert warmup.warmup_state["steps"]["rollups"]["status"] == "failed"
+
+
+async def test_failed_required_step_stops_warmup(warmup):
+    ran = []
+
+    @warmup.warmup_step("indexes")
+    async def fail():
+        raise RuntimeError("no database")
+
+    @warmup.warmup_step("cache", required=False)
+    async def cache():
+        ran.append("cache")
+
+    await warmup.run_warmup()
+    assert warmup.warmup_state["status"] == "failed" and not warmup.warmup_state["ready"]
+    assert ran == []
+
+
+def test_full_loads_do_not_hold_up_readiness():
+    import server
+    steps = {name: required for name, _, required in server.WARMUP_STEPS}
+    assert steps["rollups"] is False and steps["analytics_snapshot"] is False
+    # The snapshot load is the slowest optional step, so it comes last
+    assert [name for name, _, _ in server.WARMUP_STEPS][-1] == "analytics_snapshot"